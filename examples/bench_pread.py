@@ -0,0 +1,43 @@
+import os
+import random
+import tempfile
+import time
+from kara_storage.backend.file import LocalFileStorage
+from kara_storage.row.trunk import TrunkController
+
+TRUNK_SIZE = 1024
+NUM_READS = 5000
+
+def bench(num_trunks : int) -> float:
+    storage = LocalFileStorage()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        prefix = os.path.join(tmpdir, "data")
+
+        # 写入 num_trunks 个 trunk
+        writer = TrunkController(storage, prefix, "w", max_file_size=TRUNK_SIZE)
+        buf = os.urandom(TRUNK_SIZE)
+        for _ in range(num_trunks):
+            writer.write(buf)
+        writer.close()
+
+        reader = TrunkController(storage, prefix, "r", use_mmap=True)
+        offsets = [random.randint(0, reader.size - 16) for _ in range(NUM_READS)]
+
+        # 预热，映射所有 trunk
+        for offset in offsets:
+            reader.pread(offset, 16)
+
+        st = time.perf_counter()
+        for offset in offsets:
+            reader.pread(offset, 16)
+        cost = time.perf_counter() - st
+        reader.close()
+    return cost / NUM_READS
+
+def main():
+    print("%10s %15s" % ("trunks", "pread latency"))
+    for num_trunks in [10, 100, 1000, 10000]:
+        print("%10d %12.2f us" % (num_trunks, bench(num_trunks) * 1e6))
+
+if __name__ == "__main__":
+    main()
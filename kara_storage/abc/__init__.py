@@ -1,4 +1,4 @@
-from .storage import StorageFileBase, StorageBase
+from .storage import StorageFileBase, StorageBase, AsyncStorageBase
 from .dataset import Dataset
 from .serializer import Serializer
 from .iter import DatasetIterator
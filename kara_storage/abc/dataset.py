@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Iterable, List
 from .storage import StorageBase
 import io
 
@@ -15,6 +15,9 @@ class Dataset:
     
     def write(self, data : Any):
         raise NotImplementedError()
+
+    def write_many(self, data : Iterable[Any]):
+        raise NotImplementedError()
     
     def read(self) -> Any:
         raise NotImplementedError()
@@ -24,6 +27,9 @@ class Dataset:
             
     def pread(self, offset : int) -> Any:
         raise NotImplementedError()
+
+    def pread_many(self, offsets : List[int]) -> List[Any]:
+        raise NotImplementedError()
     
     def size(self) -> int:
         raise NotImplementedError()
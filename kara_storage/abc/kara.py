@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Callable, List, Tuple
 from .storage import StorageBase
 from .dataset import Dataset
 from .serializer import Serializer
@@ -18,6 +18,17 @@ class KaraStorageBase:
         )
         return self.open_dataset(*args, **kwargs)
 
+    def create_virtual_dataset(self, namespace : str, key : str, sources : List[Tuple[str, str, str]], version = None) -> str:
+        raise NotImplementedError()
+
+    def transform(self, 
+            namespace : str, key : str, fn : Callable[[Any], Any], 
+            dst_namespace : str, dst_key : str,
+            version = "latest", dst_version = None,
+            num_workers : int = 4, serialization : Serializer = None, batch_size : int = 1024
+        ) -> str:
+        raise NotImplementedError()
+
     def load_directory(self, namespace : str, key : str, local_path : str, version = "latest", progress_bar=True) -> str:
         raise NotImplementedError()
     
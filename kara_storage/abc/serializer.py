@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, List
 
 
 class Serializer:
@@ -6,4 +6,7 @@ class Serializer:
         raise NotImplementedError
     
     def deserialize(self, x : bytes) -> Any:
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    def deserialize_many(self, x : List[bytes]) -> List[Any]:
+        return [self.deserialize(v) for v in x]
\ No newline at end of file
@@ -1,6 +1,6 @@
 
 import io
-from typing import Union, Optional
+from typing import Dict, List, Tuple, Union, Optional
 
 class StorageFileBase:
     def __init__(self, mode) -> None:
@@ -18,6 +18,22 @@ class StorageFileBase:
             raise NotImplementedError()
         else:
             raise RuntimeError("StorageFile is not readable")
+
+    def preadinto(self, __buffer, offset : int) -> int:
+        # positional read, which does not change the position of `readinto`
+        if self.__readable:
+            raise NotImplementedError()
+        else:
+            raise RuntimeError("StorageFile is not readable")
+
+    def pread_ranges(self, ranges : List[Tuple[int, int]]) -> List[bytes]:
+        # reads multiple (offset, length) ranges, backends may override it to fetch all ranges in a single request
+        ret = []
+        for offset, length in ranges:
+            buf = bytearray(length)
+            lw = self.preadinto(buf, offset)
+            ret.append(bytes(buf[:lw]))
+        return ret
     
     def flush(self):
         raise NotImplementedError()
@@ -26,18 +42,63 @@ class StorageFileBase:
         raise NotImplementedError()
 
 
+class RangeFile(StorageFileBase):
+    """
+    RangeFile implements positional reads with ranged `StorageBase.open` calls.
+    """
+    def __init__(self, storage : 'StorageBase', path : str) -> None:
+        super().__init__("r")
+        self.__storage = storage
+        self.__path = path
+    
+    def preadinto(self, __buffer, offset : int) -> int:
+        view = memoryview(__buffer).cast("B")
+        fp = self.__storage.open(self.__path, "r", offset, offset + len(view))
+        read_offset = 0
+        while read_offset < len(view):
+            lw = fp.readinto(view[read_offset:])
+            if lw == 0 or lw is None:
+                break
+            read_offset += lw
+        fp.close()
+        return read_offset
+    
+    def flush(self):
+        return
+    
+    def close(self):
+        return
+
+
 class StorageBase:
     def __init__(self):
         pass
     
     def open(self, path : str, mode : str, begin : int = None, end : int = None) -> StorageFileBase:
         raise NotImplementedError()
+
+    def open_random(self, path : str) -> StorageFileBase:
+        # returns a thread-safe file for positional reads (`preadinto`)
+        return RangeFile(self, path)
     
     def filesize(self, path : str) -> Union[int, None]:
         raise NotImplementedError()
     
     def put(self, path : str, data : Union[bytes, io.IOBase]) -> None:
         raise NotImplementedError()
+
+    def list(self, prefix : str) -> Optional[Dict[str, int]]:
+        # returns {name: size} of files directly under `prefix` (names are relative to `prefix`), 
+        # or None if the backend is not able to list files
+        return None
+
+    def mmap(self, path : str) -> Optional[memoryview]:
+        # returns None if the backend is not able to map files into memory
+        return None
+
+    def uri(self, path : str) -> str:
+        # identifies `path` across backends (e.g. the bucket or the host it belongs to), used as the key of local caches
+        return "%s:%s" % (self.__class__.__name__, path)
     
     def readfile(self, path : str, chunk_size = 128 * 1024) -> bytes:
         fp = self.open(path, "r")
@@ -51,3 +112,25 @@ class StorageBase:
             buffer.write( memview[:lw] )
         fp.close()
         return buffer.getvalue()
+
+
+class AsyncStorageBase:
+    """
+    AsyncStorageBase is the read-only storage interface used by asyncio datasets.
+    Implementations bound the number of concurrent requests themselves.
+    """
+    async def filesize(self, path : str) -> Union[int, None]:
+        raise NotImplementedError()
+
+    async def pread(self, path : str, offset : int, length : int) -> bytes:
+        # returns less than `length` bytes only at the end of file
+        raise NotImplementedError()
+
+    async def readfile(self, path : str) -> bytes:
+        size = await self.filesize(path)
+        if size is None:
+            raise FileNotFoundError("File `%s` not found" % path)
+        return await self.pread(path, 0, size)
+
+    async def close(self):
+        return
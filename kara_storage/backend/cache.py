@@ -0,0 +1,258 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Optional, Union
+from ..abc import StorageBase, StorageFileBase
+
+class _FileLock:
+    """
+    Exclusive `flock` on a lock file, shared between processes and threads. A no-op where `fcntl` is not available.
+    """
+    def __init__(self, path : str) -> None:
+        self.__path = path
+        self.__fd = None
+
+    def __enter__(self):
+        try:
+            import fcntl
+        except ImportError:
+            return self
+        self.__fd = os.open(self.__path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self.__fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        if self.__fd is not None:
+            # closing the descriptor releases the lock
+            os.close(self.__fd)
+            self.__fd = None
+
+class CachedFile(StorageFileBase):
+    """
+    CachedFile reads `[begin, end)` of a remote file through the chunk cache of CachingStorage.
+    """
+    def __init__(self, storage : 'CachingStorage', path : str, file_size : int, begin : int = None, end : int = None) -> None:
+        super().__init__("r")
+        self.__storage = storage
+        self.__path = path
+        self.__file_size = file_size
+        self.__tell = begin or 0
+        self.__end = file_size if end is None else min(end, file_size)
+
+    def readinto(self, __buffer) -> int:
+        view = memoryview(__buffer).cast("B")
+        lw = self.preadinto(view[:max(0, self.__end - self.__tell)], self.__tell)
+        self.__tell += lw
+        return lw
+
+    def preadinto(self, __buffer, offset : int) -> int:
+        view = memoryview(__buffer).cast("B")
+        chunk_size = self.__storage.chunk_size
+        end = min(offset + len(view), self.__file_size)
+        read_offset = 0
+        while offset + read_offset < end:
+            pos = offset + read_offset
+            chunk_id = pos // chunk_size
+            length = min(end, (chunk_id + 1) * chunk_size) - pos
+            self.__storage._read_chunk(self.__path, self.__file_size, chunk_id, pos - chunk_id * chunk_size, view[read_offset: read_offset + length])
+            read_offset += length
+        return read_offset
+
+    def flush(self):
+        return
+
+    def close(self):
+        return
+
+class CachingStorage(StorageBase):
+    """
+    CachingStorage keeps aligned chunks of remote files in a local directory, so repeated reads are served from local disk.
+
+    Chunks are named by the URI and the size of the remote file, so files that are appended to or rewritten are fetched
+    again. JSON metadata files are always read from the backend. Chunks are written to a temporary file and renamed into
+    place, and fetched under a per-chunk lock file, so processes on the same node can share a cache directory.
+    The least recently used chunks are removed when the directory grows beyond `cache_size` bytes.
+    """
+    def __init__(self, storage : StorageBase, cache_dir : str, cache_size : int = 8 * 1024 * 1024 * 1024, chunk_size : int = 4 * 1024 * 1024) -> None:
+        self.__storage = storage
+        self.__cache_dir = os.path.abspath(cache_dir)
+        self.__cache_size = cache_size
+        self.__chunk_size = chunk_size
+        os.makedirs(self.__cache_dir, exist_ok=True)
+
+        self.__lock = threading.Lock()
+        # bytes in the cache directory, estimated from the last scan and the chunks fetched since then
+        self.__used_bytes = None
+        # chunk path -> last time its mtime was updated, mtimes are the LRU order shared by processes
+        self.__touched : Dict[str, float] = {}
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def storage(self) -> StorageBase:
+        return self.__storage
+
+    @property
+    def cache_dir(self) -> str:
+        return self.__cache_dir
+
+    @property
+    def chunk_size(self) -> int:
+        return self.__chunk_size
+
+    @property
+    def hits(self) -> int:
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        return self.__misses
+
+    def __cacheable(self, path : str) -> bool:
+        return not path.endswith(".json")
+
+    def __chunk_path(self, path : str, file_size : int, chunk_id : int) -> str:
+        # the same path of different buckets or hosts are different files
+        digest = hashlib.sha1(self.__storage.uri(path).encode("utf-8")).hexdigest()
+        return os.path.join(self.__cache_dir, digest[:2], "%s-%d-%d" % (digest, file_size, chunk_id))
+
+    def __touch(self, chunk_path : str):
+        now = time.time()
+        if now - self.__touched.get(chunk_path, 0) > 60:
+            self.__touched[chunk_path] = now
+            try:
+                os.utime(chunk_path)
+            except FileNotFoundError:
+                pass
+
+    def __scan(self):
+        ret = []
+        for root, _, files in os.walk(self.__cache_dir):
+            for name in files:
+                if name.endswith(".lock") or name.startswith("."):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                ret.append((st.st_mtime, st.st_size, os.path.join(root, name)))
+        return ret
+
+    def __evict(self):
+        with _FileLock(os.path.join(self.__cache_dir, ".evict.lock")):
+            chunks = sorted(self.__scan())
+            used = sum(size for _, size, _ in chunks)
+            # leave some room, so that eviction does not run on every fetch
+            target = self.__cache_size * 9 // 10
+            for _, size, chunk_path in chunks:
+                if used <= target:
+                    break
+                for name in [chunk_path, chunk_path + ".lock"]:
+                    try:
+                        os.unlink(name)
+                    except FileNotFoundError:
+                        pass
+                used -= size
+        with self.__lock:
+            self.__used_bytes = used
+            self.__touched = {}
+
+    def __fetch(self, path : str, file_size : int, chunk_id : int, chunk_path : str) -> bytes:
+        begin = chunk_id * self.__chunk_size
+        end = min(begin + self.__chunk_size, file_size)
+        os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+        with _FileLock(chunk_path + ".lock"):
+            try:
+                with open(chunk_path, "rb") as fp:
+                    # fetched by another process while waiting for the lock
+                    return fp.read()
+            except FileNotFoundError:
+                pass
+
+            buf = bytearray(end - begin)
+            view = memoryview(buf)
+            read_offset = 0
+            fp = self.__storage.open(path, "r", begin, end)
+            while read_offset < len(buf):
+                lw = fp.readinto(view[read_offset:])
+                if lw == 0 or lw is None:
+                    break
+                read_offset += lw
+            fp.close()
+            if read_offset != len(buf):
+                raise RuntimeError("File size not aligned: expected %d more bytes" % (len(buf) - read_offset))
+
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(chunk_path), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as fout:
+                    fout.write(buf)
+                os.replace(tmp_path, chunk_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+        with self.__lock:
+            self.__misses += 1
+            if self.__used_bytes is None:
+                self.__used_bytes = sum(size for _, size, _ in self.__scan())
+            else:
+                self.__used_bytes += len(buf)
+            need_evict = self.__used_bytes > self.__cache_size
+        if need_evict:
+            self.__evict()
+        return buf
+
+    def _read_chunk(self, path : str, file_size : int, chunk_id : int, offset : int, view : memoryview):
+        chunk_path = self.__chunk_path(path, file_size, chunk_id)
+        try:
+            fd = os.open(chunk_path, os.O_RDONLY)
+        except FileNotFoundError:
+            data = self.__fetch(path, file_size, chunk_id, chunk_path)
+            view[:] = memoryview(data)[offset: offset + len(view)]
+            return
+        try:
+            lw = os.preadv(fd, [view], offset) if hasattr(os, "preadv") else None
+            if lw is None:
+                os.lseek(fd, offset, os.SEEK_SET)
+                lw = os.readv(fd, [view])
+        finally:
+            os.close(fd)
+        if lw != len(view):
+            raise RuntimeError("Cached chunk `%s` is broken, remove it and retry" % chunk_path)
+        with self.__lock:
+            self.__hits += 1
+            self.__touch(chunk_path)
+
+    def open(self, path : str, mode : str, begin : int = None, end : int = None) -> StorageFileBase:
+        if mode != "r" or not self.__cacheable(path):
+            return self.__storage.open(path, mode, begin, end)
+        file_size = self.__storage.filesize(path)
+        if file_size is None:
+            raise FileNotFoundError("File `%s` not found" % path)
+        return CachedFile(self, path, file_size, begin, end)
+
+    def open_random(self, path : str) -> StorageFileBase:
+        if not self.__cacheable(path):
+            return self.__storage.open_random(path)
+        file_size = self.__storage.filesize(path)
+        if file_size is None:
+            raise FileNotFoundError("File `%s` not found" % path)
+        return CachedFile(self, path, file_size)
+
+    def filesize(self, path : str) -> Union[int, None]:
+        return self.__storage.filesize(path)
+
+    def put(self, path : str, data):
+        return self.__storage.put(path, data)
+
+    def list(self, prefix : str) -> Optional[Dict[str, int]]:
+        return self.__storage.list(prefix)
+
+    def uri(self, path : str) -> str:
+        return self.__storage.uri(path)
+
+    def mmap(self, path : str) -> Optional[memoryview]:
+        # chunks are separate files, reads go through `open`
+        return None
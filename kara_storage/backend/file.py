@@ -1,13 +1,18 @@
 import io
 import os
-from typing import Union
-from ..abc import StorageBase, StorageFileBase
+import mmap
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Union
+from ..abc import StorageBase, StorageFileBase, AsyncStorageBase
 
 class LocalFile(StorageFileBase):
     def __init__(self, fp : io.RawIOBase, mode) -> None:
         super().__init__(mode)
 
         self.__fp = fp
+        self.__lock = threading.Lock()
 
     def append(self, data : bytes):
         rest_length = len(data)
@@ -18,6 +23,13 @@ class LocalFile(StorageFileBase):
 
     def readinto(self, __buffer):
         return self.__fp.readinto(__buffer)
+
+    def preadinto(self, __buffer, offset : int) -> int:
+        if hasattr(os, "preadv"):
+            return os.preadv(self.__fp.fileno(), [__buffer], offset)
+        with self.__lock:
+            self.__fp.seek(offset, io.SEEK_SET)
+            return self.__fp.readinto(__buffer)
     
     def flush(self):
         self.__fp.flush()
@@ -42,6 +54,30 @@ class LocalFileStorage(StorageBase):
         return LocalFile(fp, mode)
         
     
+    def uri(self, path) -> str:
+        return "file://" + os.path.abspath(path)
+
+    def open_random(self, path) -> LocalFile:
+        return LocalFile(open(path, "rb", buffering=0), "r")
+
+    def list(self, prefix) -> Dict[str, int]:
+        directory, name_prefix = os.path.split(prefix)
+        ret = {}
+        if not os.path.isdir(directory):
+            return ret
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.startswith(name_prefix) and entry.is_file():
+                    ret[entry.name[len(name_prefix):]] = entry.stat().st_size
+        return ret
+
+    def mmap(self, path) -> memoryview:
+        with open(path, "rb") as fp:
+            if os.fstat(fp.fileno()).st_size == 0:
+                # empty files can not be mapped
+                return memoryview(b"")
+            return memoryview(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+    
     def filesize(self, path):
         if not os.path.exists(path):
             return None
@@ -61,4 +97,37 @@ class LocalFileStorage(StorageBase):
                 if lw is None or lw == 0:
                     break
                 fout.write(buf[:lw])
-            fout.close()
\ No newline at end of file
+            fout.close()
+
+class AsyncLocalFileStorage(AsyncStorageBase):
+    """
+    Local files have no asynchronous read API, positional reads run in a bounded thread pool.
+    """
+    def __init__(self, max_concurrency : int = 64):
+        self.__max_concurrency = max_concurrency
+        self.__executor = None
+        self.__fds : Dict[str, int] = {}
+
+    def __get_fd(self, path : str) -> int:
+        if path not in self.__fds:
+            self.__fds[path] = os.open(path, os.O_RDONLY)
+        return self.__fds[path]
+
+    async def filesize(self, path : str):
+        if not os.path.exists(path):
+            return None
+        return os.stat(path).st_size
+
+    async def pread(self, path : str, offset : int, length : int) -> bytes:
+        fd = self.__get_fd(path)
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(max_workers=self.__max_concurrency)
+        return await asyncio.get_event_loop().run_in_executor(self.__executor, os.pread, fd, length, offset)
+
+    async def close(self):
+        for fd in self.__fds.values():
+            os.close(fd)
+        self.__fds = {}
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
@@ -1,81 +1,516 @@
 import io
 import os
-from typing import Union
-from ..abc import StorageBase, StorageFileBase
+import ssl
+import json
+import asyncio
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+from ..abc import StorageBase, StorageFileBase, AsyncStorageBase
 import urllib
-import urllib.request
-import urllib.error
+import urllib.parse
+
+class HTTPConnectionPool:
+    """
+    HTTPConnectionPool keeps up to `max_connections` idle keep-alive connections to a single host.
+    """
+    def __init__(self, scheme : str, netloc : str, max_connections : int = 16, timeout : float = 60) -> None:
+        self.__https = (scheme == "https")
+        self.__netloc = netloc
+        self.__max_connections = max_connections
+        self.__timeout = timeout
+        self.__idle_connections : List[http.client.HTTPConnection] = []
+        self.__lock = threading.Lock()
+
+    def __connect(self) -> http.client.HTTPConnection:
+        if self.__https:
+            return http.client.HTTPSConnection(self.__netloc, timeout=self.__timeout, context=ssl.create_default_context())
+        return http.client.HTTPConnection(self.__netloc, timeout=self.__timeout)
+
+    def request(self, method : str, url : str, headers = {}) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        """
+        Sends a request and returns the connection with the response, call `release` after the body is consumed.
+        """
+        with self.__lock:
+            conn = self.__idle_connections.pop() if len(self.__idle_connections) > 0 else None
+        reused = conn is not None
+        if conn is None:
+            conn = self.__connect()
+        try:
+            conn.request(method, url, headers=headers)
+            return conn, conn.getresponse()
+        except (ConnectionError, http.client.BadStatusLine):
+            conn.close()
+            if not reused:
+                raise
+        # idle connection was closed by the server, retry with a new one
+        conn = self.__connect()
+        try:
+            conn.request(method, url, headers=headers)
+            return conn, conn.getresponse()
+        except BaseException:
+            conn.close()
+            raise
+
+    def release(self, conn : http.client.HTTPConnection, resp : http.client.HTTPResponse):
+        # a connection can be reused only if the response has been read completely
+        with self.__lock:
+            if resp.isclosed() and not resp.will_close and len(self.__idle_connections) < self.__max_connections:
+                self.__idle_connections.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self.__lock:
+            for conn in self.__idle_connections:
+                conn.close()
+            self.__idle_connections = []
+
+def _parse_content_range(value : str) -> Tuple[int, int]:
+    # "bytes begin-end/total" -> (begin, end + 1)
+    begin, end = value.strip().split(" ", 1)[1].split("/", 1)[0].split("-")
+    return int(begin), int(end) + 1
+
+def _parse_byteranges(body : bytes, boundary : bytes) -> List[Tuple[int, bytes]]:
+    # parts of a `multipart/byteranges` response, returns [(begin, data)]
+    ret = []
+    delimiter = b"--" + boundary
+    pos = body.find(delimiter)
+    while pos >= 0:
+        pos += len(delimiter)
+        if body[pos: pos + 2] == b"--":
+            break
+        header_end = body.find(b"\r\n\r\n", pos)
+        if header_end < 0:
+            break
+        content_range = None
+        for line in body[pos: header_end].decode("latin-1").split("\r\n"):
+            if ":" in line:
+                name, value = line.split(":", 1)
+                if name.strip().lower() == "content-range":
+                    content_range = _parse_content_range(value)
+        if content_range is None:
+            raise RuntimeError("Invalid multipart/byteranges response")
+        begin, end = content_range
+        pos = header_end + 4
+        ret.append((begin, body[pos: pos + end - begin]))
+        pos = body.find(delimiter, pos + end - begin)
+    return ret
 
 class HTTPFile(StorageFileBase):
-    def __init__(self, fp) -> None:
+    """
+    HTTPFile streams a response body, the request is sent on the first read, so opening a file costs nothing.
+    """
+    def __init__(self, storage : 'HTTPStorage', path : str, headers = {}) -> None:
         super().__init__("r")
-        self.__fp = fp
+        self.__storage = storage
+        self.__path = path
+        self.__headers = headers
+        self.__fp = None
+        self.__release = None
 
     def append(self, data : bytes):
         raise RuntimeError("HTTP/HTTPS files are read-only")
         
 
     def readinto(self, __buffer):
+        if self.__fp is None:
+            self.__fp, self.__release = self.__storage._stream(self.__path, self.__headers)
         return self.__fp.readinto(__buffer)
     
     def flush(self):
         return
     
     def close(self):
-        self.__fp.close()
+        if self.__release is not None:
+            self.__release()
+            self.__release = None
+
+class HTTPRandomFile(StorageFileBase):
+    """
+    HTTPRandomFile serves positional reads with range requests. Large reads are split into parallel requests,
+    and `pread_ranges` fetches all ranges with a single multi-range request if the server supports it.
+    """
+    def __init__(self, storage : 'HTTPStorage', path : str) -> None:
+        super().__init__("r")
+        self.__storage = storage
+        self.__path = path
+
+    def preadinto(self, __buffer, offset : int) -> int:
+        view = memoryview(__buffer).cast("B")
+        split_size = self.__storage.split_size
+        if len(view) <= split_size:
+            return self.__storage._fetch_range(self.__path, offset, view)
+
+        parts = [(begin, view[begin: begin + split_size]) for begin in range(0, len(view), split_size)]
+        lengths = list(self.__storage._executor.map(lambda part: self.__storage._fetch_range(self.__path, offset + part[0], part[1]), parts))
+        ret = 0
+        for (_, part), lw in zip(parts, lengths):
+            ret += lw
+            if lw < len(part):
+                # reached the end of file
+                break
+        return ret
+
+    def pread_ranges(self, ranges : List[Tuple[int, int]]) -> List[bytes]:
+        if len(ranges) > 1 and self.__storage.multirange:
+            ret = self.__storage._fetch_multirange(self.__path, ranges)
+            if ret is not None:
+                return ret
+
+        def fetch(rng):
+            buf = bytearray(rng[1])
+            return bytes(buf[:self.__storage._fetch_range(self.__path, rng[0], memoryview(buf))])
+        if len(ranges) == 1:
+            return [fetch(ranges[0])]
+        return list(self.__storage._executor.map(fetch, ranges))
+
+    def flush(self):
+        return
+
+    def close(self):
+        return
 
 class HTTPStorage(StorageBase):
-    def __init__(self, url_prefix : str, headers = {}):
+    """
+    HTTPStorage reads files from a HTTP/HTTPS server with keep-alive connections.
+
+    max_connections: number of idle connections kept, also the number of parallel requests of a single read.
+    split_size: reads larger than this are split into parallel range requests.
+    """
+    def __init__(self, url_prefix : str, headers = {}, max_connections : int = 16, split_size : int = 4 * 1024 * 1024):
         if not url_prefix.endswith("/"):
             url_prefix = url_prefix + "/"
+        uri = urllib.parse.urlparse(url_prefix)
+        if uri.scheme not in ["http", "https"]:
+            raise ValueError("Unknown scheme `%s`" % uri.scheme)
         self.__url_prefix = url_prefix
+        self.__path_prefix = uri.path
         self.__custom_headers = headers
+        self.__pool = HTTPConnectionPool(uri.scheme, uri.netloc, max_connections)
+        self.__max_connections = max_connections
+        self.__split_size = split_size
+        self.__executor = None
+        self.__executor_lock = threading.Lock()
+        # None until the first multi-range request tells whether the server supports it
+        self.__multirange : Optional[bool] = None
     
+    @property
+    def split_size(self) -> int:
+        return self.__split_size
+
+    def uri(self, path : str) -> str:
+        if path.startswith("/"):
+            path = path[1:]
+        return self.__url_prefix + path
+
+    @property
+    def multirange(self) -> bool:
+        return self.__multirange is not False
+
+    @property
+    def _executor(self) -> ThreadPoolExecutor:
+        with self.__executor_lock:
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(max_workers=self.__max_connections)
+            return self.__executor
+
+    def __request(self, method : str, path : str, headers = {}):
+        if path.startswith("/"):
+            path = path[1:]
+        return self.__pool.request(method, self.__path_prefix + path, {**self.__custom_headers, **headers})
+
+    def __read_body(self, conn, resp) -> bytes:
+        try:
+            return resp.read()
+        finally:
+            self.__pool.release(conn, resp)
+
+    def __discard(self, conn, resp):
+        # closes the connection without reading the body, e.g. a whole file sent for a range request
+        resp.close()
+        conn.close()
+
     def __range_to_str(self, v):
         if v is None:
             return ""
         return str(v)
+
+    def _fetch_range(self, path : str, offset : int, view : memoryview) -> int:
+        if len(view) == 0:
+            return 0
+        conn, resp = self.__request("GET", path, {
+            "Range": "bytes=%d-%d" % (offset, offset + len(view) - 1)
+        })
+        if resp.status == 200:
+            # the server ignored the range header and sends the whole file
+            self.__discard(conn, resp)
+            raise RuntimeError("Storage server seems doesn't support range header")
+        if resp.status == 416:
+            self.__read_body(conn, resp)
+            return 0
+        if resp.status != 206:
+            self.__read_body(conn, resp)
+            raise RuntimeError("Unexpected response code: %d" % resp.status)
+        try:
+            read_offset = 0
+            while read_offset < len(view):
+                lw = resp.readinto(view[read_offset:])
+                if lw == 0 or lw is None:
+                    break
+                read_offset += lw
+            return read_offset
+        finally:
+            self.__pool.release(conn, resp)
+
+    def _fetch_multirange(self, path : str, ranges : List[Tuple[int, int]]) -> Optional[List[bytes]]:
+        """
+        Returns None if the server does not support multi-range requests.
+        """
+        byte_ranges = ["%d-%d" % (offset, offset + length - 1) for offset, length in ranges if length > 0]
+        if len(byte_ranges) == 0:
+            return [b""] * len(ranges)
+        conn, resp = self.__request("GET", path, {
+            "Range": "bytes=" + ",".join(byte_ranges)
+        })
+        if resp.status == 200:
+            # the whole file is sent if multiple ranges are not supported, which should not be requested again
+            self.__discard(conn, resp)
+            self.__multirange = False
+            return None
+        content_type = resp.getheader("Content-Type", "")
+        content_range = resp.getheader("Content-Range")
+        body = self.__read_body(conn, resp)
+        if resp.status == 416:
+            return [b""] * len(ranges)
+        if resp.status != 206:
+            # the ranges are requested one by one, which report the error
+            self.__multirange = False
+            return None
+        if content_type.startswith("multipart/byteranges"):
+            boundary = content_type.split("boundary=", 1)[1].strip().strip('"').encode("latin-1")
+            parts = _parse_byteranges(body, boundary)
+        elif content_range is not None:
+            # ranges merged into a single one by the server
+            parts = [(_parse_content_range(content_range)[0], body)]
+        else:
+            raise RuntimeError("Storage server seems doesn't support range header")
+        self.__multirange = True
+
+        ret = []
+        for offset, length in ranges:
+            data = b""
+            for begin, part in parts:
+                if begin <= offset < begin + len(part):
+                    data = part[offset - begin: offset - begin + length]
+                    break
+            ret.append(data)
+        return ret
+    
+    def _stream(self, path : str, headers = {}):
+        """
+        Sends a GET request, returns the response and a function that releases its connection.
+        """
+        conn, resp = self.__request("GET", path, headers)
+        if resp.status >= 400:
+            self.__read_body(conn, resp)
+            if resp.status == 404:
+                raise FileNotFoundError("File `%s` not found" % path)
+            raise RuntimeError("Unexpected response code: %d" % resp.status)
+        if "Range" in headers and resp.getheader("Content-Range") is None:
+            self.__read_body(conn, resp)
+            raise RuntimeError("Storage server seems doesn't support range header")
+        return resp, lambda: self.__pool.release(conn, resp)
     
     def open(self, path : str, mode, begin=None, end=None) -> HTTPFile:
-        if path.startswith("/"):
-            path = path[1:]
         if mode == "r":
             if begin is None and end is None:
-                req = urllib.request.Request(self.__url_prefix + path, headers=self.__custom_headers)
-            else:
-                if end is not None:
-                    end = end - 1
-                req = urllib.request.Request(self.__url_prefix + path, headers={
-                    **self.__custom_headers,
-                    "Range": "bytes=%s-%s" % (
-                        self.__range_to_str(begin),
-                        self.__range_to_str(end)
-                    )
-                })
-            resp = urllib.request.urlopen(req)
-            if begin is not None or end is not None:
-                if 'content-range' not in resp.headers:
-                    raise RuntimeError("Storage server seems doesn't support range header")
-            return HTTPFile(resp)
+                return HTTPFile(self, path)
+            if end is not None:
+                end = end - 1
+            return HTTPFile(self, path, {
+                "Range": "bytes=%s-%s" % (
+                    self.__range_to_str(begin),
+                    self.__range_to_str(end)
+                )
+            })
         elif mode == "a":
             raise ValueError("HTTP/HTTPS Storages are read-only")
         else:
             raise ValueError("Unknown mode: `%s`" % mode)
-        
+
+    def open_random(self, path : str) -> HTTPRandomFile:
+        return HTTPRandomFile(self, path)
     
     def filesize(self, path : str):
-        if path.startswith("/"):
-            path = path[1:]
-        try:
-            resp = urllib.request.urlopen(urllib.request.Request(self.__url_prefix + path, headers=self.__custom_headers))
-        except urllib.error.HTTPError as e:
-            if e.code != 404:
-                raise RuntimeError("Unexpected response code: %d" % e.code)
+        conn, resp = self.__request("HEAD", path)
+        self.__read_body(conn, resp)
+        if resp.status == 404:
             return None
-        if not "content-length" in resp.headers:
+        if resp.status != 200:
+            raise RuntimeError("Unexpected response code: %d" % resp.status)
+        if resp.getheader("Content-Length") is None:
             raise RuntimeError("Storage server does not support `Content-Length` header")
 
-        return int(resp.headers["content-length"])
+        return int(resp.getheader("Content-Length"))
+    
+    def list(self, prefix : str) -> Optional[Dict[str, int]]:
+        # HTTP servers can not list directories, a `list.json` file ({name: size}) can be placed 
+        # under the directory to enable listing.
+        directory, name_prefix = prefix.rsplit("/", 1) if "/" in prefix else ("", prefix)
+        list_path = directory + "/list.json"
+        if self.filesize(list_path) is None:
+            return None
+        files = json.loads(self.readfile(list_path).decode("utf-8"))
+        return {
+            name[len(name_prefix):] : size
+                for name, size in files.items() if name.startswith(name_prefix)
+        }
     
     def put(self, path: str, data: Union[bytes, io.RawIOBase, io.BufferedIOBase]):
-        raise ValueError("HTTP/HTTPS Storages are read-only")
\ No newline at end of file
+        raise ValueError("HTTP/HTTPS Storages are read-only")
+
+class AsyncHTTPStorage(AsyncStorageBase):
+    """
+    AsyncHTTPStorage is a minimal HTTP/1.1 client on asyncio streams, which keeps up to `max_connections`
+    keep-alive connections to the storage server.
+    """
+    def __init__(self, url_prefix : str, headers = {}, max_connections : int = 64):
+        if not url_prefix.endswith("/"):
+            url_prefix = url_prefix + "/"
+        uri = urllib.parse.urlparse(url_prefix)
+        if uri.scheme not in ["http", "https"]:
+            raise ValueError("Unknown scheme `%s`" % uri.scheme)
+        self.__ssl = (uri.scheme == "https")
+        self.__host = uri.hostname
+        self.__port = uri.port if uri.port is not None else (443 if self.__ssl else 80)
+        self.__netloc = uri.netloc
+        self.__path_prefix = uri.path
+        self.__custom_headers = headers
+
+        self.__max_connections = max_connections
+        self.__loop = None
+        self.__semaphore = None
+        self.__idle_connections : List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+    
+    async def __connect(self):
+        if self.__ssl:
+            return await asyncio.open_connection(self.__host, self.__port, ssl=ssl.create_default_context())
+        return await asyncio.open_connection(self.__host, self.__port)
+    
+    async def __read_response(self, reader : asyncio.StreamReader, method : str):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by storage server")
+        status = int(status_line.split(b" ", 2)[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, value = line.decode("latin-1").split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+        
+        if method == "HEAD" or status in (204, 304):
+            body = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                chunk_size = int((await reader.readline()).split(b";", 1)[0], 16)
+                if chunk_size == 0:
+                    await reader.readline()
+                    break
+                parts.append(await reader.readexactly(chunk_size))
+                await reader.readline()
+            body = b"".join(parts)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            # body ends when the connection is closed
+            body = await reader.read()
+            headers["connection"] = "close"
+        return status, headers, body
+
+    async def __request(self, method : str, path : str, headers = {}):
+        if path.startswith("/"):
+            path = path[1:]
+        request = "%s %s HTTP/1.1\r\nHost: %s\r\n" % (method, self.__path_prefix + path, self.__netloc)
+        for name, value in {**self.__custom_headers, **headers}.items():
+            request += "%s: %s\r\n" % (name, value)
+        request = (request + "\r\n").encode("latin-1")
+
+        loop = asyncio.get_event_loop()
+        if self.__loop is not loop:
+            # connections and the semaphore are bound to the event loop
+            self.__loop = loop
+            self.__semaphore = asyncio.Semaphore(self.__max_connections)
+            self.__idle_connections = []
+
+        async with self.__semaphore:
+            reused = len(self.__idle_connections) > 0
+            reader, writer = self.__idle_connections.pop() if reused else await self.__connect()
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, resp_headers, body = await self.__read_response(reader, method)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if not reused:
+                    raise
+                # idle connection was closed by the server, retry with a new one
+                reader, writer = await self.__connect()
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    status, resp_headers, body = await self.__read_response(reader, method)
+                except BaseException:
+                    writer.close()
+                    raise
+            except BaseException:
+                writer.close()
+                raise
+
+            if resp_headers.get("connection", "").lower() == "close":
+                writer.close()
+            else:
+                self.__idle_connections.append((reader, writer))
+        return status, resp_headers, body
+    
+    async def filesize(self, path : str):
+        status, headers, _ = await self.__request("HEAD", path)
+        if status == 404:
+            return None
+        if status != 200:
+            raise RuntimeError("Unexpected response code: %d" % status)
+        if not "content-length" in headers:
+            raise RuntimeError("Storage server does not support `Content-Length` header")
+        return int(headers["content-length"])
+    
+    async def pread(self, path : str, offset : int, length : int) -> bytes:
+        if length <= 0:
+            return b""
+        status, _, body = await self.__request("GET", path, {
+            "Range": "bytes=%d-%d" % (offset, offset + length - 1)
+        })
+        if status == 206:
+            return body
+        elif status == 200:
+            # the server ignored the range header
+            return body[offset: offset + length]
+        elif status == 416:
+            return b""
+        raise RuntimeError("Unexpected response code: %d" % status)
+    
+    async def readfile(self, path : str) -> bytes:
+        status, _, body = await self.__request("GET", path)
+        if status == 404:
+            raise FileNotFoundError("File `%s` not found" % path)
+        if status != 200:
+            raise RuntimeError("Unexpected response code: %d" % status)
+        return body
+    
+    async def close(self):
+        for _, writer in self.__idle_connections:
+            writer.close()
+        self.__idle_connections = []
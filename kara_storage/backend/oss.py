@@ -1,18 +1,59 @@
 import io
-from typing import Union
-from ..abc import StorageBase, StorageFileBase
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Union
+from ..abc import StorageBase, StorageFileBase, AsyncStorageBase
 import oss2
 
+def _readinto_result(result : oss2.models.GetObjectResult, view : memoryview, direct : bool) -> int:
+    """
+    Reads the body of `result` into `view`. With `direct`, the body is read from the underlying HTTP response
+    into the buffer, without going through the chunk iterator of oss2.
+    """
+    response = result.resp.response
+    if "Content-Encoding" in result.resp.headers:
+        # the raw response is not decoded
+        direct = False
+    read_offset = 0
+    try:
+        while read_offset < len(view):
+            if direct:
+                lw = response.raw.readinto(view[read_offset:])
+            else:
+                v = result.read(len(view) - read_offset)
+                lw = len(v)
+                view[read_offset: read_offset + lw] = v
+            if lw == 0 or lw is None:
+                break
+            read_offset += lw
+    finally:
+        if read_offset < len(view) or not response.raw.closed:
+            # the connection goes back to the pool only if the body is fully read
+            response.close()
+    return read_offset
+
 class OSSFile(StorageFileBase):
     pass
 
 class OSSReadableFile(OSSFile):
-    def __init__(self, fp : oss2.models.GetObjectResult) -> None:
+    """
+    OSSReadableFile streams an object, the request is sent on the first read, so opening a file costs nothing.
+    """
+    def __init__(self, get_func : Callable[[], oss2.models.GetObjectResult], direct : bool = False) -> None:
         super().__init__("r")
-        self.__fp = fp
+        self.__get_func = get_func
+        self.__fp = None
+        self.__direct = direct
 
     def readinto(self, __buffer):
         try:
+            if self.__fp is None:
+                self.__fp = self.__get_func()
+                # the raw response is not decoded
+                self.__direct = self.__direct and "Content-Encoding" not in self.__fp.resp.headers
+            if self.__direct:
+                return self.__fp.resp.response.raw.readinto(__buffer)
             v = self.__fp.read(len(__buffer))
             __buffer[:len(v)] = v
             return len(v)
@@ -27,13 +68,52 @@ class OSSReadableFile(OSSFile):
         return
     
     def close(self):
-        self.__fp.close()
+        if self.__fp is not None:
+            self.__fp.close()
+            self.__fp = None
+
+class OSSRandomFile(OSSFile):
+    """
+    OSSRandomFile serves positional reads with ranged GETs, large reads are split into parallel requests.
+    """
+    def __init__(self, storage : 'OSSStorage', path : str) -> None:
+        super().__init__("r")
+        self.__storage = storage
+        self.__path = path
+
+    def preadinto(self, __buffer, offset : int) -> int:
+        view = memoryview(__buffer).cast("B")
+        split_size = self.__storage.split_size
+        if len(view) <= split_size:
+            return self.__storage._get_range(self.__path, offset, view)
+
+        parts = [(begin, view[begin: begin + split_size]) for begin in range(0, len(view), split_size)]
+        lengths = list(self.__storage._executor.map(lambda part: self.__storage._get_range(self.__path, offset + part[0], part[1]), parts))
+        ret = 0
+        for (_, part), lw in zip(parts, lengths):
+            ret += lw
+            if lw < len(part):
+                # reached the end of file
+                break
+        return ret
+
+    def flush(self):
+        return
+
+    def close(self):
+        return
     
 class OSSAppendableFile(StorageFileBase):
-    def __init__(self, bucket : oss2.Bucket, path) -> None:
+    """
+    OSSAppendableFile collects appended data and sends it with a single `append_object` call
+    once `buffer_size` bytes are collected, or when the file is flushed or closed.
+    """
+    def __init__(self, bucket : oss2.Bucket, path, buffer_size : int = 8 * 1024 * 1024) -> None:
         super().__init__("a")
         self.__path = path
         self.__bucket = bucket
+        self.__buffer_size = buffer_size
+        self.__buffer = bytearray()
         try:
             self.__infile_offset = self.__bucket.get_object_meta(path).content_length
         except oss2.exceptions.NoSuchKey:
@@ -41,43 +121,99 @@ class OSSAppendableFile(StorageFileBase):
         
 
     def append(self, data : Union[bytes, memoryview]):
-        if isinstance(data, memoryview):
-            data = data.tobytes()
-        elif isinstance(data, bytes):
-            pass
-        else:
+        if not isinstance(data, (bytes, memoryview)):
             raise TypeError("Invalid data type: %s (require bytes/memoryview)" % type(data))
-        self.__bucket.append_object(self.__path, self.__infile_offset, data)
-        self.__infile_offset += len(data)
+        self.__buffer += data
+        if len(self.__buffer) >= self.__buffer_size:
+            self.__send()
+
+    def __send(self):
+        if len(self.__buffer) == 0:
+            return
+        self.__bucket.append_object(self.__path, self.__infile_offset, bytes(self.__buffer))
+        self.__infile_offset += len(self.__buffer)
+        self.__buffer = bytearray()
     
     def flush(self):
-        return
+        self.__send()
     
     def close(self):
-        return
+        self.__send()
 
 class OSSStorage(StorageBase):
-    def __init__(self, bucket : str, endpoint : str, app_key : str, app_secret : str):
+    """
+    All files of OSSStorage share a single HTTP session with a pool of `pool_size` connections.
+
+    split_size: positional reads larger than this are split into parallel ranged GETs.
+    append_size: appended data is sent to OSS in requests of about this size.
+    """
+    def __init__(self, bucket : str, endpoint : str, app_key : str, app_secret : str, 
+            pool_size : int = 32, split_size : int = 8 * 1024 * 1024, append_size : int = 8 * 1024 * 1024):
         self.__bucket_name = bucket
         self.__endpoint = endpoint
+        self.__session = oss2.Session(pool_size=pool_size)
+        self.__pool_size = pool_size
+        self.__split_size = split_size
+        self.__append_size = append_size
+        self.__executor = None
+        self.__executor_lock = threading.Lock()
         self.auth = oss2.Auth(app_key, app_secret)
-        self.bucket = oss2.Bucket(self.auth, endpoint, bucket)
-        
+        self.bucket = oss2.Bucket(self.auth, endpoint, bucket, session=self.__session)
+        # CRC of a range can not be checked, ranged reads skip it
+        self.__range_bucket = oss2.Bucket(self.auth, endpoint, bucket, session=self.__session, enable_crc=False)
+
+    @property
+    def split_size(self) -> int:
+        return self.__split_size
+
+    def uri(self, path : str) -> str:
+        if path.startswith("/"):
+            path = path[1:]
+        return "%s/%s/%s" % (self.__endpoint.rstrip("/"), self.__bucket_name, path)
+
+    @property
+    def _executor(self) -> ThreadPoolExecutor:
+        with self.__executor_lock:
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(max_workers=self.__pool_size)
+            return self.__executor
+
+    def _get_range(self, path : str, offset : int, view : memoryview) -> int:
+        if len(view) == 0:
+            return 0
+        try:
+            result = self.__range_bucket.get_object(path, byte_range=(offset, offset + len(view) - 1))
+        except oss2.exceptions.ServerError as e:
+            if e.status == 416:
+                return 0
+            raise e
+        if result.content_range is None:
+            # the whole object is returned if the range is not satisfiable
+            data = memoryview(result.read())[offset: offset + len(view)]
+            view[:len(data)] = data
+            return len(data)
+        return _readinto_result(result, view, True)
     
     def open(self, path, mode, begin=None, end=None) -> OSSFile:
         if path.startswith("/"):
             path = path[1:]
         if mode == "r":
-            if end is not None:
-                return OSSReadableFile(self.bucket.get_object(path, byte_range=(begin, end - 1))) 
+            if begin is None and end is None:
+                return OSSReadableFile(lambda: self.bucket.get_object(path))
+            elif end is not None:
+                return OSSReadableFile(lambda: self.__range_bucket.get_object(path, byte_range=(begin, end - 1)), direct=True)
             else:
-                return OSSReadableFile(self.bucket.get_object(path, byte_range=(begin, None)))
+                return OSSReadableFile(lambda: self.__range_bucket.get_object(path, byte_range=(begin, None)), direct=True)
         elif mode == "a":
-            # self.bucket is a stateful object with a session of signature
-            
-            return OSSAppendableFile(oss2.Bucket(self.auth, self.__endpoint, self.__bucket_name), path)
+            # buckets keep the signature state, every file gets its own bucket on the shared session
+            return OSSAppendableFile(oss2.Bucket(self.auth, self.__endpoint, self.__bucket_name, session=self.__session), path, self.__append_size)
         else:
             raise ValueError("Unknown mode: `%s`" % mode)
+
+    def open_random(self, path : str) -> OSSRandomFile:
+        if path.startswith("/"):
+            path = path[1:]
+        return OSSRandomFile(self, path)
         
     
     def filesize(self, path : str):
@@ -88,7 +224,64 @@ class OSSStorage(StorageBase):
         except oss2.exceptions.NoSuchKey:
             return None
     
+    def list(self, prefix : str) -> Dict[str, int]:
+        if prefix.startswith("/"):
+            prefix = prefix[1:]
+        ret = {}
+        for obj in oss2.ObjectIterator(self.bucket, prefix=prefix, delimiter="/", max_keys=1000):
+            if obj.is_prefix():
+                continue
+            ret[obj.key[len(prefix):]] = obj.size
+        return ret
+    
     def put(self, path: str, data: Union[bytes, io.IOBase] ):
         if path.startswith("/"):
             path = path[1:]
         self.bucket.put_object(path, data)
+
+
+class AsyncOSSStorage(AsyncStorageBase):
+    """
+    oss2 has no asynchronous API, requests run in a bounded thread pool.
+    """
+    def __init__(self, bucket : str, endpoint : str, app_key : str, app_secret : str, max_concurrency : int = 64):
+        # one pooled connection per concurrent request
+        self.bucket = oss2.Bucket(oss2.Auth(app_key, app_secret), endpoint, bucket, session=oss2.Session(pool_size=max_concurrency))
+        self.__max_concurrency = max_concurrency
+        self.__executor = None
+    
+    def __filesize(self, path : str):
+        try:
+            return self.bucket.get_object_meta(path).content_length
+        except oss2.exceptions.NoSuchKey:
+            return None
+    
+    def __pread(self, path : str, offset : int, length : int) -> bytes:
+        try:
+            return self.bucket.get_object(path, byte_range=(offset, offset + length - 1)).read()
+        except oss2.exceptions.ServerError as e:
+            if e.status == 416:
+                return b""
+            raise e
+    
+    def __run(self, func, *args):
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(max_workers=self.__max_concurrency)
+        return asyncio.get_event_loop().run_in_executor(self.__executor, func, *args)
+    
+    async def filesize(self, path : str):
+        if path.startswith("/"):
+            path = path[1:]
+        return await self.__run(self.__filesize, path)
+    
+    async def pread(self, path : str, offset : int, length : int) -> bytes:
+        if path.startswith("/"):
+            path = path[1:]
+        if length <= 0:
+            return b""
+        return await self.__run(self.__pread, path, offset, length)
+    
+    async def close(self):
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
@@ -2,11 +2,20 @@ import argparse
 
 def bind_row(parser : argparse.ArgumentParser):
     parser.add_argument("url", help="KARA Storage location", type=str)
-    parser.add_argument("action", help="actions: view dataset", type=str, choices=["view"])
+    parser.add_argument("action", help="actions: view, export or transform dataset", type=str, choices=["view", "export", "transform"])
     parser.add_argument("namespace", help="namespace", type=str)
     parser.add_argument("key", help="key", type=str)
     parser.add_argument("-v", "--version", type=str, default=None, help="version")
     parser.add_argument("--begin", help="beginning index of dataset", type=int, default=0)
+    parser.add_argument("-o", "--output", type=str, default=None, help="output file of export")
+    parser.add_argument("--format", type=str, default="jsonl", choices=["jsonl", "numpy", "arrow"], help="output format of export")
+    parser.add_argument("--columns", type=str, default=None, help="comma separated columns to export")
+    parser.add_argument("--batch-size", type=int, default=1024, help="number of rows exported in each batch")
+    parser.add_argument("--fn", type=str, default=None, help="transform function `module:function`, which maps a row to a new row or None")
+    parser.add_argument("--dst-namespace", type=str, default=None, help="namespace of transform output, defaults to the source namespace")
+    parser.add_argument("--dst-key", type=str, default=None, help="key of transform output")
+    parser.add_argument("--dst-version", type=str, default=None, help="version of transform output")
+    parser.add_argument("--workers", type=int, default=4, help="number of transform processes")
     parser.add_argument("--app-key", type=str, default=None, help="OSS app key")
     parser.add_argument("--app-secret", type=str, default=None, help="OSS app secret")
 
@@ -2,6 +2,7 @@ import kara_storage
 import blessed
 import signal
 import json
+import importlib
 
 widths = [
     (126,    1), (159,    0), (687,     1), (710,   0), (711,   1), 
@@ -23,6 +24,56 @@ def char_width( o ):
             return wid
     return 1
 
+def export_row(ds, args):
+    if args.output is None:
+        raise ValueError("Output file is required, use `-o` to specify it")
+    columns = None if args.columns is None else args.columns.split(",")
+
+    if args.format == "jsonl":
+        with open(args.output, "w", encoding="utf-8") as fout:
+            while True:
+                rows = ds.read_many(args.batch_size)
+                if len(rows) == 0:
+                    break
+                for row in rows:
+                    if columns is not None:
+                        row = { name : row.get(name) for name in columns }
+                    fout.write(json.dumps(row, ensure_ascii=False) + "\n")
+    elif args.format == "numpy":
+        import numpy as np
+        batches = list(ds.iter_batches(args.batch_size, columns, format="numpy"))
+        if len(batches) == 0:
+            raise ValueError("Nothing to export")
+        np.savez(args.output, **{
+            name : np.concatenate([batch[name] for batch in batches]) for name in batches[0].keys()
+        })
+    elif args.format == "arrow":
+        import pyarrow as pa
+        writer = None
+        for batch in ds.iter_batches(args.batch_size, columns, format="arrow"):
+            if writer is None:
+                writer = pa.ipc.new_file(args.output, batch.schema)
+            writer.write_batch(batch)
+        if writer is None:
+            raise ValueError("Nothing to export")
+        writer.close()
+
+def transform_row(storage, args):
+    if args.fn is None or args.dst_key is None:
+        raise ValueError("`--fn` and `--dst-key` are required by transform")
+    module_name, func_name = args.fn.split(":", 1)
+    fn = getattr(importlib.import_module(module_name), func_name)
+
+    version = storage.transform(
+        args.namespace, args.key, fn,
+        args.namespace if args.dst_namespace is None else args.dst_namespace,
+        args.dst_key,
+        version="latest" if args.version is None else args.version,
+        dst_version=args.dst_version,
+        num_workers=args.workers
+    )
+    print("Transformed into version `%s`" % version)
+
 def handle_row(args):
     
     kwargs = {}
@@ -31,6 +82,10 @@ def handle_row(args):
     if args.app_secret is not None:
         kwargs["app_secret"] = args.app_secret
     storage = kara_storage.KaraStorage(args.url, **kwargs)
+
+    if args.action == "transform":
+        transform_row(storage, args)
+        return
     ds = storage.open_dataset(
         args.namespace, 
         args.key,
@@ -40,6 +95,10 @@ def handle_row(args):
     )
     ds.seek( args.begin )
 
+    if args.action == "export":
+        export_row(ds, args)
+        return
+
     term = blessed.Terminal()
 
     
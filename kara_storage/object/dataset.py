@@ -140,14 +140,18 @@ class ObjectDataset:
             })
             q_bar.put(1)
     
-    def __upload_thread(self, q_in : queue.Queue, remote_path : str, q_bar : queue.Queue):
+    def __upload_thread(self, q_in : queue.Queue, remote_path : str, q_bar : queue.Queue, remote_files):
         while True:
             try:
                 info = q_in.get_nowait()
             except queue.Empty:
                 break
             
-            if self.__storage.filesize(remote_path + info["file"]) is None:
+            if remote_files is not None:
+                exists = info["file"] in remote_files
+            else:
+                exists = self.__storage.filesize(remote_path + info["file"]) is not None
+            if not exists:
                 # file not exists
                 self.__storage.put( remote_path + info["file"] , open(info["local_path"], "rb") )
             q_bar.put( info["size"] )
@@ -206,9 +210,12 @@ class ObjectDataset:
                     "size": info["size"]
                 })
         
+        # list uploaded files at once instead of checking them one by one
+        remote_files = self.__storage.list(data_prefix)
+
         # start upload threads
         thds = [
-            threading.Thread(target=self.__upload_thread, args=(q_in, data_prefix, q_bar), daemon=True)
+            threading.Thread(target=self.__upload_thread, args=(q_in, data_prefix, q_bar, remote_files), daemon=True)
                 for _ in range(self.num_workers)
         ]
         
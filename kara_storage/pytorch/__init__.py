@@ -4,23 +4,38 @@ from ..row import RowDataset
 if TYPE_CHECKING:
     from .base import KaraPytorchDatasetBase
 
-def make_torch_dataset(ds : RowDataset, shuffle=False, auto_distributed=True, **kwargs) -> 'KaraPytorchDatasetBase':
-    
+def make_torch_dataset(ds : RowDataset, shuffle=False, auto_distributed=True, sharding="contiguous", shard_block_size=1024, cover_remainder=True, **kwargs) -> 'KaraPytorchDatasetBase':
+    """
+    With `sharding="balanced"`, the dataset is split into blocks of `shard_block_size` rows and the blocks are
+    assigned to ranks by byte count, reshuffled every epoch with `seed`. Every rank reads the same number of rows.
+    By default the rows that do not divide evenly between ranks are also read, the last block wraps around to the
+    beginning of the dataset and some blocks are repeated to pad the ranks, `cover_remainder=False` skips them.
+    """
+
     import torch
     import torch.distributed
     from .base import KaraPytorchDatasetBase
     from .iter import SequentialIterator
     from .shuffle import ShuffleIterator
+    from .shard import BlockSharding, ShardedIterator
+
+    if sharding not in ["contiguous", "balanced"]:
+        raise ValueError("Unknown sharding `%s`" % sharding)
+
+    if shuffle:
+        iter_tool = ShuffleIterator
+    else:
+        iter_tool = SequentialIterator
 
     if torch.distributed.is_initialized() and auto_distributed:
         rank = torch.distributed.get_rank()
         size = torch.distributed.get_world_size()
 
+        if sharding == "balanced":
+            block_sharding = BlockSharding(ds, rank, size, shard_block_size, kwargs.get("seed", 0), cover_remainder)
+            return KaraPytorchDatasetBase(ds, ShardedIterator, sharding=block_sharding, iter_tool=iter_tool, **kwargs)
+
         total_length = ds.size()
 
         ds.slice_(total_length * rank // size, total_length // size)
-    if shuffle:
-        ret = KaraPytorchDatasetBase(ds,  ShuffleIterator, **kwargs)
-    else:
-        ret = KaraPytorchDatasetBase(ds, SequentialIterator, **kwargs)
-    return ret
+    return KaraPytorchDatasetBase(ds, iter_tool, **kwargs)
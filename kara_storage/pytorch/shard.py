@@ -0,0 +1,152 @@
+import io
+import heapq
+import bisect
+import random
+import itertools
+from typing import Any, List, Tuple, Type
+from ..abc import DatasetIterator
+from ..row import RowDataset
+
+def assign_blocks(block_bytes : List[int], num_ranks : int, epoch : int, seed : int = 0, cover_remainder : bool = True) -> List[List[int]]:
+    """
+    Assigns block ids to ranks, every rank gets the same number of blocks with byte counts as even as possible.
+
+    Blocks are shuffled with `seed + epoch`, so the assignment changes every epoch but is the same on all ranks.
+    With `cover_remainder` every block is used and the shuffled blocks are repeated to pad the ranks, like
+    DistributedSampler does, otherwise the blocks that do not divide evenly are skipped for this epoch.
+    Ranks read the same number of rows only if the blocks have the same number of rows.
+    """
+    order = list(range(len(block_bytes)))
+    random.Random(seed + epoch).shuffle(order)
+    if cover_remainder:
+        per_rank = (len(order) + num_ranks - 1) // num_ranks
+        order += itertools.islice(itertools.cycle(order), per_rank * num_ranks - len(order))
+    else:
+        per_rank = len(order) // num_ranks
+        if per_rank == 0 and len(order) > 0:
+            raise ValueError("%d blocks can not be split between %d ranks without `cover_remainder`" % (len(order), num_ranks))
+        order = order[:per_rank * num_ranks]
+
+    # largest blocks first, each one goes to the rank with the fewest bytes that still has room
+    position = { block_id: i for i, block_id in reversed(list(enumerate(order))) }
+    heap = [(0, rank) for rank in range(num_ranks)]
+    ret = [[] for _ in range(num_ranks)]
+    for block_id in sorted(order, key=lambda block_id: (-block_bytes[block_id], position[block_id])):
+        load, rank = heapq.heappop(heap)
+        ret[rank].append(block_id)
+        if len(ret[rank]) < per_rank:
+            heapq.heappush(heap, (load + block_bytes[block_id], rank))
+
+    # read the blocks of a rank in the shuffled order
+    for blocks in ret:
+        blocks.sort(key=position.__getitem__)
+    return ret
+
+class BlockShard:
+    """
+    BlockShard reads a list of (start, length) row blocks of a dataset as a single sequential dataset.
+    """
+    def __init__(self, ds : RowDataset, blocks : List[Tuple[int, int]]) -> None:
+        self.__ds = ds
+        self.__blocks = blocks
+        self.__begins = []
+        total = 0
+        for _, length in blocks:
+            self.__begins.append(total)
+            total += length
+        self.__length = total
+        self.__tell = 0
+        self.__seek_pending = True
+
+    @property
+    def blocks(self) -> List[Tuple[int, int]]:
+        return self.__blocks
+
+    def seek(self, offset : int, whence : int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            nw_pos = offset
+        elif whence == io.SEEK_CUR:
+            nw_pos = self.__tell + offset
+        elif whence == io.SEEK_END:
+            nw_pos = self.__length - offset
+        else:
+            raise ValueError("Invalid whence: %d" % whence)
+        self.__tell = max(0, min(nw_pos, self.__length))
+        self.__seek_pending = True
+        return self.__tell
+
+    def read(self) -> Any:
+        if self.__tell == self.__length:
+            raise EOFError()
+        block_id = bisect.bisect_right(self.__begins, self.__tell) - 1
+        block_offset = self.__tell - self.__begins[block_id]
+        if self.__seek_pending or block_offset == 0:
+            self.__ds.seek(self.__blocks[block_id][0] + block_offset, io.SEEK_SET)
+            self.__seek_pending = False
+        self.__tell += 1
+        return self.__ds.read()
+
+    def tell(self) -> int:
+        return self.__tell
+
+    def size(self) -> int:
+        return self.__length
+
+    def __len__(self) -> int:
+        return self.__length
+
+class BlockSharding:
+    """
+    BlockSharding splits a dataset into blocks of `block_size` rows and balances them between ranks by byte count.
+    Every rank reads the same number of rows. With `cover_remainder`, the last incomplete block wraps around to the
+    beginning of the dataset to be full sized, otherwise it is not read, nor are the blocks left after an even split.
+    """
+    def __init__(self, ds : RowDataset, rank : int, world_size : int, block_size : int = 1024, seed : int = 0, cover_remainder : bool = True) -> None:
+        if block_size <= 0:
+            raise ValueError("Block size must be positive")
+        self.__ds = ds
+        self.__rank = rank
+        self.__world_size = world_size
+        self.__seed = seed
+        self.__cover_remainder = cover_remainder
+
+        total_length = ds.size()
+        num_blocks = total_length // block_size if not cover_remainder else (total_length + block_size - 1) // block_size
+        if not cover_remainder and num_blocks < world_size:
+            # every rank would get an empty shard
+            raise ValueError("Dataset of %d rows is too small for %d ranks with blocks of %d rows, set `cover_remainder` or a smaller block size" % (total_length, world_size, block_size))
+        # a block is a list of (start, length) segments, only the wrapped block has more than one
+        self.__blocks : List[List[Tuple[int, int]]] = []
+        for i in range(num_blocks):
+            segments = []
+            start, rest = i * block_size, block_size
+            while rest > 0:
+                length = min(rest, total_length - start)
+                segments.append((start, length))
+                start, rest = 0, rest - length
+            self.__blocks.append(segments)
+
+        # byte counts come from the index, no data is read
+        points = sorted(set(
+            pos for segments in self.__blocks for start, length in segments for pos in [start - 1, start + length - 1] if pos >= 0
+        ))
+        ends = dict(zip(points, ds.row_ends(points)))
+        self.__block_bytes = [
+            sum(ends[start + length - 1] - (ends[start - 1] if start > 0 else 0) for start, length in segments)
+            for segments in self.__blocks
+        ]
+
+    @property
+    def block_bytes(self) -> List[int]:
+        return self.__block_bytes
+
+    def shard(self, epoch : int) -> BlockShard:
+        assignment = assign_blocks(self.__block_bytes, self.__world_size, epoch, self.__seed, self.__cover_remainder)
+        return BlockShard(self.__ds, [segment for block_id in assignment[self.__rank] for segment in self.__blocks[block_id]])
+
+class ShardedIterator(DatasetIterator):
+    def __init__(self, ds : RowDataset, epoch : int, sharding : BlockSharding, iter_tool : Type[DatasetIterator], **kwargs) -> None:
+        self.__iter = iter_tool(sharding.shard(epoch), epoch, **kwargs)
+
+    def next(self):
+        return self.__iter.next()
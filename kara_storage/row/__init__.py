@@ -1 +1,5 @@
-from .row import RowDataset
\ No newline at end of file
+from .row import RowDataset
+from .writer import ParallelWriter
+from .cache import BlockCache
+from .concat import ConcatDataset
+from .aio import AsyncRowDataset
\ No newline at end of file
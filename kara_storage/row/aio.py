@@ -0,0 +1,297 @@
+import io
+import json
+import array
+import bisect
+import struct
+import asyncio
+from typing import Any, AsyncGenerator, Awaitable, Callable, List, Optional, Tuple
+from ..abc import AsyncStorageBase, Serializer
+from ..serialization import JSONSerializer
+from .compress import get_codec
+from .index import MemoryIndex
+
+def _coalesce(ranges : List[Tuple[int, int]], max_gap : int) -> List[Tuple[int, int, List[int]]]:
+    # merges ranges that overlap or are at most `max_gap` bytes apart, returns (begin, end, ids of ranges)
+    groups = []
+    for i in sorted(range(len(ranges)), key=lambda i: ranges[i][0]):
+        offset, length = ranges[i]
+        if len(groups) > 0 and offset <= groups[-1][1] + max_gap:
+            groups[-1][1] = max(groups[-1][1], offset + length)
+            groups[-1][2].append(i)
+        else:
+            groups.append([offset, offset + length, [i]])
+    return groups
+
+class AsyncTrunkReader:
+    """
+    AsyncTrunkReader reads `<prefix>%d.blk` trunks as a single stream with positional reads.
+    """
+    def __init__(self, storage : AsyncStorageBase, prefix : str, file_sizes : List[int]) -> None:
+        self.__storage = storage
+        self.__prefix = prefix
+        self.__file_sizes = list(file_sizes)
+        self.__trunk_begins = []
+        begin = 0
+        for file_size in self.__file_sizes:
+            self.__trunk_begins.append(begin)
+            begin += file_size
+        self.__size = begin
+
+    @classmethod
+    async def open(cls, storage : AsyncStorageBase, prefix : str, file_sizes : List[int] = None) -> 'AsyncTrunkReader':
+        if file_sizes is None:
+            file_sizes = []
+            while True:
+                file_size = await storage.filesize(prefix + "%d.blk" % len(file_sizes))
+                if file_size is None:
+                    break
+                file_sizes.append(file_size)
+        if len(file_sizes) == 0:
+            raise RuntimeError("Empty dataset !")
+        return cls(storage, prefix, file_sizes)
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    async def pread(self, offset : int, length : int) -> bytes:
+        length = min(length, self.__size - offset)
+        if length <= 0:
+            return b""
+        trunk_id = bisect.bisect_right(self.__trunk_begins, offset) - 1
+        offset -= self.__trunk_begins[trunk_id]
+
+        requests = []
+        while length > 0 and trunk_id < len(self.__file_sizes):
+            ed = min(self.__file_sizes[trunk_id], offset + length)
+            if ed > offset:
+                requests.append(self.__storage.pread(self.__prefix + "%d.blk" % trunk_id, offset, ed - offset))
+            length -= ed - offset
+            offset = 0
+            trunk_id += 1
+        if len(requests) == 1:
+            return await requests[0]
+        return b"".join(await asyncio.gather(*requests))
+
+    async def pread_ranges(self, ranges : List[Tuple[int, int]], max_gap : int = 0) -> List[bytes]:
+        groups = _coalesce(ranges, max_gap)
+        buffers = await asyncio.gather(*[self.pread(begin, end - begin) for begin, end, _ in groups])
+
+        ret : List[bytes] = [b""] * len(ranges)
+        for (begin, _, ids), buf in zip(groups, buffers):
+            view = memoryview(buf)
+            for i in ids:
+                offset, length = ranges[i]
+                ret[i] = view[offset - begin: offset - begin + length].tobytes()
+        return ret
+
+class AsyncCompressedReader:
+    """
+    AsyncCompressedReader reads the stream written by CompressedTrunkController.
+    """
+    def __init__(self, physical : AsyncTrunkReader, records : array.array, codec : str) -> None:
+        self.__physical = physical
+        self.__logical_ends = records[0::2]
+        self.__physical_ends = records[1::2]
+        self.__size = self.__logical_ends[-1] if len(self.__logical_ends) > 0 else 0
+        _, self.__decompress = get_codec(codec)
+
+    @classmethod
+    async def open(cls, storage : AsyncStorageBase, prefix : str, codec : str, file_sizes : List[int] = None, block_file_sizes : List[int] = None):
+        physical, blocks = await asyncio.gather(
+            AsyncTrunkReader.open(storage, prefix + "data/", file_sizes),
+            AsyncTrunkReader.open(storage, prefix + "blocks/", block_file_sizes)
+        )
+        records = array.array("Q")
+        records.frombytes(await blocks.pread(0, blocks.size))
+        return cls(physical, records, codec)
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    async def __load_block(self, block_id : int) -> bytes:
+        begin = self.__physical_ends[block_id - 1] if block_id > 0 else 0
+        compressed = await self.__physical.pread(begin, self.__physical_ends[block_id] - begin)
+        if len(compressed) != self.__physical_ends[block_id] - begin:
+            raise RuntimeError("Dataset is broken at compressed data offset %d ~ %d" % (begin, self.__physical_ends[block_id]))
+        return self.__decompress(compressed)
+
+    async def pread(self, offset : int, length : int) -> bytes:
+        end = min(offset + length, self.__size)
+        if offset >= end:
+            return b""
+        first = bisect.bisect_right(self.__logical_ends, offset)
+        last = bisect.bisect_right(self.__logical_ends, end - 1)
+        blocks = await asyncio.gather(*[self.__load_block(block_id) for block_id in range(first, last + 1)])
+        data = b"".join(blocks) if len(blocks) > 1 else blocks[0]
+        begin = self.__logical_ends[first - 1] if first > 0 else 0
+        return data[offset - begin: end - begin]
+
+    async def pread_ranges(self, ranges : List[Tuple[int, int]], max_gap : int = 0) -> List[bytes]:
+        return list(await asyncio.gather(*[self.pread(offset, length) for offset, length in ranges]))
+
+class AsyncRowDataset:
+    """
+    AsyncRowDataset is a read-only dataset for asyncio applications, use `await AsyncRowDataset.open(...)`
+    or `await KaraStorage.open_async_dataset(...)` to create it.
+
+    All reads are positional, so any number of coroutines may read the dataset concurrently.
+    `close` calls `on_close`, which releases the storage of a dataset opened by `KaraStorage.open_async_dataset`,
+    e.g. `async with await storage.open_async_dataset(...) as ds:`. Slices do not own the storage, closing them
+    does nothing.
+    """
+    def __init__(self,
+            index : AsyncTrunkReader,
+            data : AsyncTrunkReader,
+            serialization : Serializer = None,
+            memory_index : MemoryIndex = None,
+            start : int = None,
+            length : int = None,
+            on_close : Callable[[], Awaitable[None]] = None
+        ) -> None:
+        if serialization is None:
+            serialization = JSONSerializer()
+        self.__on_close = on_close
+        self.__index = index
+        self.__data = data
+        self.__memory_index = memory_index
+        self.__serialization = serialization
+
+        total = len(memory_index) if memory_index is not None else index.size // 8
+        self.__begin = min(start or 0, total)
+        self.__end = total if length is None else min(self.__begin + length, total)
+        self.__length = self.__end - self.__begin
+        self.__tell = 0
+
+    @classmethod
+    async def open(cls,
+            storage : AsyncStorageBase,
+            prefix : str,
+            serialization : Serializer = None,
+            index_cache : str = None,
+            start : int = None,
+            length : int = None,
+            on_close : Callable[[], Awaitable[None]] = None
+        ) -> 'AsyncRowDataset':
+        if not prefix.endswith("/"):
+            prefix = prefix + "/"
+        if index_cache not in [None, "memory"]:
+            raise ValueError("Unknown index cache `%s`" % index_cache)
+
+        manifest = {}
+        if await storage.filesize(prefix + "manifest.json") is not None:
+            manifest = json.loads((await storage.readfile(prefix + "manifest.json")).decode("utf-8"))
+
+        index = await AsyncTrunkReader.open(storage, prefix + "index/", manifest.get("index"))
+        if "compression" in manifest:
+            data = await AsyncCompressedReader.open(storage, prefix, manifest["compression"], manifest.get("data"), manifest.get("blocks"))
+        else:
+            data = await AsyncTrunkReader.open(storage, prefix + "data/", manifest.get("data"))
+
+        memory_index = None
+        if index_cache == "memory":
+            memory_index = MemoryIndex([memoryview(await index.pread(0, index.size))])
+        return cls(index, data, serialization, memory_index, start, length, on_close)
+
+    def slice(self, start : int = 0, length : int = None) -> 'AsyncRowDataset':
+        if length is None:
+            length = self.__length - start
+        return AsyncRowDataset(self.__index, self.__data, self.__serialization, self.__memory_index, self.__begin + start, length)
+
+    async def __data_ranges(self, offsets : List[int]) -> List[Tuple[int, int]]:
+        if self.__memory_index is not None:
+            ret = []
+            for offset in offsets:
+                last_pos = self.__memory_index[offset - 1] if offset > 0 else 0
+                ret.append((last_pos, self.__memory_index[offset] - last_pos))
+            return ret
+
+        index_ranges = [((offset - 1) * 8, 16) if offset > 0 else (0, 8) for offset in offsets]
+        ret = []
+        for (index_offset, index_length), bf in zip(index_ranges, await self.__index.pread_ranges(index_ranges)):
+            if len(bf) != index_length:
+                raise RuntimeError("Dataset is broken at index offset %d, go length %d" % (index_offset, len(bf)))
+            if index_length == 16:
+                last_pos, curr_pos = struct.unpack("QQ", bf)
+            else:
+                last_pos, curr_pos = 0, struct.unpack("Q", bf)[0]
+            ret.append((last_pos, curr_pos - last_pos))
+        return ret
+
+    async def _pread_many_raw(self, offsets : List[int], max_gap : int = 64 * 1024) -> Optional[List[bytes]]:
+        for offset in offsets:
+            if offset < 0 or offset >= self.__length:
+                return None
+        if len(offsets) == 0:
+            return []
+        data_ranges = await self.__data_ranges([offset + self.__begin for offset in offsets])
+        ret = await self.__data.pread_ranges(data_ranges, max_gap)
+        for (pos, length), v in zip(data_ranges, ret):
+            if len(v) != length:
+                raise RuntimeError("Dataset is broken at data offset %d ~ %d" % (pos, pos + length))
+        return ret
+
+    async def pread(self, offset : int) -> Any:
+        byte_ret = await self._pread_many_raw([offset])
+        if byte_ret is None:
+            raise EOFError()
+        return self.__serialization.deserialize(byte_ret[0])
+
+    async def pread_many(self, offsets : List[int]) -> List[Any]:
+        byte_ret = await self._pread_many_raw(offsets)
+        if byte_ret is None:
+            raise EOFError()
+        return [self.__serialization.deserialize(v) for v in byte_ret]
+
+    async def read(self) -> Any:
+        if self.__tell == self.__length:
+            raise EOFError()
+        # move the cursor before awaiting, so concurrent reads get different rows
+        self.__tell += 1
+        return await self.pread(self.__tell - 1)
+
+    def seek(self, offset : int, whence : int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            nw_pos = offset
+        elif whence == io.SEEK_CUR:
+            nw_pos = self.__tell + offset
+        elif whence == io.SEEK_END:
+            nw_pos = self.__length - offset
+        else:
+            raise ValueError("Invalid whence: %d" % whence)
+        self.__tell = max(0, min(nw_pos, self.__length))
+        return self.__tell
+
+    def tell(self) -> int:
+        return self.__tell
+
+    def size(self) -> int:
+        return self.__length
+
+    def __len__(self) -> int:
+        return self.__length
+
+    async def iter(self, batch_size : int = 64) -> AsyncGenerator[Any, None]:
+        """
+        Iterates from the current position, fetching `batch_size` rows per request.
+        """
+        while self.__tell < self.__length:
+            offsets = list(range(self.__tell, min(self.__tell + batch_size, self.__length)))
+            self.__tell = offsets[-1] + 1
+            for v in await self.pread_many(offsets):
+                yield v
+
+    def __aiter__(self):
+        return self.iter()
+
+    async def close(self):
+        if self.__on_close is not None:
+            on_close, self.__on_close = self.__on_close, None
+            await on_close()
+
+    async def __aenter__(self) -> 'AsyncRowDataset':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
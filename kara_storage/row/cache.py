@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+class BlockCache:
+    """
+    BlockCache keeps recently read blocks of trunks in memory, and evicts the least recently used ones
+    when the total size exceeds `capacity` bytes.
+
+    A cache can be shared by multiple controllers and datasets, blocks are keyed by (trunk URI, block id).
+    """
+    def __init__(self, capacity : int = 64 * 1024 * 1024, block_size : int = 64 * 1024) -> None:
+        if block_size <= 0:
+            raise ValueError("Block size must be positive")
+        self.__capacity = capacity
+        self.__block_size = block_size
+        self.__lock = threading.Lock()
+        self.__blocks : 'OrderedDict[Hashable, bytes]' = OrderedDict()
+        self.__size = 0
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def block_size(self) -> int:
+        return self.__block_size
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    @property
+    def hits(self) -> int:
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        return self.__misses
+
+    def get(self, key : Hashable) -> Optional[bytes]:
+        with self.__lock:
+            if key not in self.__blocks:
+                self.__misses += 1
+                return None
+            self.__hits += 1
+            self.__blocks.move_to_end(key)
+            return self.__blocks[key]
+
+    def put(self, key : Hashable, block : bytes):
+        if len(block) > self.__capacity:
+            return
+        with self.__lock:
+            if key in self.__blocks:
+                self.__size -= len(self.__blocks.pop(key))
+            self.__blocks[key] = block
+            self.__size += len(block)
+            while self.__size > self.__capacity:
+                _, evicted = self.__blocks.popitem(last=False)
+                self.__size -= len(evicted)
+
+    def clear(self):
+        with self.__lock:
+            self.__blocks.clear()
+            self.__size = 0
@@ -0,0 +1,249 @@
+import io
+import array
+import bisect
+import struct
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+from ..abc import StorageBase
+from .trunk import TrunkController
+from .readahead import Readahead
+
+def get_codec(name : str) -> Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    """
+    Returns (compress, decompress) functions of a codec.
+    """
+    if name == "zlib":
+        import zlib
+        return zlib.compress, zlib.decompress
+    elif name == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+    elif name == "lz4":
+        import lz4.frame
+        return lz4.frame.compress, lz4.frame.decompress
+    else:
+        raise ValueError("Unknown compression `%s`" % name)
+
+
+class CompressedTrunkController(io.RawIOBase):
+    """
+    CompressedTrunkController stores a stream as independently compressed blocks.
+
+    Compressed blocks are stored in `data/`, and `blocks/` stores the (logical end, physical end) offsets of every block,
+    so a random read only decompresses the blocks containing the requested range.
+    """
+    def __init__(self,
+            storage : StorageBase,
+            prefix : str,
+            mode : str,
+            codec : str,
+            block_size : int = 1024 * 1024,
+            decompress_cache : int = 8,
+            file_sizes : List[int] = None,
+            block_file_sizes : List[int] = None,
+            readahead : int = 0,
+            readahead_size : int = None,
+            **kwargs
+        ) -> None:
+        if not prefix.endswith("/"):
+            prefix = prefix + "/"
+
+        self.__codec = codec
+        self.__compress, self.__decompress = get_codec(codec)
+        self.__block_size = block_size
+        self.__readable = ("r" in mode)
+        self.__writable = ("w" in mode)
+        self.__closed = False
+
+        self.__physical = TrunkController(storage, prefix + "data/", mode, file_sizes=file_sizes, **kwargs)
+        self.__blocks = TrunkController(storage, prefix + "blocks/", mode, file_sizes=block_file_sizes, **kwargs)
+
+        self.__logical_ends = array.array("Q")
+        self.__physical_ends = array.array("Q")
+        if self.__readable:
+            records = array.array("Q")
+            for buf in self.__blocks.load_trunks():
+                records.frombytes(buf)
+                buf.release()
+            self.__logical_ends = records[0::2]
+            self.__physical_ends = records[1::2]
+            self.__size = self.__logical_ends[-1] if len(self.__logical_ends) > 0 else 0
+
+            self.__cache_lock = threading.Lock()
+            self.__cache : 'OrderedDict[int, bytes]' = OrderedDict()
+            self.__cache_blocks = decompress_cache
+
+            # decompress the following blocks in background during sequential reads
+            self.__tell = 0
+            self.__readahead = Readahead(
+                self.pread, self.__size, 
+                window_size=block_size if readahead_size is None else readahead_size, 
+                depth=max(readahead, 1)
+            )
+        if self.__writable:
+            self.__pending = bytearray()
+            self.__size = 0
+            self.__physical_size = self.__physical.size
+            if self.__blocks.size > 0:
+                reader = TrunkController(storage, prefix + "blocks/", "r", file_sizes=self.__blocks.trunk_sizes)
+                self.__size, physical_end = struct.unpack("QQ", reader.pread(self.__blocks.size - 16, 16))
+                reader.close()
+                if physical_end != self.__physical_size:
+                    raise RuntimeError("Dataset is broken at compressed data offset %d" % physical_end)
+
+    def readable(self) -> bool:
+        return self.__readable
+
+    def writable(self) -> bool:
+        return self.__writable
+
+    def seekable(self) -> bool:
+        return self.__readable
+
+    @property
+    def codec(self) -> str:
+        return self.__codec
+
+    @property
+    def mapped(self) -> bool:
+        return False
+
+    @property
+    def size(self) -> int:
+        return self.__size + (len(self.__pending) if self.__writable else 0)
+
+    @property
+    def trunk_sizes(self) -> List[int]:
+        return self.__physical.trunk_sizes
+
+    @property
+    def block_trunk_sizes(self) -> List[int]:
+        return self.__blocks.trunk_sizes
+
+    @property
+    def closed(self) -> bool:
+        return self.__closed
+
+    def __write_all(self, controller : TrunkController, data : bytes):
+        view = memoryview(data)
+        while len(view) > 0:
+            view = view[controller.write(view):]
+
+    def __write_block(self, data : bytes):
+        compressed = self.__compress(data)
+        self.__write_all(self.__physical, compressed)
+        self.__size += len(data)
+        self.__physical_size += len(compressed)
+        self.__write_all(self.__blocks, struct.pack("QQ", self.__size, self.__physical_size))
+
+    def write(self, __b : bytes) -> Optional[int]:
+        if not self.__writable:
+            raise RuntimeError("Dataset not writable")
+        if self.__closed:
+            raise RuntimeError("Dataset is closed")
+
+        self.__pending += __b
+        while len(self.__pending) >= self.__block_size:
+            self.__write_block(bytes(self.__pending[:self.__block_size]))
+            del self.__pending[:self.__block_size]
+        return len(__b)
+
+    def flush(self) -> None:
+        if not self.__writable:
+            return # ignore flush
+        if self.__closed:
+            raise RuntimeError("Dataset is closed")
+        if len(self.__pending) > 0:
+            self.__write_block(bytes(self.__pending))
+            self.__pending = bytearray()
+        self.__physical.flush()
+        self.__blocks.flush()
+
+    def __load_block(self, block_id : int) -> bytes:
+        with self.__cache_lock:
+            if block_id in self.__cache:
+                self.__cache.move_to_end(block_id)
+                return self.__cache[block_id]
+
+        begin = self.__physical_ends[block_id - 1] if block_id > 0 else 0
+        compressed = self.__physical.pread(begin, self.__physical_ends[block_id] - begin)
+        if len(compressed) != self.__physical_ends[block_id] - begin:
+            raise RuntimeError("Dataset is broken at compressed data offset %d ~ %d" % (begin, self.__physical_ends[block_id]))
+        ret = self.__decompress(compressed)
+
+        with self.__cache_lock:
+            self.__cache[block_id] = ret
+            while len(self.__cache) > self.__cache_blocks:
+                self.__cache.popitem(last=False)
+        return ret
+
+    def pread(self, offset : int, length : int) -> bytes:
+        if not self.__readable:
+            raise RuntimeError("Dataset not readable")
+        if self.__closed:
+            raise RuntimeError("Dataset is closed")
+        if offset >= self.__size:
+            return b""
+
+        end = min(offset + length, self.__size)
+        block_id = bisect.bisect_right(self.__logical_ends, offset)
+        parts = []
+        while offset < end:
+            block_begin = self.__logical_ends[block_id - 1] if block_id > 0 else 0
+            block = self.__load_block(block_id)
+            block_end = min(end, self.__logical_ends[block_id])
+            parts.append(block[offset - block_begin: block_end - block_begin])
+            offset = block_end
+            block_id += 1
+        if len(parts) == 1:
+            return parts[0]
+        return b"".join(parts)
+
+    def pread_ranges(self, ranges : List[Tuple[int, int]], max_gap : int = 0) -> List[bytes]:
+        # read in offset order, so neighbouring rows are served by the decompressed block cache
+        ret : List[bytes] = [b""] * len(ranges)
+        for i in sorted(range(len(ranges)), key=lambda i: ranges[i][0]):
+            ret[i] = self.pread(*ranges[i])
+        return ret
+
+    def readinto(self, __buffer) -> Optional[int]:
+        if not self.__readable:
+            raise RuntimeError("Dataset not readable")
+        if self.__closed:
+            raise RuntimeError("Dataset is closed")
+        lw = self.__readahead.readinto(__buffer)
+        self.__tell += lw
+        return lw
+
+    def seek(self, __offset: int, __whence: int = io.SEEK_SET) -> int:
+        if not self.__readable:
+            raise RuntimeError("Dataset not readable")
+        if self.__closed:
+            raise RuntimeError("Dataset is closed")
+
+        nw_pos = __offset
+        if __whence == io.SEEK_CUR:
+            nw_pos = self.__tell + __offset
+        elif __whence == io.SEEK_END:
+            nw_pos = self.__size - __offset
+        nw_pos = max(0, min(nw_pos, self.__size))
+        self.__readahead.seek(nw_pos)
+        self.__tell = nw_pos
+        return self.__tell
+
+    def tell(self) -> int:
+        if self.__writable:
+            return self.size
+        return self.__tell
+
+    def close(self):
+        if not self.__closed:
+            if self.__writable:
+                self.flush()
+            if self.__readable:
+                self.__readahead.close()
+                self.__cache.clear()
+            self.__physical.close()
+            self.__blocks.close()
+            self.__closed = True
@@ -0,0 +1,159 @@
+import io
+import bisect
+from typing import List, Optional, Union
+from ..abc import Dataset
+from .dataset import RawDataset
+
+class ConcatDataset(Dataset):
+    """
+    ConcatDataset is a read-only view of multiple raw datasets as a single one, rows are not copied.
+    Rows are located in members with prefix sums of member sizes.
+    """
+    def __init__(self, members : List[RawDataset]) -> None:
+        if len(members) == 0:
+            raise ValueError("ConcatDataset requires at least one member")
+        self.__members = members
+        self.__begins = []
+        total = 0
+        for member in members:
+            self.__begins.append(total)
+            total += member.size()
+        self.__size = total
+        self.__data_begins = None
+        self.__cur = 0
+        self.__tell = 0
+        self.__closed = False
+
+    def __locate(self, offset : int):
+        member_id = bisect.bisect_right(self.__begins, offset) - 1
+        return member_id, offset - self.__begins[member_id]
+
+    def view(self) -> 'ConcatDataset':
+        if self.__closed:
+            raise RuntimeError("Dataset closed")
+        return ConcatDataset([member.view() for member in self.__members])
+
+    @property
+    def closed(self):
+        return self.__closed
+
+    def close(self):
+        if not self.__closed:
+            for member in self.__members:
+                member.close()
+            self.__closed = True
+
+    def flush(self):
+        return
+
+    def write(self, data : bytes):
+        raise RuntimeError("Concatenated datasets are read-only")
+
+    def write_many(self, data : List[bytes]):
+        raise RuntimeError("Concatenated datasets are read-only")
+
+    def read(self) -> Optional[Union[bytes, memoryview]]:
+        if self.__closed:
+            raise RuntimeError("Dataset closed")
+        while self.__cur < len(self.__members):
+            ret = self.__members[self.__cur].read()
+            if ret is not None:
+                self.__tell += 1
+                return ret
+            if self.__cur + 1 == len(self.__members):
+                break
+            self.__cur += 1
+            self.__members[self.__cur].seek(0, io.SEEK_SET)
+        return None
+
+    def read_many(self, count : int) -> List[Union[bytes, memoryview]]:
+        if self.__closed:
+            raise RuntimeError("Dataset closed")
+        ret = []
+        while len(ret) < count:
+            rows = self.__members[self.__cur].read_many(count - len(ret))
+            ret.extend(rows)
+            if len(ret) < count:
+                if self.__cur + 1 == len(self.__members):
+                    break
+                self.__cur += 1
+                self.__members[self.__cur].seek(0, io.SEEK_SET)
+        self.__tell += len(ret)
+        return ret
+
+    def seek(self, offset : int, whence : int) -> int:
+        if self.__closed:
+            raise RuntimeError("Dataset closed")
+        if whence == io.SEEK_SET:
+            nw_pos = offset
+        elif whence == io.SEEK_CUR:
+            nw_pos = self.__tell + offset
+        elif whence == io.SEEK_END:
+            nw_pos = self.__size - offset
+        else:
+            raise ValueError("Invalid whence: %d" % whence)
+        nw_pos = max(0, min(nw_pos, self.__size))
+
+        self.__cur, member_offset = self.__locate(nw_pos)
+        self.__members[self.__cur].seek(member_offset, io.SEEK_SET)
+        self.__tell = nw_pos
+        return self.__tell
+
+    def pread(self, offset : int) -> Union[bytes, memoryview]:
+        if self.__closed:
+            raise RuntimeError("Dataset closed")
+        if offset < 0 or offset >= self.__size:
+            raise IndexError("Offset %d is out of range [0, %d)" % (offset ,self.__size))
+        member_id, member_offset = self.__locate(offset)
+        return self.__members[member_id].pread(member_offset)
+
+    def pread_many(self, offsets : List[int], max_gap : int = 64 * 1024) -> List[Union[bytes, memoryview]]:
+        if self.__closed:
+            raise RuntimeError("Dataset closed")
+        groups = {}
+        for i, offset in enumerate(offsets):
+            if offset < 0 or offset >= self.__size:
+                raise IndexError("Offset %d is out of range [0, %d)" % (offset ,self.__size))
+            member_id, member_offset = self.__locate(offset)
+            groups.setdefault(member_id, ([], []))
+            groups[member_id][0].append(i)
+            groups[member_id][1].append(member_offset)
+
+        ret = [None] * len(offsets)
+        for member_id, (ids, member_offsets) in groups.items():
+            for i, v in zip(ids, self.__members[member_id].pread_many(member_offsets, max_gap)):
+                ret[i] = v
+        return ret
+
+    def row_ends(self, offsets : List[int], max_gap : int = 64 * 1024) -> List[int]:
+        if self.__closed:
+            raise RuntimeError("Dataset closed")
+        if self.__data_begins is None:
+            # members are laid out one after another
+            self.__data_begins = []
+            total = 0
+            for member in self.__members:
+                self.__data_begins.append(total)
+                if member.size() > 0:
+                    total += member.row_ends([member.size() - 1])[0]
+
+        groups = {}
+        for i, offset in enumerate(offsets):
+            if offset < 0 or offset >= self.__size:
+                raise IndexError("Offset %d is out of range [0, %d)" % (offset ,self.__size))
+            member_id, member_offset = self.__locate(offset)
+            groups.setdefault(member_id, ([], []))
+            groups[member_id][0].append(i)
+            groups[member_id][1].append(member_offset)
+
+        ret = [0] * len(offsets)
+        for member_id, (ids, member_offsets) in groups.items():
+            for i, v in zip(ids, self.__members[member_id].row_ends(member_offsets, max_gap)):
+                ret[i] = self.__data_begins[member_id] + v
+        return ret
+
+    def size(self) -> int:
+        return self.__size
+
+    def tell(self) -> int:
+        return self.__tell
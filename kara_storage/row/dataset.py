@@ -1,19 +1,54 @@
-from .trunk import TrunkController
+from .trunk import TrunkController, TrunkCursor
+from .index import MemoryIndex
+from .compress import CompressedTrunkController
 from ..abc import StorageBase, Dataset
+from typing import List, Union
+import itertools
+import array
 import struct
+import json
 import io
+import threading
 
 class RawDataset(Dataset):
-    def __init__(self, storage : StorageBase, prefix : str, mode : str, buffer_size : int = 1024 * 1024, **kwargs) -> None:
+    def __init__(self,
+            storage : StorageBase,
+            prefix : str,
+            mode : str,
+            buffer_size : int = 1024 * 1024,
+            index_cache : str = None,
+            compression : str = None,
+            compression_block_size : int = 1024 * 1024,
+            decompress_cache : int = 8,
+            **kwargs
+        ) -> None:
         if not prefix.endswith("/"):
             prefix = prefix + "/"
+        if index_cache not in [None, "memory"]:
+            raise ValueError("Unknown index cache `%s`" % index_cache)
 
         self.__closed = True
+        self.__storage = storage
+        self.__prefix = prefix
         self.__mode = mode
+        self.__buffer_size = buffer_size
         self.__writable = ("w" in mode)
         self.__readable = ("r" in mode)
-        self.__index_controller = TrunkController(storage, prefix + "index/" , mode=mode, **kwargs)
-        self.__data_controller = TrunkController(storage, prefix + "data/" , mode=mode, **kwargs)
+
+        manifest = self.__read_manifest()
+        self.__compression = self.__resolve_compression(manifest, compression)
+        self.__index_controller = TrunkController(storage, prefix + "index/" , mode=mode, file_sizes=manifest.get("index"), **kwargs)
+        if self.__compression is None:
+            self.__data_controller = TrunkController(storage, prefix + "data/" , mode=mode, file_sizes=manifest.get("data"), **kwargs)
+        else:
+            self.__data_controller = CompressedTrunkController(
+                storage, prefix, mode, self.__compression, 
+                block_size=compression_block_size, 
+                decompress_cache=decompress_cache,
+                file_sizes=manifest.get("data"), 
+                block_file_sizes=manifest.get("blocks"), 
+                **kwargs
+            )
         
         if self.__readable:
             self.__index_reader = io.BufferedReader(self.__index_controller, buffer_size=buffer_size)
@@ -28,9 +63,94 @@ class RawDataset(Dataset):
         self.__real_data_size = self.__data_controller.size
         self.__tell = 0
         self.__size = self.__index_controller.size // 8
+
+        self.__index = None
+        if self.__readable and index_cache == "memory":
+            self.__index = MemoryIndex(self.__index_controller.load_trunks())
+            self.__size = len(self.__index)
+
+        # number of datasets sharing the controllers, see `view`
+        self.__refs = [1]
+        self.__refs_lock = threading.Lock()
     
     def __del__(self):
         self.close()
+
+    def view(self) -> 'RawDataset':
+        """
+        Returns a dataset sharing the opened trunks and index with this one, but with an independent cursor.
+        No I/O is done until the view is read, and the trunks are closed with the last dataset sharing them.
+        """
+        if self.__closed:
+            raise RuntimeError("Dataset closed")
+        if self.__writable:
+            raise RuntimeError("Dataset can not be shared in mode `%s`" % self.__mode)
+        
+        with self.__refs_lock:
+            self.__refs[0] += 1
+        ret = RawDataset.__new__(RawDataset)
+        ret.__storage = self.__storage
+        ret.__prefix = self.__prefix
+        ret.__mode = self.__mode
+        ret.__buffer_size = self.__buffer_size
+        ret.__writable = self.__writable
+        ret.__readable = self.__readable
+        ret.__compression = self.__compression
+        ret.__index_controller = self.__index_controller
+        ret.__data_controller = self.__data_controller
+        ret.__real_data_size = self.__real_data_size
+        ret.__size = self.__size
+        ret.__index = self.__index
+        ret.__refs = self.__refs
+        ret.__refs_lock = self.__refs_lock
+
+        ret.__index_reader = None
+        ret.__data_reader = None
+        ret.__last_read_pos = 0
+        ret.__tell = 0
+        ret.__closed = False
+        return ret
+
+    def __open_readers(self):
+        if self.__index_reader is None:
+            # readers of views are opened lazily, thousands of views may be created for sharding
+            self.__index_reader = io.BufferedReader(TrunkCursor(self.__index_controller), buffer_size=self.__buffer_size)
+            self.__data_reader = io.BufferedReader(TrunkCursor(self.__data_controller), buffer_size=self.__buffer_size)
+
+    def __read_manifest(self):
+        # datasets written by older versions have no manifest
+        path = self.__prefix + "manifest.json"
+        if self.__storage.filesize(path) is None:
+            return {}
+        return json.loads(self.__storage.readfile(path).decode("utf-8"))
+
+    def __resolve_compression(self, manifest, compression):
+        if "compression" in manifest:
+            # the codec of an existing dataset can not be changed
+            if compression is not None and compression != manifest["compression"]:
+                raise ValueError("Dataset is compressed with `%s`, got `%s`" % (manifest["compression"], compression))
+            return manifest["compression"]
+        if compression is None:
+            return None
+        if "data" in manifest:
+            has_data = sum(manifest["data"]) > 0
+        else:
+            has_data = (self.__storage.filesize(self.__prefix + "data/0.blk") or 0) > 0
+        if has_data:
+            raise ValueError("Can not enable compression on an uncompressed dataset")
+        return compression
+
+    def __write_manifest(self):
+        index_sizes = self.__index_controller.trunk_sizes
+        manifest = {
+            "index": index_sizes,
+            "data": self.__data_controller.trunk_sizes,
+            "rows": sum(index_sizes) // 8
+        }
+        if self.__compression is not None:
+            manifest["compression"] = self.__compression
+            manifest["blocks"] = self.__data_controller.block_trunk_sizes
+        self.__storage.put(self.__prefix + "manifest.json", json.dumps(manifest).encode("utf-8"))
     
     @property
     def closed(self):
@@ -38,20 +158,36 @@ class RawDataset(Dataset):
     
     def close(self):
         if not self.__closed:
-            if self.__readable:
-                self.__index_reader.close()
-                self.__data_reader.close()
+            if self.__readable and self.__index_reader is not None:
+                # the controllers may be shared with views, they are closed with the last reference
+                self.__index_reader.detach()
+                self.__data_reader.detach()
             if self.__writable:
-                self.__index_writer.close()
                 self.__data_writer.close()
+                self.__index_writer.close()
+                self.__write_manifest()
             self.__closed = True
+
+            with self.__refs_lock:
+                self.__refs[0] -= 1
+                last = (self.__refs[0] == 0)
+            if last and self.__readable:
+                if self.__index is not None:
+                    self.__index.close()
+                self.__index_controller.close()
+                self.__data_controller.close()
     
     def flush(self):
         if self.__writable:
             if self.__closed:
                 raise RuntimeError("Dataset closed")
-            self.__index_writer.flush()
             self.__data_writer.flush()
+            self.__index_writer.flush()
+            # BufferedWriter does not flush the raw stream, flush the trunks so they are visible to readers.
+            # Data goes first, so the index never points to rows that are not written yet.
+            self.__data_controller.flush()
+            self.__index_controller.flush()
+            self.__write_manifest()
     
     def write(self, data : bytes):
         if self.__closed:
@@ -64,22 +200,45 @@ class RawDataset(Dataset):
         self.__size += 1
         self.__index_writer.write( struct.pack("Q", self.__real_data_size) )
 
+    def write_many(self, data : List[bytes]):
+        if self.__closed:
+            raise RuntimeError("Dataset closed")
+        if not self.__writable:
+            raise RuntimeError("Dataset not writable in mode `%s`" % self.__mode)
+        if len(data) == 0:
+            return
+
+        # end offsets of all rows, packed at once
+        ends = array.array("Q", itertools.accumulate(itertools.chain([self.__real_data_size], (len(v) for v in data))))
+        self.__data_writer.write(b"".join(data))
+        self.__index_writer.write(memoryview(ends)[1:])
+        self.__real_data_size = ends[-1]
+        self.__size += len(data)
+
     
-    def read(self) -> bytes:
+    def read(self) -> Union[bytes, memoryview]:
         if self.__closed:
             raise RuntimeError("Dataset closed")
         if not self.__readable:
             raise RuntimeError("Dataset not readable in mode `%s`" % self.__mode)
         if self.__tell == self.__size:
             return None
-        v = self.__index_reader.read(8)
-        if v is None:
-            return None
-        if len(v) != 8:
-            raise RuntimeError("Dataset is broken at index offset %d, got length %d" % (self.__tell * 8, len(v)))
-        cur_read_pos = struct.unpack("Q", v)[0]
+        self.__open_readers()
+        if self.__index is not None:
+            cur_read_pos = self.__index[self.__tell]
+        else:
+            v = self.__index_reader.read(8)
+            if v is None:
+                return None
+            if len(v) != 8:
+                raise RuntimeError("Dataset is broken at index offset %d, got length %d" % (self.__tell * 8, len(v)))
+            cur_read_pos = struct.unpack("Q", v)[0]
         length = cur_read_pos - self.__last_read_pos
-        ret = self.__data_reader.read(length)
+        if self.__data_controller.mapped:
+            # zero-copy read from the mapped trunks
+            ret = self.__data_controller.pread(self.__last_read_pos, length)
+        else:
+            ret = self.__data_reader.read(length)
         if len(ret) != length:
             raise RuntimeError("Dataset is broken at data offset %d ~ %d" % (self.__last_read_pos, cur_read_pos))
         self.__last_read_pos = cur_read_pos
@@ -88,12 +247,51 @@ class RawDataset(Dataset):
         
 
     
+    def read_many(self, count : int) -> List[Union[bytes, memoryview]]:
+        """
+        Read at most `count` rows with a single index read and a single data read.
+        """
+        if self.__closed:
+            raise RuntimeError("Dataset closed")
+        if not self.__readable:
+            raise RuntimeError("Dataset not readable in mode `%s`" % self.__mode)
+        count = min(count, self.__size - self.__tell)
+        if count <= 0:
+            return []
+        self.__open_readers()
+        
+        if self.__index is not None:
+            ends = [self.__index[i] for i in range(self.__tell, self.__tell + count)]
+        else:
+            v = self.__index_reader.read(count * 8)
+            if len(v) != count * 8:
+                raise RuntimeError("Dataset is broken at index offset %d, got length %d" % (self.__tell * 8, len(v)))
+            ends = array.array("Q", v)
+        
+        begin = self.__last_read_pos
+        if self.__data_controller.mapped:
+            data = self.__data_controller.pread(begin, ends[-1] - begin)
+        else:
+            data = self.__data_reader.read(ends[-1] - begin)
+        if len(data) != ends[-1] - begin:
+            raise RuntimeError("Dataset is broken at data offset %d ~ %d" % (begin, ends[-1]))
+        
+        ret = []
+        last_pos = begin
+        for end in ends:
+            ret.append(data[last_pos - begin: end - begin])
+            last_pos = end
+        self.__last_read_pos = last_pos
+        self.__tell += count
+        return ret
+    
     def seek(self, offset : int, whence : int) -> int:
         if self.__closed:
             raise RuntimeError("Dataset closed")
         if not self.__readable:
             raise RuntimeError("Dataset not seekable in mode `%s`" % self.__mode)
 
+        self.__open_readers()
         nw_pos = None
         if whence == io.SEEK_SET:
             nw_pos = offset
@@ -107,7 +305,9 @@ class RawDataset(Dataset):
             nw_pos = 0
         if nw_pos > self.__size:
             nw_pos = self.__size
-        if nw_pos > 0:
+        if self.__index is not None:
+            self.__last_read_pos = self.__index[nw_pos - 1] if nw_pos > 0 else 0
+        elif nw_pos > 0:
             self.__index_reader.seek((nw_pos - 1) * 8, io.SEEK_SET)
             self.__last_read_pos = struct.unpack("Q", self.__index_reader.read(8))[0]
         else:
@@ -119,15 +319,18 @@ class RawDataset(Dataset):
 
         return self.__tell
             
-    def pread(self, offset : int) -> bytes:
+    def pread(self, offset : int) -> Union[bytes, memoryview]:
         if self.__closed:
             raise RuntimeError("Dataset closed")
         if not self.__readable:
             raise RuntimeError("Dataset not readable in mode `%s`" % self.__mode)
-        if offset >= self.__size:
+        if offset < 0 or offset >= self.__size:
             raise IndexError("Offset %d is out of range [0, %d)" % (offset ,self.__size))
 
-        if offset > 0:
+        if self.__index is not None:
+            last_pos = self.__index[offset - 1] if offset > 0 else 0
+            curr_pos = self.__index[offset]
+        elif offset > 0:
             bf = self.__index_controller.pread((offset - 1) * 8, 16)
             if len(bf) != 16:
                 raise RuntimeError("Dataset is broken at index offset %d, go length %d" % ((offset - 1) * 8, len(bf)))
@@ -144,7 +347,64 @@ class RawDataset(Dataset):
         if len(ret) != curr_pos - last_pos:
             raise RuntimeError("Dataset is broken at data offset %d ~ %d" % (last_pos, curr_pos))
         return ret
-    
+
+    def pread_many(self, offsets : List[int], max_gap : int = 64 * 1024) -> List[Union[bytes, memoryview]]:
+        if self.__closed:
+            raise RuntimeError("Dataset closed")
+        if not self.__readable:
+            raise RuntimeError("Dataset not readable in mode `%s`" % self.__mode)
+        for offset in offsets:
+            if offset < 0 or offset >= self.__size:
+                raise IndexError("Offset %d is out of range [0, %d)" % (offset ,self.__size))
+
+        data_ranges = []
+        if self.__index is not None:
+            for offset in offsets:
+                last_pos = self.__index[offset - 1] if offset > 0 else 0
+                data_ranges.append((last_pos, self.__index[offset] - last_pos))
+            index_ranges = []
+        else:
+            index_ranges = [
+                ((offset - 1) * 8, 16) if offset > 0 else (0, 8)
+                    for offset in offsets
+            ]
+        for (index_offset, index_length), bf in zip(index_ranges, self.__index_controller.pread_ranges(index_ranges, max_gap)):
+            if len(bf) != index_length:
+                raise RuntimeError("Dataset is broken at index offset %d, go length %d" % (index_offset, len(bf)))
+            if index_length == 16:
+                last_pos, curr_pos = struct.unpack("QQ", bf)
+            else:
+                last_pos, curr_pos = 0, struct.unpack("Q", bf)[0]
+            data_ranges.append((last_pos, curr_pos - last_pos))
+
+        ret = self.__data_controller.pread_ranges(data_ranges, max_gap)
+        for (pos, length), v in zip(data_ranges, ret):
+            if len(v) != length:
+                raise RuntimeError("Dataset is broken at data offset %d ~ %d" % (pos, pos + length))
+        return ret
+
+    def row_ends(self, offsets : List[int], max_gap : int = 64 * 1024) -> List[int]:
+        """
+        Returns the data end position of each row, read from the index without touching the data.
+        """
+        if self.__closed:
+            raise RuntimeError("Dataset closed")
+        if not self.__readable:
+            raise RuntimeError("Dataset not readable in mode `%s`" % self.__mode)
+        for offset in offsets:
+            if offset < 0 or offset >= self.__size:
+                raise IndexError("Offset %d is out of range [0, %d)" % (offset ,self.__size))
+
+        if self.__index is not None:
+            return [self.__index[offset] for offset in offsets]
+        index_ranges = [(offset * 8, 8) for offset in offsets]
+        ret = []
+        for (index_offset, _), bf in zip(index_ranges, self.__index_controller.pread_ranges(index_ranges, max_gap)):
+            if len(bf) != 8:
+                raise RuntimeError("Dataset is broken at index offset %d, go length %d" % (index_offset, len(bf)))
+            ret.append(struct.unpack("Q", bf)[0])
+        return ret
+
     def size(self) -> int:
         return self.__size
     
@@ -0,0 +1,59 @@
+import bisect
+from typing import List
+
+class MemoryIndex:
+    """
+    MemoryIndex keeps the offsets stored in `index/` trunks in memory.
+    The i-th entry is the end offset of the i-th row in the data stream.
+    """
+    def __init__(self, buffers : List[memoryview]) -> None:
+        self.__buffers = buffers
+        self.__views : List[memoryview] = []
+        self.__begins : List[int] = []
+
+        # trunks are used without copying, only the entries across the boundary of two trunks are copied
+        parts : List[memoryview] = []
+        carry = b""
+        for buf in buffers:
+            buf = buf.cast("B")
+            head = 0
+            if len(carry) > 0:
+                head = min(8 - len(carry), buf.nbytes)
+                carry += buf[:head].tobytes()
+                if len(carry) < 8:
+                    continue
+                parts.append(memoryview(carry))
+                carry = b""
+            tail = buf.nbytes - (buf.nbytes - head) % 8
+            parts.append(buf[head:tail])
+            carry = buf[tail:].tobytes()
+
+        total = 0
+        for buf in parts:
+            if buf.nbytes == 0:
+                continue
+            self.__begins.append(total)
+            self.__views.append(buf.cast("Q"))
+            total += len(self.__views[-1])
+        self.__size = total
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def __getitem__(self, key : int) -> int:
+        if key < 0 or key >= self.__size:
+            raise IndexError("Index `%d` is out of range" % key)
+        if len(self.__views) == 1:
+            return self.__views[0][key]
+        pos = bisect.bisect_right(self.__begins, key) - 1
+        return self.__views[pos][key - self.__begins[pos]]
+
+    def close(self):
+        for view in self.__views:
+            view.release()
+        for buf in self.__buffers:
+            buf.release()
+        self.__views = []
+        self.__buffers = []
+        self.__begins = []
+        self.__size = 0
@@ -0,0 +1,188 @@
+import json
+import math
+import array
+import bisect
+import heapq
+import hashlib
+import itertools
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from ..abc import StorageBase, Serializer
+
+def key_hash(key : Any) -> int:
+    """
+    64-bit hash of a key, keys other than bytes are compared by `str(key)`.
+    """
+    if not isinstance(key, bytes):
+        key = str(key).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+def hash_keys(serialization : Serializer, key : Union[str, Callable[[Any], Any]], rows : List[bytes]) -> array.array:
+    """
+    Hashes the keys of serialized rows, `key` is a column of dict rows or a function returning the key of a row.
+    """
+    key_func = (lambda row: row[key]) if isinstance(key, str) else key
+    return array.array("Q", (key_hash(key_func(row)) for row in serialization.deserialize_many(rows)))
+
+def _sorted_entries(hashes : array.array, rows : array.array, chunk_size : int) -> Iterator[Tuple[int, int]]:
+    # sorts chunks of packed (hash, row) pairs and merges them, so no python objects are kept per entry
+    chunks = []
+    for begin in range(0, len(hashes), chunk_size):
+        end = min(begin + chunk_size, len(hashes))
+        chunk = array.array("Q")
+        for i in sorted(range(begin, end), key=hashes.__getitem__):
+            chunk.append(hashes[i])
+            chunk.append(rows[i])
+        chunks.append(chunk)
+    return heapq.merge(*[
+        zip(itertools.islice(chunk, 0, None, 2), itertools.islice(chunk, 1, None, 2))
+            for chunk in chunks
+    ])
+
+def _bloom_positions(h : int, num_bits : int, num_hashes : int):
+    h1, h2 = h & 0xffffffff, (h >> 32) | 1
+    return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+
+def write_key_index(
+        storage : StorageBase,
+        prefix : str,
+        hashes : array.array,
+        rows : array.array,
+        key : Optional[str] = None,
+        block_entries : int = 1024,
+        bloom_bits_per_key : int = 10,
+        num_rows : Optional[int] = None,
+        sort_chunk_size : int = 1024 * 1024
+    ):
+    """
+    Writes (hash, row) entries sorted by hash under `prefix`:
+        entries: sorted (hash, row) pairs, 16 bytes each
+        fences: first hash of every `block_entries` entries
+        bloom: optional Bloom filter of hashes
+        meta.json: written last, so readers never see a partial index
+
+    `num_rows` is the size of the dataset, which tells whether rows were appended after the index was built.
+    Entries are sorted in chunks of `sort_chunk_size` and merged into a temporary file.
+    """
+    fences = array.array("Q")
+    entries = tempfile.TemporaryFile()
+    buf = array.array("Q")
+    for i, (h, row) in enumerate(_sorted_entries(hashes, rows, sort_chunk_size)):
+        if i % block_entries == 0:
+            fences.append(h)
+        buf.append(h)
+        buf.append(row)
+        if len(buf) >= 128 * 1024:
+            buf.tofile(entries)
+            buf = array.array("Q")
+    buf.tofile(entries)
+    entries.seek(0)
+
+    bloom_bits = 0
+    bloom_hashes = 0
+    if bloom_bits_per_key > 0 and len(hashes) > 0:
+        bloom_bits = max(64, len(hashes) * bloom_bits_per_key)
+        bloom_hashes = max(1, round(bloom_bits_per_key * math.log(2)))
+        bloom = bytearray((bloom_bits + 7) // 8)
+        for h in hashes:
+            for pos in _bloom_positions(h, bloom_bits, bloom_hashes):
+                bloom[pos >> 3] |= 1 << (pos & 7)
+        storage.put(prefix + "bloom", bytes(bloom))
+
+    try:
+        storage.put(prefix + "entries", entries)
+    finally:
+        entries.close()
+    storage.put(prefix + "fences", fences.tobytes())
+    storage.put(prefix + "meta.json", json.dumps({
+        "key": key,
+        "entries": len(hashes),
+        "rows": num_rows,
+        "block_entries": block_entries,
+        "bloom_bits": bloom_bits,
+        "bloom_hashes": bloom_hashes,
+    }).encode("utf-8"))
+
+class KeyIndex:
+    """
+    KeyIndex looks up row ids by key hashes. Only the fences and the Bloom filter are kept in memory,
+    each lookup reads the entries of a single block, or maps the entries file if the storage supports it.
+    """
+    def __init__(self, storage : StorageBase, prefix : str) -> None:
+        if storage.filesize(prefix + "meta.json") is None:
+            raise KeyError("Key index `%s` not found" % prefix)
+        meta = json.loads(storage.readfile(prefix + "meta.json").decode("utf-8"))
+        self.__key : Optional[str] = meta["key"]
+        self.__num_entries = meta["entries"]
+        # indexes written by older versions do not record the size of the dataset
+        self.__num_rows : Optional[int] = meta.get("rows")
+        self.__block_entries = meta["block_entries"]
+        self.__fences = array.array("Q", storage.readfile(prefix + "fences") if self.__num_entries > 0 else b"")
+
+        self.__bloom_bits = meta["bloom_bits"]
+        self.__bloom_hashes = meta["bloom_hashes"]
+        self.__bloom = storage.readfile(prefix + "bloom") if self.__bloom_bits > 0 else None
+
+        self.__mapped = None
+        self.__fp = None
+        if self.__num_entries > 0:
+            self.__mapped = storage.mmap(prefix + "entries")
+            if self.__mapped is None:
+                self.__fp = storage.open_random(prefix + "entries")
+
+    @property
+    def key(self) -> Optional[str]:
+        return self.__key
+
+    @property
+    def num_rows(self) -> Optional[int]:
+        return self.__num_rows
+
+    def __len__(self) -> int:
+        return self.__num_entries
+
+    def __may_contain(self, h : int) -> bool:
+        if self.__bloom is None:
+            return True
+        for pos in _bloom_positions(h, self.__bloom_bits, self.__bloom_hashes):
+            if not (self.__bloom[pos >> 3] >> (pos & 7)) & 1:
+                return False
+        return True
+
+    def __read_entries(self, begin : int, end : int) -> array.array:
+        ret = array.array("Q")
+        if self.__mapped is not None:
+            ret.frombytes(self.__mapped[begin * 16: end * 16])
+        else:
+            buf = bytearray((end - begin) * 16)
+            if self.__fp.preadinto(buf, begin * 16) != len(buf):
+                raise RuntimeError("Key index is broken at entry %d ~ %d" % (begin, end))
+            ret.frombytes(buf)
+        return ret
+
+    def lookup(self, h : int) -> List[int]:
+        """
+        Returns ids of rows whose key hash is `h`.
+        """
+        if self.__num_entries == 0 or not self.__may_contain(h):
+            return []
+        # entries of the same hash may span multiple blocks
+        first_block = max(bisect.bisect_left(self.__fences, h) - 1, 0)
+        last_block = max(bisect.bisect_right(self.__fences, h) - 1, 0)
+        begin = first_block * self.__block_entries
+        end = min((last_block + 1) * self.__block_entries, self.__num_entries)
+
+        entries = self.__read_entries(begin, end)
+        hashes = entries[0::2]
+        lo = bisect.bisect_left(hashes, h)
+        hi = bisect.bisect_right(hashes, h)
+        return list(entries[1::2][lo:hi])
+
+    def close(self):
+        if self.__mapped is not None:
+            self.__mapped.release()
+            self.__mapped = None
+        if self.__fp is not None:
+            self.__fp.close()
+            self.__fp = None
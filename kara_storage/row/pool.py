@@ -0,0 +1,51 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Generator, Hashable
+from ..abc import StorageFileBase
+
+class FilePool:
+    """
+    FilePool keeps a bounded number of opened files and closes the least recently used ones.
+    Files in use are never closed, so the pool may temporarily grow beyond `max_size`.
+    """
+    def __init__(self, open_func : Callable[[Any], StorageFileBase], max_size : int = 16) -> None:
+        self.__open_func = open_func
+        self.__max_size = max_size
+        self.__lock = threading.Lock()
+        self.__files : 'OrderedDict[Hashable, list]' = OrderedDict()    # key -> [file, number of users]
+
+    @contextmanager
+    def get(self, key : Hashable) -> Generator[StorageFileBase, None, None]:
+        with self.__lock:
+            if key in self.__files:
+                self.__files.move_to_end(key)
+                entry = self.__files[key]
+            else:
+                entry = [self.__open_func(key), 0]
+                self.__files[key] = entry
+            entry[1] += 1
+            self.__evict()
+        try:
+            yield entry[0]
+        finally:
+            with self.__lock:
+                entry[1] -= 1
+                self.__evict()
+
+    def __evict(self):
+        if len(self.__files) <= self.__max_size:
+            return
+        for key in list(self.__files.keys()):
+            fp, users = self.__files[key]
+            if users == 0:
+                fp.close()
+                del self.__files[key]
+                if len(self.__files) <= self.__max_size:
+                    break
+
+    def close(self):
+        with self.__lock:
+            for fp, _ in self.__files.values():
+                fp.close()
+            self.__files.clear()
@@ -1,123 +1,243 @@
 import io
-from typing import Any, Generator
+from collections import deque
+from typing import Any, Deque, Generator, Iterable, List
 from ..abc import Dataset, Serializer
+from .ring import ShmRing
 import multiprocessing.connection
-import atexit
+import multiprocessing.util
+from multiprocessing.reduction import ForkingPickler
+import struct
+
+# Reads are requested with a doorbell `<op><int64 arg>` sent as raw bytes, other messages are pickled dicts,
+# which always start with the PROTO opcode.
+DOORBELL = struct.Struct("<cq")
+PICKLED = b"\x80"
+OP_READ_BATCH = b"b"
+OP_PREAD = b"p"
+# the rows are the next records of the ring, the argument is the number of rows
+RET_RING = b"R"
+RET_EOF = b"E"
 
 class RowDatasetProxy(Dataset):
-    def __init__(self, serial_id : int, pipe : multiprocessing.connection.Connection, serialization : Serializer) -> None:
+    """
+    RowDatasetProxy forwards the operations of a dataset to its RowDataset in the parent process.
+    Rows read are written by the parent into a shared memory ring, and deserialized from the ring without copying.
+
+    Sequential reads fetch `batch_size` rows at a time, and the next batch is requested when half of the rows
+    are consumed, so the parent reads ahead while the rows are processed. Rows written are sent every
+    `batch_size` rows, and before any other operation.
+    """
+    def __init__(self,
+            serial_id : int,
+            pipe : multiprocessing.connection.Connection,
+            serialization : Serializer,
+            ring_name : str = None,
+            ring_size : int = 0,
+            batch_size : int = 1
+        ) -> None:
         self.__serial_id = serial_id
         self.__pipe = pipe
         self.__serialization = serialization
-        atexit.register(self.__handle_exit)
+        self.__batch_size = max(batch_size, 1)
+        self.__exited = False
+        self.__ring = None
+        if ring_name is not None:
+            try:
+                self.__ring = ShmRing.attach(ring_name, ring_size)
+            except (ImportError, OSError):
+                # rows are sent through the pipe
+                self.__ring = None
 
-    @property
-    def closed(self):
-        self.__pipe.send({"op": "closed"})
+        # rows read ahead, the cursor of the server is after them
+        self.__queue : Deque[Any] = deque()
+        # a read batch is requested and its response is not received yet
+        self.__inflight = False
+        # the last batch was not full, do not read ahead
+        self.__eof = False
+        self.__write_buffer : List[bytes] = []
+        # unlike atexit, finalizers also run in forked processes, which exit without the interpreter shutdown
+        self.__finalizer = multiprocessing.util.Finalize(None, self.__handle_exit, exitpriority=0)
+
+    def __request(self, cmd : dict) -> Any:
+        self.__pipe.send(cmd)
         ret = self.__pipe.recv()
         if ret["code"] == 0:
-            return ret["data"]
+            return ret.get("data")
         elif ret["code"] == 1:
             raise ret["data"]
         else:
             raise ValueError("Unknown response from dataset server: %s" % ret)
-    
-    def close(self):
-        self.__pipe.send({"op": "close"})
-        ret = self.__pipe.recv()
-        if ret["code"] == 0:
-            return
-        elif ret["code"] == 1:
-            raise ret["data"]
+
+    def __send_read_batch(self, count : int):
+        if self.__ring is not None:
+            self.__pipe.send_bytes(DOORBELL.pack(OP_READ_BATCH, count))
         else:
-            raise ValueError("Unknown response from dataset server: %s" % ret)
-    
-    def flush(self):
-        self.__pipe.send({"op": "flush"})
-        ret = self.__pipe.recv()
+            self.__pipe.send({"op": "read_batch", "data": count})
+
+    def __recv_ring(self, count : int) -> List[Any]:
+        ret = []
+        for _ in range(count):
+            view = self.__ring.get()
+            try:
+                v = self.__serialization.deserialize(view)
+                if isinstance(v, memoryview):
+                    # the space of the record is reused by the next rows
+                    v = v.tobytes()
+            finally:
+                view.release()
+                self.__ring.release()
+            ret.append(v)
+        return ret
+
+    def __recv_rows(self) -> List[Any]:
+        """
+        Receives the rows of a read, an empty list at the end of the dataset.
+        """
+        msg = self.__pipe.recv_bytes()
+        if msg[:1] != PICKLED:
+            code, count = DOORBELL.unpack(msg)
+            if code == RET_EOF:
+                return []
+            elif code != RET_RING:
+                raise ValueError("Unknown response from dataset server: %s" % msg)
+            return self.__recv_ring(count)
+
+        ret = ForkingPickler.loads(msg)
         if ret["code"] == 0:
-            return
+            # the rows that do not fit into the ring follow the ones in it
+            rows = self.__recv_ring(ret.get("ring", 0))
+            return rows + self.__serialization.deserialize_many(ret["data"])
         elif ret["code"] == 1:
             raise ret["data"]
         else:
             raise ValueError("Unknown response from dataset server: %s" % ret)
-    
+
+    def __recv_batch(self) -> int:
+        self.__inflight = False
+        rows = self.__recv_rows()
+        self.__queue.extend(rows)
+        self.__eof = len(rows) < self.__batch_size
+        return len(rows)
+
+    def __sync(self):
+        """
+        Receives the pending read batch and sends the buffered rows, before any other request.
+        """
+        if self.__inflight:
+            self.__recv_batch()
+        if len(self.__write_buffer) > 0:
+            rows = self.__write_buffer
+            self.__write_buffer = []
+            self.__request({"op": "write_batch", "data": rows})
+
+    @property
+    def closed(self):
+        self.__sync()
+        return self.__request({"op": "closed"})
+
+    def close(self):
+        self.__sync()
+        self.__queue.clear()
+        self.__request({"op": "close"})
+
+    def flush(self):
+        self.__sync()
+        self.__request({"op": "flush"})
+
     def write(self, data : Any):
-        byte_data = self.__serialization.serialize(data)
-        
-        self.__pipe.send({"op": "write", "data": byte_data})
-        ret = self.__pipe.recv()
-        if ret["code"] == 0:
-            return
-        elif ret["code"] == 1:
-            raise ret["data"]
-        else:
-            raise ValueError("Unknown response from dataset server: %s" % ret)
-    
+        self.__write_buffer.append(self.__serialization.serialize(data))
+        if len(self.__write_buffer) >= self.__batch_size:
+            self.__sync()
+
+    def write_many(self, data : Iterable[Any]):
+        for v in data:
+            self.write(v)
+        self.__sync()
+
     def read(self) -> Any:
-        self.__pipe.send({"op": "read"})
-        ret = self.__pipe.recv()
-        if ret["code"] == 0:
-            if ret["data"] is None:
+        if len(self.__queue) == 0:
+            if not self.__inflight:
+                self.__sync()
+                self.__send_read_batch(self.__batch_size)
+            if self.__recv_batch() == 0:
                 raise EOFError()
-            return self.__serialization.deserialize(ret["data"])
-        elif ret["code"] == 1:
-            raise ret["data"]
-        else:
-            raise ValueError("Unknown response from dataset server: %s" % ret)
+        ret = self.__queue.popleft()
+        if self.__batch_size > 1 and not self.__inflight and not self.__eof and len(self.__queue) <= self.__batch_size // 2:
+            # the response is received by the next request
+            self.__sync()
+            self.__send_read_batch(self.__batch_size)
+            self.__inflight = True
+        return ret
+
+    def read_many(self, count : int) -> List[Any]:
+        """
+        Read at most `count` rows from the current position, returns an empty list at the end of dataset.
+        """
+        self.__sync()
+        ret = []
+        while len(ret) < count and len(self.__queue) > 0:
+            ret.append(self.__queue.popleft())
+        if len(ret) < count:
+            self.__send_read_batch(count - len(ret))
+            ret.extend(self.__recv_rows())
+        return ret
 
     def seek(self, offset : int, whence : int = io.SEEK_SET) -> int:
-        self.__pipe.send({"op": "seek", "data": (offset, whence)})
-        ret = self.__pipe.recv()
-        if ret["code"] == 0:
-            return ret["data"]
-        elif ret["code"] == 1:
-            raise ret["data"]
-        else:
-            raise ValueError("Unknown response from dataset server: %s" % ret)
-            
+        self.__sync()
+        if whence == io.SEEK_CUR:
+            # the cursor of the server is after the rows read ahead
+            offset -= len(self.__queue)
+        self.__queue.clear()
+        self.__eof = False
+        return self.__request({"op": "seek", "data": (offset, whence)})
+
     def pread(self, offset : int) -> Any:
-        self.__pipe.send({"op": "pread", "data": offset})
-        ret = self.__pipe.recv()
-        if ret["code"] == 0:
-            if ret["data"] is None:
-                raise EOFError()
-            return self.__serialization.deserialize(ret["data"])
-        elif ret["code"] == 1:
-            raise ret["data"]
+        self.__sync()
+        if self.__ring is not None:
+            self.__pipe.send_bytes(DOORBELL.pack(OP_PREAD, offset))
+            rows = self.__recv_rows()
         else:
-            raise ValueError("Unknown response from dataset server: %s" % ret)
-    
+            data = self.__request({"op": "pread", "data": offset})
+            rows = [] if data is None else [self.__serialization.deserialize(data)]
+        if len(rows) == 0:
+            raise EOFError()
+        return rows[0]
+
+    def pread_many(self, offsets : List[int]) -> List[Any]:
+        self.__sync()
+        ret = self.__request({"op": "pread_many", "data": list(offsets)})
+        if ret is None:
+            raise EOFError()
+        return [self.__serialization.deserialize(v) for v in ret]
+
     def size(self) -> int:
-        self.__pipe.send({"op": "size"})
-        ret = self.__pipe.recv()
-        if ret["code"] == 0:
-            return ret["data"]
-        elif ret["code"] == 1:
-            raise ret["data"]
-        else:
-            raise ValueError("Unknown response from dataset server: %s" % ret)
-    
+        self.__sync()
+        return self.__request({"op": "size"})
+
     def tell(self) -> int:
-        self.__pipe.send({"op": "tell"})
-        ret = self.__pipe.recv()
-        if ret["code"] == 0:
-            return ret["data"]
-        elif ret["code"] == 1:
-            raise ret["data"]
-        else:
-            raise ValueError("Unknown response from dataset server: %s" % ret)
-    
+        self.__sync()
+        return self.__request({"op": "tell"}) - len(self.__queue)
+
     def __handle_exit(self):
-        self.__pipe.send({"op": "exit", "data": self.__serial_id})
-    
+        if self.__exited:
+            return
+        self.__exited = True
+        try:
+            # buffered rows are written before the proxy exits
+            self.__sync()
+        finally:
+            self.__pipe.send({"op": "exit", "data": self.__serial_id})
+            if self.__ring is not None:
+                # the ring is removed by the server
+                self.__ring.close()
+
     def __del__(self):
-        atexit.unregister(self.__handle_exit)
+        self.__finalizer.cancel()
         self.__handle_exit()
-    
+
     def __len__(self) -> int:
         return self.size()
-    
+
     def __iter__(self) -> Generator[Any, None, None]:
         while True:
             try:
@@ -125,11 +245,11 @@ class RowDatasetProxy(Dataset):
             except EOFError:
                 break
             yield v
-    
+
     def __getitem__(self, key : int) -> Any:
         if not isinstance(key, int):
             raise TypeError("Dataset index must be int")
         try:
             return self.pread(key)
         except EOFError:
-            raise IndexError("Index `%d` is out of range" % key)
\ No newline at end of file
+            raise IndexError("Index `%d` is out of range" % key)
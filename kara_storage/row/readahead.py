@@ -0,0 +1,68 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Union
+
+class Readahead:
+    """
+    Readahead fetches the next `depth` windows of a stream in background threads while the current window
+    is consumed, so at most `(depth + 1) * window_size` bytes are buffered.
+    """
+    def __init__(self,
+            fetch : Callable[[int, int], Union[bytes, memoryview]],
+            size : int,
+            window_size : int = 8 * 1024 * 1024,
+            depth : int = 2
+        ) -> None:
+        if depth <= 0:
+            raise ValueError("Readahead depth must be positive")
+        self.__fetch = fetch
+        self.__size = size
+        self.__window_size = window_size
+        self.__depth = depth
+        self.__executor = ThreadPoolExecutor(max_workers=depth)
+
+        self.__pending : Deque[Future] = deque()
+        self.__next_offset = 0
+        self.__buffer = memoryview(b"")
+
+    def __fetch_window(self, offset : int, length : int):
+        ret = self.__fetch(offset, length)
+        if len(ret) != length:
+            raise RuntimeError("File size not aligned: expected %d more bytes" % (length - len(ret)))
+        return ret
+
+    def __submit(self):
+        while len(self.__pending) < self.__depth and self.__next_offset < self.__size:
+            length = min(self.__window_size, self.__size - self.__next_offset)
+            self.__pending.append(self.__executor.submit(self.__fetch_window, self.__next_offset, length))
+            self.__next_offset += length
+
+    def seek(self, offset : int):
+        for future in self.__pending:
+            future.cancel()
+        self.__pending.clear()
+        self.__buffer = memoryview(b"")
+        self.__next_offset = offset
+        self.__submit()
+
+    def readinto(self, __buffer) -> int:
+        view = memoryview(__buffer).cast("B")
+        if len(self.__buffer) == 0:
+            self.__submit()
+            if len(self.__pending) == 0:
+                # EOF
+                return 0
+            self.__buffer = memoryview(self.__pending.popleft().result())
+            self.__submit()
+
+        lw = min(len(view), len(self.__buffer))
+        view[:lw] = self.__buffer[:lw]
+        self.__buffer = self.__buffer[lw:]
+        return lw
+
+    def close(self):
+        for future in self.__pending:
+            future.cancel()
+        self.__pending.clear()
+        self.__buffer = memoryview(b"")
+        self.__executor.shutdown(wait=False)
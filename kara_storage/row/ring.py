@@ -0,0 +1,111 @@
+import struct
+from typing import Optional, Union
+
+_WRAP = 0xFFFFFFFF
+
+class ShmRing:
+    """
+    ShmRing is a single-producer single-consumer ring of length-prefixed records in shared memory.
+    The header keeps the write position and the read position, both count bytes since the ring was created,
+    and each side only writes its own position. Records never wrap around, the producer skips to the beginning
+    of the ring instead.
+
+    The ring does not signal the other side, a doorbell (e.g. a pipe message) is sent after `put` to publish the records.
+    """
+    HEADER_SIZE = 16
+
+    def __init__(self, shm, capacity : int, owner : bool) -> None:
+        self.__shm = shm
+        self.__buf = shm.buf
+        self.__capacity = capacity
+        self.__owner = owner
+        # consumer side: end of the record returned by `get`
+        self.__pending = None
+
+    @classmethod
+    def create(cls, capacity : int) -> 'ShmRing':
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(create=True, size=capacity + cls.HEADER_SIZE)
+        struct.pack_into("<QQ", shm.buf, 0, 0, 0)
+        return cls(shm, capacity, True)
+
+    @classmethod
+    def attach(cls, name : str, capacity : int) -> 'ShmRing':
+        from multiprocessing import shared_memory
+        try:
+            # the ring is unlinked by its creator
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # before python 3.13, attached segments are registered again in the resource tracker of the creator,
+            # which is shared by spawned and forked processes, so the registration is removed by `unlink`
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, capacity, False)
+
+    @property
+    def name(self) -> str:
+        return self.__shm.name
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    def __write_pos(self) -> int:
+        return struct.unpack_from("<Q", self.__buf, 0)[0]
+
+    def __read_pos(self) -> int:
+        return struct.unpack_from("<Q", self.__buf, 8)[0]
+
+    def empty(self) -> bool:
+        return self.__write_pos() == self.__read_pos()
+
+    def put(self, data : Union[bytes, memoryview]) -> bool:
+        """
+        Appends a record, returns False if there is not enough free space.
+        """
+        write_pos = self.__write_pos()
+        pos = write_pos % self.__capacity
+        need = 4 + len(data)
+        skip = self.__capacity - pos if pos + need > self.__capacity else 0
+        if write_pos - self.__read_pos() + skip + need > self.__capacity:
+            return False
+        if skip > 0:
+            if skip >= 4:
+                struct.pack_into("<I", self.__buf, self.HEADER_SIZE + pos, _WRAP)
+            pos = 0
+        struct.pack_into("<I", self.__buf, self.HEADER_SIZE + pos, len(data))
+        self.__buf[self.HEADER_SIZE + pos + 4: self.HEADER_SIZE + pos + need] = data
+        # publish the record after its content is written
+        struct.pack_into("<Q", self.__buf, 0, write_pos + skip + need)
+        return True
+
+    def get(self) -> Optional[memoryview]:
+        """
+        Returns a view of the next record without copying it, or None if the ring is empty.
+        The view must be released before calling `release`, which frees the space of the record.
+        """
+        read_pos = self.__read_pos()
+        if read_pos == self.__write_pos():
+            return None
+        pos = read_pos % self.__capacity
+        if self.__capacity - pos < 4 or struct.unpack_from("<I", self.__buf, self.HEADER_SIZE + pos)[0] == _WRAP:
+            read_pos += self.__capacity - pos
+            pos = 0
+        length = struct.unpack_from("<I", self.__buf, self.HEADER_SIZE + pos)[0]
+        self.__pending = read_pos + 4 + length
+        return self.__buf[self.HEADER_SIZE + pos + 4: self.HEADER_SIZE + pos + 4 + length]
+
+    def release(self):
+        if self.__pending is not None:
+            struct.pack_into("<Q", self.__buf, 8, self.__pending)
+            self.__pending = None
+
+    def close(self):
+        if self.__buf is not None:
+            self.__buf.release()
+            self.__buf = None
+            self.__shm.close()
+            if self.__owner:
+                try:
+                    self.__shm.unlink()
+                except FileNotFoundError:
+                    pass
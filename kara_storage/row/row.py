@@ -1,25 +1,64 @@
 import io
-from kara_storage.row.proxy import RowDatasetProxy
+from kara_storage.row.proxy import RowDatasetProxy, DOORBELL, PICKLED, OP_READ_BATCH, RET_RING, RET_EOF
+from .ring import ShmRing
 import multiprocessing
 from multiprocessing.connection import Connection
-from typing import Any, Dict, Generator, Optional
+from typing import Any, Callable, Deque, Dict, Generator, Iterable, List, Optional, Union
 from .dataset import RawDataset
+from .concat import ConcatDataset
+from .cache import BlockCache
+from .keys import KeyIndex, hash_keys, key_hash, write_key_index
 from ..abc import StorageBase, Dataset, Serializer
 from ..serialization import JSONSerializer
 import threading
+import itertools
+import array
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from multiprocessing.reduction import ForkingPickler
 
+def _arrow_json_batch(raw_rows : List[bytes], columns : List[str]):
+    """
+    Decodes JSON rows into a pyarrow RecordBatch of `columns`, returns None if pyarrow can not decode them.
+    """
+    import pyarrow as pa
+    import pyarrow.json
+    # JSON rows are serialized without newlines
+    data = b"\n".join(raw_rows)
+    try:
+        # a single block, so the types are inferred from the whole batch
+        table = pyarrow.json.read_json(io.BytesIO(data), read_options=pyarrow.json.ReadOptions(block_size=len(data) + 1))
+    except pa.ArrowInvalid:
+        return None
+    if table.num_rows != len(raw_rows):
+        return None
+    arrays = [
+        pa.concat_arrays(table.column(name).chunks) if name in table.column_names else pa.nulls(len(raw_rows))
+        for name in columns
+    ]
+    return pa.RecordBatch.from_arrays(arrays, names=columns)
+
+def _as_bytes(data):
+    # memoryviews returned by mapped datasets can not be pickled
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return data
+
 class RowDataset(Dataset):
     """
     RowDataset adds multi-threading, multi-processing and slicing capabilities to RawDataset.
+    A list of prefixes opens the datasets as a single read-only dataset.
     """
     def __init__(self, 
             storage: StorageBase, 
-            prefix: str, 
+            prefix: Union[str, List[str]], 
             mode: str, 
             serialization : Serializer = None,
             start : int = None,
             length : int = None,
+            raw_dataset : RawDataset = None,
+            ipc_ring_size : int = 4 * 1024 * 1024,
+            ipc_batch_size : int = 64,
             **kwargs
         ) -> None:
 
@@ -27,12 +66,22 @@ class RowDataset(Dataset):
         self.__storage = storage
         self.__prefix = prefix
         self.__mode = mode
+        if isinstance(kwargs.get("block_cache"), int):
+            # created once, so the cache is shared by all slices
+            kwargs["block_cache"] = BlockCache(kwargs["block_cache"])
         self.__kwargs = kwargs
         self.__writable = ("w" in mode)
         self.__readable = ("r" in mode)
 
-        # create RawDataset
-        self.__ds = RawDataset(storage, prefix, mode, **kwargs)
+        # create RawDataset, or share the opened one for slices
+        if raw_dataset is None:
+            if isinstance(prefix, list):
+                if "w" in mode:
+                    raise ValueError("Concatenated datasets are read-only")
+                raw_dataset = ConcatDataset([RawDataset(storage, member, mode, **kwargs) for member in prefix])
+            else:
+                raw_dataset = RawDataset(storage, prefix, mode, **kwargs)
+        self.__ds = raw_dataset
 
         # initialize serializer
         if serialization is None:
@@ -42,13 +91,20 @@ class RowDataset(Dataset):
         # init lock
         self.__lock = threading.Lock()
         
-        # init ipc
+        # key indexes, loaded on the first lookup
+        self.__key_indexes : Dict[str, KeyIndex] = {}
+        self.__key_lock = threading.Lock()
+
+        # init ipc, each proxy is served by its own thread and shared memory ring
         self.__ipc_lock = threading.Lock()
-        self.__ipc_server = None
+        self.__ipc_ring_size = ipc_ring_size
+        # rows read ahead and written at a time by proxies
+        self.__ipc_batch_size = ipc_batch_size
         self.__ipc_client_cnt = 0
         self.__ipc_serial = 0
         self.__ipc_pipes : Dict[int, Connection] = {}
         self.__ipc_pipes_back : Dict[int, Connection] = {}
+        self.__ipc_rings : Dict[int, ShmRing] = {}
 
         # init slice
         if self.__readable:
@@ -65,7 +121,8 @@ class RowDataset(Dataset):
                 self.__end = self.__ds.size()
             self.__length = self.__end - self.__begin
             self.__tell = 0
-            self.__ds.seek(self.__begin, io.SEEK_SET)
+            # seek on the first read, so creating a slice does no I/O
+            self.__seek_pending = True
         else:
             self.__length = self.__ds.size()
     
@@ -78,19 +135,49 @@ class RowDataset(Dataset):
         with self.__lock:
             if self.__tell == self.__length:
                 return None
+            if self.__seek_pending:
+                self.__ds.seek(self.__begin + self.__tell, io.SEEK_SET)
+                self.__seek_pending = False
             self.__tell += 1
             return self.__ds.read()
     
+    def _read_many_raw(self, count : int) -> List[bytes]:
+        if not self.__readable:
+            raise RuntimeError("Dataset is not readable")
+        if self.__ds.closed:
+            raise RuntimeError("Dataset is closed")
+
+        with self.__lock:
+            count = min(count, self.__length - self.__tell)
+            if count <= 0:
+                return []
+            if self.__seek_pending:
+                self.__ds.seek(self.__begin + self.__tell, io.SEEK_SET)
+                self.__seek_pending = False
+            self.__tell += count
+            return self.__ds.read_many(count)
+    
     def _pread_raw(self, offset : int) -> Optional[bytes]:
         if not self.__readable:
             raise RuntimeError("Dataset is not readable")
         if self.__ds.closed:
             raise RuntimeError("Dataset is closed")
-        if offset >= self.__length:
+        if offset < 0 or offset >= self.__length:
             return None
 
-        with self.__lock:
-            return self.__ds.pread(offset + self.__begin)
+        # pread is positional, only the sequential cursor needs the lock
+        return self.__ds.pread(offset + self.__begin)
+
+    def _pread_many_raw(self, offsets : List[int]) -> Optional[List[bytes]]:
+        if not self.__readable:
+            raise RuntimeError("Dataset is not readable")
+        if self.__ds.closed:
+            raise RuntimeError("Dataset is closed")
+        for offset in offsets:
+            if offset < 0 or offset >= self.__length:
+                return None
+
+        return self.__ds.pread_many([offset + self.__begin for offset in offsets])
     
     def _write_raw(self, data : bytes):
         if not self.__writable:
@@ -101,6 +188,19 @@ class RowDataset(Dataset):
         with self.__lock:
             self.__ds.write(data)
     
+    def _write_many_raw(self, data : List[bytes]):
+        if not self.__writable:
+            raise RuntimeError("Dataset is not writable")
+        if self.__ds.closed:
+            raise RuntimeError("Dataset is closed")
+
+        with self.__lock:
+            self.__ds.write_many(data)
+    
+    @property
+    def serialization(self) -> Serializer:
+        return self.__serialization
+    
     @property
     def closed(self):
         with self.__lock:
@@ -109,6 +209,10 @@ class RowDataset(Dataset):
     def close(self):
         with self.__lock:
             self.__ds.close()
+        with self.__key_lock:
+            for index in self.__key_indexes.values():
+                index.close()
+            self.__key_indexes = {}
     
     def flush(self):
         with self.__lock:
@@ -117,6 +221,14 @@ class RowDataset(Dataset):
     def write(self, data : Any):
         byte_data = self.__serialization.serialize(data)
         self._write_raw(byte_data)
+
+    def write_many(self, data : Iterable[Any], batch_size : int = 4096):
+        it = iter(data)
+        while True:
+            byte_data = [self.__serialization.serialize(v) for v in itertools.islice(it, batch_size)]
+            if len(byte_data) == 0:
+                break
+            self._write_many_raw(byte_data)
     
     def read(self) -> Any:
         byte_ret = self._read_raw()
@@ -124,6 +236,64 @@ class RowDataset(Dataset):
             raise EOFError()
         return self.__serialization.deserialize(byte_ret)
 
+    def read_many(self, count : int) -> List[Any]:
+        """
+        Read at most `count` rows from the current position, returns an empty list at the end of dataset.
+        """
+        return self.__serialization.deserialize_many(self._read_many_raw(count))
+
+    def iter_batches(self, batch_size : int = 1024, columns : List[str] = None, format : str = "numpy") -> Generator[Any, None, None]:
+        """
+        Iterates from the current position in columnar batches of dict rows.
+
+        Args:
+            batch_size: number of rows in each batch.
+            columns: keys of rows to export, defaults to the keys of the first row. Missing keys are filled with None.
+            format: "numpy" yields {column: numpy array}, "arrow" yields pyarrow RecordBatch.
+                With JSON serialization, arrow batches are decoded by pyarrow without creating the rows.
+        """
+        if format == "numpy":
+            import numpy as np
+        elif format == "arrow":
+            import pyarrow as pa
+            import pyarrow.json
+        else:
+            raise ValueError("Unknown format `%s`" % format)
+
+        while True:
+            if format == "arrow" and isinstance(self.__serialization, JSONSerializer):
+                raw_rows = self._read_many_raw(batch_size)
+                if len(raw_rows) == 0:
+                    break
+                if columns is None:
+                    columns = list(self.__serialization.deserialize(raw_rows[0]).keys())
+                batch = _arrow_json_batch(raw_rows, columns)
+                if batch is not None:
+                    yield batch
+                    continue
+                # rows that are not JSON objects, or values of conflicting types
+                rows = self.__serialization.deserialize_many(raw_rows)
+            else:
+                rows = self.read_many(batch_size)
+                if len(rows) == 0:
+                    break
+                if columns is None:
+                    columns = list(rows[0].keys())
+            data = { name : [row.get(name) for row in rows] for name in columns }
+            if format == "numpy":
+                batch = {}
+                for name, values in data.items():
+                    try:
+                        batch[name] = np.array(values)
+                    except ValueError:
+                        # nested values of different shapes
+                        batch[name] = np.empty(len(values), dtype=object)
+                        for i, v in enumerate(values):
+                            batch[name][i] = v
+                yield batch
+            else:
+                yield pa.RecordBatch.from_pydict(data)
+
     def seek(self, offset : int, whence : int = io.SEEK_SET) -> int:
         if not self.__readable:
             raise RuntimeError("Dataset is not readable")
@@ -143,14 +313,39 @@ class RowDataset(Dataset):
 
         with self.__lock:
             self.__tell = ds_offset - self.__begin
-            return self.__ds.seek(ds_offset, io.SEEK_SET)
+            self.__seek_pending = True
+            return ds_offset
             
     def pread(self, offset : int) -> Any:
         byte_ret = self._pread_raw(offset)
         if byte_ret is None:
             raise EOFError()
         return self.__serialization.deserialize(byte_ret)
+
+    def pread_many(self, offsets : List[int]) -> List[Any]:
+        byte_ret = self._pread_many_raw(offsets)
+        if byte_ret is None:
+            raise EOFError()
+        return [self.__serialization.deserialize(v) for v in byte_ret]
     
+    def row_ends(self, offsets : List[int]) -> List[int]:
+        """
+        Returns the serialized bytes from the beginning of the slice to the end of each row.
+        """
+        if not self.__readable:
+            raise RuntimeError("Dataset is not readable")
+        if self.__ds.closed:
+            raise RuntimeError("Dataset is closed")
+        for offset in offsets:
+            if offset < 0 or offset >= self.__length:
+                raise IndexError("Offset %d is out of range [0, %d)" % (offset, self.__length))
+        if len(offsets) == 0:
+            return []
+
+        ends = self.__ds.row_ends([offset + self.__begin for offset in offsets] + ([self.__begin - 1] if self.__begin > 0 else []))
+        base = ends.pop() if self.__begin > 0 else 0
+        return [end - base for end in ends]
+
     def size(self) -> int:
         with self.__lock:
             return self.__length
@@ -161,81 +356,117 @@ class RowDataset(Dataset):
         with self.__lock:
             return self.__tell
     
-    def __ipc_main(self):
-        import select
-        while True:
-            with self.__ipc_lock:
-                if self.__ipc_client_cnt == 0:
-                    # remove server if all clients exists
-                    self.__ipc_server = None
-                    assert len(self.__ipc_pipes) == 0
-                    self.__ipc_serial = 0
+    def __ipc_send_rows(self, pipe : Connection, ring : Optional[ShmRing], rows : List[bytes]):
+        in_ring = 0
+        if ring is not None:
+            for data in rows:
+                if not ring.put(data):
                     break
+                in_ring += 1
+        if ring is not None and in_ring == len(rows):
+            pipe.send_bytes(DOORBELL.pack(RET_RING, in_ring))
+        else:
+            # the rows that do not fit into the ring
+            pipe.send({
+                "code": 0,
+                "data": [_as_bytes(data) for data in rows[in_ring:]],
+                "ring": in_ring
+            })
 
-                pipes = list(self.__ipc_pipes.values())
-            
-            readable, _, _ = select.select(pipes, [], [])
-            for pipe in readable:
-                cmd = pipe.recv()
-                try:
-                    if cmd["op"] == "closed":
-                        pipe.send({
-                            "code": 0,
-                            "data": self.closed
-                        })
-                    elif cmd["op"] == "close":
-                        self.close()
-                        pipe.send({"code": 0})
-                    elif cmd["op"] == "flush":
-                        self.flush()
-                        pipe.send({"code": 0})
-                    elif cmd["op"] == "write":
-                        self._write_raw(cmd["data"])
-                        pipe.send({"code": 0})
-                    elif cmd["op"] == "read":
-                        pipe.send({
-                            "code": 0,
-                            "data": self._read_raw()
-                        })
-                    elif cmd["op"] == "seek":
-                        pipe.send({
-                            "code": 0,
-                            "data": self.seek(*cmd["data"])
-                        })
-                    elif cmd["op"] == "pread":
-                        pipe.send({
-                            "code": 0,
-                            "data": self._pread_raw(cmd["data"])
-                        })
-                    elif cmd["op"] == "size":
-                        pipe.send({
-                            "code": 0,
-                            "data": self.size()
-                        })
-                    elif cmd["op"] == "size":
-                        pipe.send({
-                            "code": 0,
-                            "data": self.tell()
-                        })
-                    elif cmd["op"] == "exit":
-                        serial_id = cmd["data"]
-                        with self.__ipc_lock:
-                            self.__ipc_client_cnt -= 1
-                            self.__ipc_pipes[serial_id].close()
-                            self.__ipc_pipes_back[serial_id].close()
-
-                            del self.__ipc_pipes[serial_id]
-                            del self.__ipc_pipes_back[serial_id]
-                    else:
-                        raise ValueError("Unknown cmd: %s" % cmd)
-                except Exception as e:
+    def __ipc_read(self, pipe : Connection, ring : Optional[ShmRing], op : bytes, arg : int):
+        try:
+            if op == OP_READ_BATCH:
+                self.__ipc_send_rows(pipe, ring, self._read_many_raw(arg))
+                return
+            data = self._pread_raw(arg)
+            if data is None:
+                pipe.send_bytes(DOORBELL.pack(RET_EOF, 0))
+            else:
+                self.__ipc_send_rows(pipe, ring, [data])
+        except Exception as e:
+            pipe.send({
+                "code": 1,
+                "data": e
+            })
+
+    def __ipc_main(self, serial_id : int):
+        with self.__ipc_lock:
+            pipe = self.__ipc_pipes[serial_id]
+            ring = self.__ipc_rings.get(serial_id)
+        while True:
+            msg = pipe.recv_bytes()
+            if msg[:1] != PICKLED:
+                self.__ipc_read(pipe, ring, *DOORBELL.unpack(msg))
+                continue
+            cmd = ForkingPickler.loads(msg)
+            try:
+                if cmd["op"] == "closed":
+                    pipe.send({
+                        "code": 0,
+                        "data": self.closed
+                    })
+                elif cmd["op"] == "close":
+                    self.close()
+                    pipe.send({"code": 0})
+                elif cmd["op"] == "flush":
+                    self.flush()
+                    pipe.send({"code": 0})
+                elif cmd["op"] == "write_batch":
+                    self._write_many_raw(cmd["data"])
+                    pipe.send({"code": 0})
+                elif cmd["op"] == "read_batch":
+                    self.__ipc_send_rows(pipe, None, self._read_many_raw(cmd["data"]))
+                elif cmd["op"] == "seek":
                     pipe.send({
-                        "code": 1,
-                        "data": e
+                        "code": 0,
+                        "data": self.seek(*cmd["data"])
                     })
+                elif cmd["op"] == "pread":
+                    pipe.send({
+                        "code": 0,
+                        "data": _as_bytes(self._pread_raw(cmd["data"]))
+                    })
+                elif cmd["op"] == "pread_many":
+                    ret = self._pread_many_raw(cmd["data"])
+                    pipe.send({
+                        "code": 0,
+                        "data": None if ret is None else [_as_bytes(v) for v in ret]
+                    })
+                elif cmd["op"] == "size":
+                    pipe.send({
+                        "code": 0,
+                        "data": self.size()
+                    })
+                elif cmd["op"] == "tell":
+                    pipe.send({
+                        "code": 0,
+                        "data": self.tell()
+                    })
+                elif cmd["op"] == "exit":
+                    with self.__ipc_lock:
+                        self.__ipc_client_cnt -= 1
+                        self.__ipc_pipes.pop(serial_id).close()
+                        self.__ipc_pipes_back.pop(serial_id).close()
+                        if ring is not None:
+                            self.__ipc_rings.pop(serial_id).close()
+                    break
+                else:
+                    raise ValueError("Unknown cmd: %s" % cmd)
+            except Exception as e:
+                pipe.send({
+                    "code": 1,
+                    "data": e
+                })
 
-    
     def _reduce_dataset(self):
+        ring = None
+        if self.__ipc_ring_size > 0:
+            try:
+                ring = ShmRing.create(self.__ipc_ring_size)
+            except (ImportError, OSError):
+                # e.g. /dev/shm is not available, rows are sent through the pipe
+                ring = None
+
         with self.__ipc_lock:
             self.__ipc_client_cnt += 1
             self.__ipc_serial += 1
@@ -245,10 +476,12 @@ class RowDataset(Dataset):
             p1, p2 = multiprocessing.Pipe()
             self.__ipc_pipes[serial_id] = p1
             self.__ipc_pipes_back[serial_id] = p2
-            if self.__ipc_server is None:
-                self.__ipc_server = threading.Thread(target=self.__ipc_main)
-                self.__ipc_server.start()
-        return RowDatasetProxy, (serial_id, p2, self.__serialization)
+            if ring is not None:
+                self.__ipc_rings[serial_id] = ring
+        threading.Thread(target=self.__ipc_main, args=(serial_id,)).start()
+        if ring is None:
+            return RowDatasetProxy, (serial_id, p2, self.__serialization, None, 0, self.__ipc_batch_size)
+        return RowDatasetProxy, (serial_id, p2, self.__serialization, ring.name, ring.capacity, self.__ipc_batch_size)
     
     def __len__(self) -> int:
         return self.__length
@@ -269,6 +502,119 @@ class RowDataset(Dataset):
         except EOFError:
             raise IndexError("Index `%d` is out of range" % key)
     
+    def build_key_index(self, 
+            key : Union[str, Callable[[Any], Any]], 
+            name : str = "default", 
+            workers : int = 4, 
+            bloom_bits_per_key : int = 10,
+            batch_size : int = 1024,
+            executor : str = "process"
+        ):
+        """
+        Builds a persistent index from keys to rows of the whole dataset, stored in `<prefix>keys/<name>/`.
+        The index records the size of the dataset, lookups fail after rows are appended until it is rebuilt.
+
+        Args:
+            key: a column of dict rows, or a function returning the key of a row.
+                Lookups verify the column of matched rows, keys returned by functions are matched by hash only.
+            name: name of the index.
+            workers: number of workers deserializing rows and hashing keys.
+            bloom_bits_per_key: size of the Bloom filter for negative lookups, 0 to disable.
+            executor: "process" or "thread". Threads are bound by the GIL, but accept functions that can not be pickled (e.g. lambdas).
+        """
+        if not self.__readable:
+            raise RuntimeError("Dataset is not readable")
+        if self.__ds.closed:
+            raise RuntimeError("Dataset is closed")
+        if not isinstance(self.__prefix, str):
+            raise RuntimeError("Key index is not supported by concatenated datasets")
+        if executor == "thread":
+            pool : Executor = ThreadPoolExecutor(max_workers=workers)
+        elif executor == "process":
+            pool = ProcessPoolExecutor(max_workers=workers)
+        else:
+            raise ValueError("Unknown executor `%s`" % executor)
+
+        # rows are read in this thread, and deserialized by the workers in batches
+        total = self.__ds.size()
+        reader = RowDataset(
+            self.__storage, self.__prefix, self.__mode, self.__serialization, 
+            0, total, raw_dataset=self.__ds.view(), **self.__kwargs
+        )
+        hashes = array.array("Q")
+        pending : Deque[Future] = deque()
+        with pool:
+            while True:
+                rows = reader._read_many_raw(batch_size)
+                if len(rows) == 0:
+                    break
+                while len(pending) >= 2 * workers:
+                    hashes.extend(pending.popleft().result())
+                pending.append(pool.submit(hash_keys, self.__serialization, key, [_as_bytes(v) for v in rows]))
+            while len(pending) > 0:
+                hashes.extend(pending.popleft().result())
+        reader.close()
+
+        write_key_index(
+            self.__storage, self.__prefix + "keys/%s/" % name, 
+            hashes, array.array("Q", range(total)), 
+            key=key if isinstance(key, str) else None,
+            bloom_bits_per_key=bloom_bits_per_key,
+            num_rows=total
+        )
+        with self.__key_lock:
+            if name in self.__key_indexes:
+                self.__key_indexes.pop(name).close()
+
+    def __get_key_index(self, name : str) -> KeyIndex:
+        with self.__key_lock:
+            if name not in self.__key_indexes:
+                index = KeyIndex(self.__storage, self.__prefix + "keys/%s/" % name)
+                if index.num_rows is not None and index.num_rows != self.__ds.size():
+                    index.close()
+                    raise RuntimeError("Key index `%s` was built for %d rows, but the dataset has %d rows, rebuild it with `build_key_index`" % (name, index.num_rows, self.__ds.size()))
+                self.__key_indexes[name] = index
+            return self.__key_indexes[name]
+
+    def get_many_by_key(self, keys : List[Any], name : str = "default", default : Any = None) -> List[Any]:
+        """
+        Returns the first row of each key in the index `name`, or `default` if the key is not found.
+        """
+        if not self.__readable:
+            raise RuntimeError("Dataset is not readable")
+        if self.__ds.closed:
+            raise RuntimeError("Dataset is closed")
+        if not isinstance(self.__prefix, str):
+            raise RuntimeError("Key index is not supported by concatenated datasets")
+        index = self.__get_key_index(name)
+
+        candidates = [
+            [row_id for row_id in index.lookup(key_hash(key)) if self.__begin <= row_id < self.__end]
+                for key in keys
+        ]
+        row_ids = sorted(set(row_id for rows in candidates for row_id in rows))
+        values = {}
+        if len(row_ids) > 0:
+            values = dict(zip(row_ids, self.__serialization.deserialize_many(self.__ds.pread_many(row_ids))))
+
+        ret = []
+        for key, rows in zip(keys, candidates):
+            found = default
+            for row_id in rows:
+                # rows of colliding hashes are filtered by the key column
+                if index.key is None or (isinstance(values[row_id], dict) and values[row_id].get(index.key) == key):
+                    found = values[row_id]
+                    break
+            ret.append(found)
+        return ret
+
+    def get_by_key(self, key : Any, name : str = "default") -> Any:
+        sentinel = object()
+        ret = self.get_many_by_key([key], name, default=sentinel)[0]
+        if ret is sentinel:
+            raise KeyError(key)
+        return ret
+
     def slice(self, start : int = 0, length : int = None):
         if not self.__readable:
             raise RuntimeError("Dataset is not readable")
@@ -284,6 +630,9 @@ class RowDataset(Dataset):
             self.__serialization, 
             self.__begin + start,
             length,
+            raw_dataset=self.__ds.view(),
+            ipc_ring_size=self.__ipc_ring_size,
+            ipc_batch_size=self.__ipc_batch_size,
             **self.__kwargs
         )
     
@@ -308,7 +657,7 @@ class RowDataset(Dataset):
 
             self.__length = self.__end - self.__begin
             self.__tell = 0
-            self.__ds.seek(self.__begin, io.SEEK_SET)
+            self.__seek_pending = True
     
     def __del__(self):
         self.close()
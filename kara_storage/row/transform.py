@@ -0,0 +1,34 @@
+from typing import Any, Callable, Dict, List
+from ..abc import Serializer
+from .row import RowDataset
+
+def transform_worker(
+        url : str, 
+        storage_kwargs : Dict[str, Any], 
+        src_prefixes : List[str], 
+        start : int, 
+        length : int, 
+        fn : Callable[[Any], Any], 
+        dst_prefix : str, 
+        serialization : Serializer, 
+        batch_size : int
+    ) -> int:
+    """
+    Maps rows [start, start + length) of the source into a new shard, returns the number of rows written.
+    """
+    from ..storage import KaraStorage
+    storage = KaraStorage(url, **storage_kwargs)._storage
+
+    src = RowDataset(storage, src_prefixes, "r", serialization=serialization, start=start, length=length)
+    dst = RowDataset(storage, dst_prefix, "w", serialization=serialization)
+    count = 0
+    while True:
+        rows = src.read_many(batch_size)
+        if len(rows) == 0:
+            break
+        mapped = [v for v in map(fn, rows) if v is not None]
+        dst.write_many(mapped)
+        count += len(mapped)
+    src.close()
+    dst.close()
+    return count
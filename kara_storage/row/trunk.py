@@ -1,8 +1,31 @@
 import io
-from typing import Optional
+import bisect
+import threading
+from typing import Dict, List, Optional, Tuple, Union
 from ..abc import StorageBase
+from .pool import FilePool
+from .readahead import Readahead
+from .cache import BlockCache
 class TrunkController(io.RawIOBase):
-    def __init__(self, storage : StorageBase, prefix : str, mode : str, max_file_size : int = 128 * 1024 * 1024) -> None:
+    def __init__(self, 
+            storage : StorageBase, 
+            prefix : str, 
+            mode : str, 
+            max_file_size : int = 128 * 1024 * 1024, 
+            use_mmap : bool = False, 
+            max_open_files : int = 16,
+            readahead : int = 0,
+            readahead_size : int = 8 * 1024 * 1024,
+            file_sizes : List[int] = None,
+            block_cache : BlockCache = None
+        ) -> None:
+        """
+        file_sizes: sizes of trunks if they are already known (e.g. from the manifest), otherwise trunks are listed, 
+            or probed one by one if the storage can not list files.
+        block_cache: cache of aligned blocks for positional reads, may be shared by multiple controllers.
+        readahead: number of windows fetched in background during sequential reads, 0 to disable.
+        readahead_size: size of each readahead window, so the buffered bytes are bounded by `(readahead + 1) * readahead_size`.
+        """
         if mode != "r" and mode != "w":
             raise ValueError("Unknown mode `%s`" % mode)
         
@@ -14,6 +37,7 @@ class TrunkController(io.RawIOBase):
         self.__storage = storage
         self.__prefix = prefix
         self.__max_file_size = max_file_size
+        self.__block_cache = block_cache
         self.__closed = False
 
         # initialize mode
@@ -27,23 +51,73 @@ class TrunkController(io.RawIOBase):
     
         # calc trunks
 
-        self.__num_trunks = 0
-        while True:
-            file_size = self.__storage.filesize( self.__prefix + "%d.blk" % self.__num_trunks )
-            if file_size is None:
-                # returns None if file not exists
-                break
-            
-            # else
-            self.__file_sizes.append(file_size)
-            self.__num_trunks += 1
+        if file_sizes is not None and self.__writable:
+            # appending to an outdated trunk list would break the dataset, check the tail before using it
+            if len(file_sizes) == 0 or \
+                    self.__storage.filesize( self.__prefix + "%d.blk" % (len(file_sizes) - 1) ) != file_sizes[-1] or \
+                    self.__storage.filesize( self.__prefix + "%d.blk" % len(file_sizes) ) is not None:
+                file_sizes = None
+
+        listed_files = None
+        if file_sizes is None:
+            listed_files = self.__storage.list(self.__prefix)
+
+        if file_sizes is not None:
+            self.__file_sizes = list(file_sizes)
+            self.__num_trunks = len(self.__file_sizes)
+        elif listed_files is not None:
+            self.__num_trunks = 0
+            while ("%d.blk" % self.__num_trunks) in listed_files:
+                self.__file_sizes.append(listed_files["%d.blk" % self.__num_trunks])
+                self.__num_trunks += 1
+        else:
+            self.__num_trunks = 0
+            while True:
+                file_size = self.__storage.filesize( self.__prefix + "%d.blk" % self.__num_trunks )
+                if file_size is None:
+                    # returns None if file not exists
+                    break
+                
+                # else
+                self.__file_sizes.append(file_size)
+                self.__num_trunks += 1
         
         self.__size += sum(self.__file_sizes)
 
+        # prefix sums of trunk sizes, used for locating offsets with binary search
+        self.__trunk_begins = []
+        begin = 0
+        for file_size in self.__file_sizes:
+            self.__trunk_begins.append(begin)
+            begin += file_size
+
+        # memory-mapped trunks, only available if the storage supports it
+        self.__mmaps : Dict[int, memoryview] = {}
+        self.__mmap_lock = threading.Lock()
+        self.__use_mmap = False
+
+        # opened trunks for positional reads
+        self.__file_pool = FilePool(
+            lambda trunk_id: self.__storage.open_random(self.__prefix + "%d.blk" % trunk_id), 
+            max_size=max_open_files
+        )
+
         if self.__readable:
             if self.__num_trunks == 0:
                 raise RuntimeError("Empty dataset !")
-            self.__fp_read = self.__storage.open(self.__prefix + "0.blk", "r")
+            if use_mmap:
+                mapped = self.__storage.mmap(self.__prefix + "0.blk")
+                if mapped is not None:
+                    self.__mmaps[0] = mapped
+                    self.__use_mmap = True
+            self.__readahead = None
+            if self.__use_mmap:
+                self.__fp_read = None
+            elif readahead > 0:
+                self.__fp_read = None
+                self.__readahead = Readahead(self.pread, self.__size, window_size=readahead_size, depth=readahead)
+            else:
+                self.__fp_read = self.__storage.open(self.__prefix + "0.blk", "r")
             self.__infile_offset = 0
             self.__curr_file = 0
         if self.__writable:
@@ -64,11 +138,58 @@ class TrunkController(io.RawIOBase):
     def seekable(self) -> bool:
         return self.__readable
 
+    def __locate(self, offset : int) -> Tuple[int, int]:
+        """
+        Returns (trunk id, offset in trunk) of a global offset.
+        Offsets beyond the end of dataset are located in the last trunk.
+        """
+        if offset >= self.__size:
+            return self.__num_trunks - 1, offset - self.__trunk_begins[-1]
+        trunk_id = bisect.bisect_right(self.__trunk_begins, offset) - 1
+        return trunk_id, offset - self.__trunk_begins[trunk_id]
+
+    @property
+    def mapped(self) -> bool:
+        return self.__use_mmap
+
+    def __get_mmap(self, trunk_id : int) -> memoryview:
+        if trunk_id not in self.__mmaps:
+            # positional reads may map trunks from multiple threads
+            with self.__mmap_lock:
+                if trunk_id not in self.__mmaps:
+                    self.__mmaps[trunk_id] = self.__storage.mmap(self.__prefix + "%d.blk" % trunk_id)
+        return self.__mmaps[trunk_id]
+
+    def __mmap_readinto(self, __buffer) -> int:
+        view = memoryview(__buffer).cast("B")
+        read_offset = 0
+        while read_offset < len(view):
+            lw = min(len(view) - read_offset, self.__file_sizes[self.__curr_file] - self.__infile_offset)
+            if lw > 0:
+                mapped = self.__get_mmap(self.__curr_file)
+                view[read_offset: read_offset + lw] = mapped[self.__infile_offset: self.__infile_offset + lw]
+                read_offset += lw
+                self.__infile_offset += lw
+            if self.__infile_offset == self.__file_sizes[self.__curr_file] and self.__curr_file + 1 < self.__num_trunks:
+                self.__curr_file += 1
+                self.__infile_offset = 0
+            elif lw == 0:
+                break
+        self.__tell += read_offset
+        return read_offset
+
     def readinto(self, __buffer, max_retry=3) -> Optional[int]:
         if not self.__readable:
             raise RuntimeError("Dataset not readable")
         if self.__closed:
             raise RuntimeError("Dataset is closed")
+        
+        if self.__use_mmap:
+            return self.__mmap_readinto(__buffer)
+        if self.__readahead is not None:
+            lw = self.__readahead.readinto(__buffer)
+            self.__tell += lw
+            return lw
 
         lw = self.__fp_read.readinto(__buffer)
 
@@ -112,11 +233,13 @@ class TrunkController(io.RawIOBase):
 
         self.__size += wrt_len
         self.__infile_offset += wrt_len
+        self.__file_sizes[-1] += wrt_len
 
         if self.__infile_offset == self.__max_file_size:
             self.__fp_write.close()
             self.__fp_write = self.__storage.open( self.__prefix + "%d.blk" % self.__num_trunks, "a")
             self.__num_trunks += 1
+            self.__file_sizes.append(0)
             self.__infile_offset = 0
         return wrt_len
     
@@ -136,25 +259,16 @@ class TrunkController(io.RawIOBase):
         if nw_pos > self.__size:
             nw_pos = self.__size
         
-        rest_size = nw_pos
-        self.__curr_file = 0
+        self.__curr_file, rest_size = self.__locate(nw_pos)
 
-        while rest_size > self.__file_sizes[self.__curr_file]:
-            rest_size -= self.__file_sizes[self.__curr_file]
-            self.__curr_file += 1
-        
-        # 处理最后相等的情况
-        if rest_size == self.__file_sizes[self.__curr_file]:
-            # 处理最后一个文件的情况
-            if self.__curr_file + 1 < self.__num_trunks:
-                self.__curr_file += 1
-                rest_size = 0
-
-        self.__fp_read.close()
-        if rest_size == self.__file_sizes[self.__curr_file]:
-            self.__fp_read = io.BytesIO()
-        else:
-            self.__fp_read = self.__storage.open(self.__prefix + "%d.blk" % self.__curr_file, "r", begin=rest_size)
+        if self.__readahead is not None:
+            self.__readahead.seek(nw_pos)
+        elif not self.__use_mmap:
+            self.__fp_read.close()
+            if rest_size == self.__file_sizes[self.__curr_file]:
+                self.__fp_read = io.BytesIO()
+            else:
+                self.__fp_read = self.__storage.open(self.__prefix + "%d.blk" % self.__curr_file, "r", begin=rest_size)
         self.__infile_offset = rest_size
         self.__tell = nw_pos
 
@@ -173,8 +287,16 @@ class TrunkController(io.RawIOBase):
     def close(self):
         if not self.__closed:
             if self.__readable:
-                self.__fp_read.close()
+                if self.__fp_read is not None:
+                    self.__fp_read.close()
                 self.__fp_read = None
+                for mapped in self.__mmaps.values():
+                    mapped.release()
+                self.__mmaps = {}
+                if self.__readahead is not None:
+                    self.__readahead.close()
+                    self.__readahead = None
+            self.__file_pool.close()
             if self.__writable:
                 self.__fp_write.close()
                 self.__fp_write = None
@@ -188,19 +310,40 @@ class TrunkController(io.RawIOBase):
     def size(self) -> int:
         return self.__size
 
-    def pread(self, offset : int, length : int) -> bytes:
+    @property
+    def trunk_sizes(self) -> List[int]:
+        ret = list(self.__file_sizes)
+        while len(ret) > 1 and ret[-1] == 0:
+            # trailing empty trunks may not exist in storage
+            ret.pop()
+        return ret
+
+    def pread(self, offset : int, length : int) -> Union[bytes, memoryview]:
+        """
+        Read `length` bytes at `offset`.
+        Returns a memoryview into the mapped trunk instead of bytes if the controller is memory-mapped.
+        """
         if not self.__readable:
             raise RuntimeError("Dataset not readable")
         if self.__closed:
             raise RuntimeError("Dataset is closed")
 
-        trunk_id = 0
-        while offset >= self.__file_sizes[trunk_id] and trunk_id < self.__num_trunks:
-            offset -= self.__file_sizes[trunk_id]
-            trunk_id += 1
-        
-        if trunk_id >= self.__num_trunks:
+        if offset >= self.__size:
             return b""
+        trunk_id, offset = self.__locate(offset)
+        
+        if self.__use_mmap:
+            if offset + length <= self.__file_sizes[trunk_id]:
+                # zero-copy
+                return self.__get_mmap(trunk_id)[offset: offset + length]
+            parts = []
+            while length > 0 and trunk_id < self.__num_trunks:
+                ed = min(self.__file_sizes[trunk_id], offset + length)
+                parts.append(self.__get_mmap(trunk_id)[offset: ed])
+                length -= ed - offset
+                offset = 0
+                trunk_id += 1
+            return b"".join(parts)
         
         rest_length = length
         
@@ -213,16 +356,166 @@ class TrunkController(io.RawIOBase):
             ed = self.__file_sizes[trunk_id]
             if offset + rest_length < ed:
                 ed = offset + rest_length
-            fp = self.__storage.open(self.__prefix + "%d.blk" % trunk_id, "r", offset, ed)
-            offset = ed % self.__file_sizes[trunk_id]
-
-            
-            vlen = fp.readinto(view[read_offset:])
+            vlen = self.__pread_trunk(trunk_id, offset, view[read_offset: read_offset + ed - offset])
 
             read_offset += vlen
             rest_length -= vlen
+            if vlen < ed - offset:
+                # reached EOF
+                break
+            offset = 0
             trunk_id += 1
-            fp.close()
         return bytes( ret[:read_offset] )
 
-    
\ No newline at end of file
+    def __pread_trunk(self, trunk_id : int, offset : int, view : memoryview) -> int:
+        if self.__block_cache is None:
+            with self.__file_pool.get(trunk_id) as fp:
+                return fp.preadinto(view, offset)
+
+        block_size = self.__block_cache.block_size
+        # the cache may be shared by datasets of other storages with the same paths
+        path = self.__storage.uri(self.__prefix + "%d.blk" % trunk_id)
+        read_offset = 0
+        while read_offset < len(view):
+            block_id = (offset + read_offset) // block_size
+            block_begin = block_id * block_size
+            block_length = min(block_size, self.__file_sizes[trunk_id] - block_begin)
+            key = (path, block_id)
+
+            block = self.__block_cache.get(key)
+            if block is None or len(block) < block_length:
+                # the cached tail block may be outdated if the trunk was appended
+                buf = bytearray(block_length)
+                with self.__file_pool.get(trunk_id) as fp:
+                    vlen = fp.preadinto(buf, block_begin)
+                block = bytes(buf[:vlen])
+                self.__block_cache.put(key, block)
+
+            lw = min(len(view) - read_offset, len(block) - (offset + read_offset - block_begin))
+            if lw <= 0:
+                break
+            view[read_offset: read_offset + lw] = block[offset + read_offset - block_begin: offset + read_offset - block_begin + lw]
+            read_offset += lw
+        return read_offset
+
+    def load_trunks(self, chunk_size : int = 16 * 1024 * 1024) -> List[memoryview]:
+        """
+        Load the content of every trunk, one buffer per trunk.
+        Trunks are memory-mapped if the storage supports it, otherwise each trunk is fetched with a single sequential read.
+        """
+        if not self.__readable:
+            raise RuntimeError("Dataset not readable")
+        if self.__closed:
+            raise RuntimeError("Dataset is closed")
+
+        ret = []
+        for trunk_id in range(self.__num_trunks):
+            path = self.__prefix + "%d.blk" % trunk_id
+            mapped = self.__storage.mmap(path)
+            if mapped is not None:
+                ret.append(mapped[:self.__file_sizes[trunk_id]])
+                continue
+
+            buf = bytearray(self.__file_sizes[trunk_id])
+            view = memoryview(buf)
+            read_offset = 0
+            fp = self.__storage.open(path, "r")
+            while read_offset < len(buf):
+                lw = fp.readinto(view[read_offset: read_offset + chunk_size])
+                if lw == 0 or lw is None:
+                    break
+                read_offset += lw
+            fp.close()
+            if read_offset != len(buf):
+                raise RuntimeError("File size not aligned: expected %d more bytes" % (len(buf) - read_offset))
+            ret.append(view)
+        return ret
+
+    def pread_ranges(self, ranges : List[Tuple[int, int]], max_gap : int = 0) -> List[Union[bytes, memoryview]]:
+        """
+        Read multiple (offset, length) ranges and return them in the given order.
+        Ranges that overlap or are at most `max_gap` bytes apart are merged into a single read.
+        """
+        if not self.__readable:
+            raise RuntimeError("Dataset not readable")
+        if self.__closed:
+            raise RuntimeError("Dataset is closed")
+
+        order = sorted(range(len(ranges)), key=lambda i: ranges[i][0])
+
+        ret : List[bytes] = [b""] * len(ranges)
+        groups = []
+        for i in order:
+            offset, length = ranges[i]
+            if len(groups) > 0 and offset <= groups[-1][1] + max_gap:
+                groups[-1][1] = max(groups[-1][1], offset + length)
+                groups[-1][2].append(i)
+            else:
+                groups.append([offset, offset + length, [i]])
+
+        if self.__use_mmap or self.__block_cache is not None:
+            for begin, end, group in groups:
+                self.__read_group(ranges, group, begin, end, ret)
+            return ret
+
+        # groups inside the same trunk are fetched with a single `pread_ranges` call on the trunk file
+        trunk_groups : Dict[int, list] = {}
+        for begin, end, group in groups:
+            if begin >= self.__size:
+                continue
+            trunk_id, offset = self.__locate(begin)
+            if offset + end - begin <= self.__file_sizes[trunk_id]:
+                trunk_groups.setdefault(trunk_id, []).append((offset, begin, end, group))
+            else:
+                self.__read_group(ranges, group, begin, end, ret)
+        for trunk_id, items in trunk_groups.items():
+            with self.__file_pool.get(trunk_id) as fp:
+                buffers = fp.pread_ranges([(offset, end - begin) for offset, begin, end, _ in items])
+            for (_, begin, end, group), buf in zip(items, buffers):
+                self.__read_group(ranges, group, begin, end, ret, buf)
+        return ret
+
+    def __read_group(self, ranges, group, begin, end, ret, data = None):
+        view = memoryview(self.pread(begin, end - begin) if data is None else data)
+        for i in group:
+            offset, length = ranges[i]
+            if self.__use_mmap:
+                ret[i] = view[offset - begin: offset - begin + length]
+            else:
+                ret[i] = view[offset - begin: offset - begin + length].tobytes()
+
+
+class TrunkCursor(io.RawIOBase):
+    """
+    TrunkCursor reads a shared controller sequentially with positional reads, so multiple cursors over the same trunks
+    are independent of each other and of the controller's own position.
+    """
+    def __init__(self, controller : Union[TrunkController, io.RawIOBase]) -> None:
+        self.__controller = controller
+        self.__tell = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, __buffer) -> Optional[int]:
+        view = memoryview(__buffer).cast("B")
+        ret = self.__controller.pread(self.__tell, len(view))
+        view[:len(ret)] = ret
+        self.__tell += len(ret)
+        return len(ret)
+
+    def seek(self, __offset : int, __whence : int = io.SEEK_SET) -> int:
+        if __whence == io.SEEK_SET:
+            self.__tell = __offset
+        elif __whence == io.SEEK_CUR:
+            self.__tell += __offset
+        elif __whence == io.SEEK_END:
+            self.__tell = self.__controller.size - __offset
+        self.__tell = max(0, min(self.__tell, self.__controller.size))
+        return self.__tell
+
+    def tell(self) -> int:
+        return self.__tell
@@ -0,0 +1,98 @@
+import itertools
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Deque, Iterable, List
+from ..abc import Serializer
+from .row import RowDataset
+
+def _serialize_batch(serialization : Serializer, data : List[Any]) -> List[bytes]:
+    return [serialization.serialize(v) for v in data]
+
+class ParallelWriter:
+    """
+    ParallelWriter serializes rows in a thread or process pool, and appends them to the dataset in submission order.
+
+    Args:
+        ds: a writable RowDataset.
+        workers: number of serializing workers.
+        executor: "thread" or "process". Use "process" for CPU-heavy serializers, which must be picklable.
+        batch_size: number of rows serialized in a single task.
+        max_pending: maximum number of tasks in flight, so at most `max_pending * batch_size` rows are buffered.
+    """
+    def __init__(self,
+            ds : RowDataset,
+            workers : int = 4,
+            executor : str = "thread",
+            batch_size : int = 256,
+            max_pending : int = None
+        ) -> None:
+        if executor == "thread":
+            self.__executor : Executor = ThreadPoolExecutor(max_workers=workers)
+        elif executor == "process":
+            self.__executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            raise ValueError("Unknown executor `%s`" % executor)
+
+        self.__ds = ds
+        self.__serialization = ds.serialization
+        self.__batch_size = batch_size
+        self.__max_pending = 2 * workers if max_pending is None else max_pending
+        self.__pending : Deque[Future] = deque()
+        self.__batch : List[Any] = []
+        self.__closed = False
+
+    def __commit(self):
+        # results are committed in submission order
+        self.__ds._write_many_raw(self.__pending.popleft().result())
+
+    def __submit(self):
+        if len(self.__batch) == 0:
+            return
+        while len(self.__pending) >= self.__max_pending:
+            self.__commit()
+        self.__pending.append(self.__executor.submit(_serialize_batch, self.__serialization, self.__batch))
+        self.__batch = []
+
+    @property
+    def closed(self):
+        return self.__closed
+
+    def write(self, data : Any):
+        if self.__closed:
+            raise RuntimeError("Writer is closed")
+        self.__batch.append(data)
+        if len(self.__batch) >= self.__batch_size:
+            self.__submit()
+
+    def write_many(self, data : Iterable[Any]):
+        if self.__closed:
+            raise RuntimeError("Writer is closed")
+        it = iter(data)
+        while True:
+            self.__batch.extend(itertools.islice(it, self.__batch_size - len(self.__batch)))
+            if len(self.__batch) < self.__batch_size:
+                break
+            self.__submit()
+
+    def flush(self):
+        """
+        Waits for all pending rows to be written, and flushes the dataset.
+        """
+        if self.__closed:
+            raise RuntimeError("Writer is closed")
+        self.__submit()
+        while len(self.__pending) > 0:
+            self.__commit()
+        self.__ds.flush()
+
+    def close(self):
+        """
+        Writes all pending rows and closes the dataset.
+        """
+        if not self.__closed:
+            try:
+                self.flush()
+            finally:
+                self.__executor.shutdown()
+                self.__ds.close()
+                self.__closed = True
@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, List
 from ..abc import Serializer
 import orjson
 
@@ -8,3 +8,14 @@ class JSONSerializer(Serializer):
     
     def deserialize(self, x : bytes) -> Any:
         return orjson.loads(x)
+
+    def deserialize_many(self, x : List[bytes]) -> List[Any]:
+        # decode the whole batch as a single JSON array
+        try:
+            ret = orjson.loads(b"[" + b",".join(x) + b"]")
+        except orjson.JSONDecodeError:
+            ret = None
+        if ret is None or len(ret) != len(x):
+            # some rows are not a single JSON value, e.g. `1,2`, which would shift the rows after it
+            return [self.deserialize(v) for v in x]
+        return ret
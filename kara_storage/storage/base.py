@@ -1,16 +1,24 @@
 from kara_storage.abc.serializer import Serializer
-from typing import Any
+from typing import Any, Callable, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import urlparse
 import os
 import json
-from ..row import RowDataset
+from ..row import RowDataset, AsyncRowDataset
+from ..row.transform import transform_worker
 from ..object import ObjectDataset
-from ..abc import StorageBase, KaraStorageBase
+from ..abc import StorageBase, AsyncStorageBase, KaraStorageBase
 
 
 class KaraStorage(KaraStorageBase):
     def __init__(self, url, **kwargs) -> None:
         uri = urlparse(url)
+        self.__url = url
+        self.__uri = uri
+        self.__kwargs = kwargs
+        self.__async_storage = None
+        # async datasets opened and not closed yet, the async storage is closed with the last one
+        self.__async_refs = 0
         if uri.scheme == "file":
             path = ""
             if uri.netloc == "":
@@ -37,6 +45,15 @@ class KaraStorage(KaraStorageBase):
             self.__prefix = uri.path
         else:
             raise ValueError("Unknown scheme `%s`" % uri.scheme)
+
+        if kwargs.get("cache_dir") is not None:
+            from ..backend.cache import CachingStorage
+            cache_kwargs = {}
+            if "cache_size" in kwargs:
+                cache_kwargs["cache_size"] = kwargs["cache_size"]
+            if "cache_chunk_size" in kwargs:
+                cache_kwargs["chunk_size"] = kwargs["cache_chunk_size"]
+            self.__storage = CachingStorage(self.__storage, kwargs["cache_dir"], **cache_kwargs)
         
         self.__object_dataset = ObjectDataset(self.__storage)
         
@@ -51,6 +68,31 @@ class KaraStorage(KaraStorageBase):
     def _storage(self) -> StorageBase:
         return self.__storage
     
+    @property
+    def _async_storage(self) -> AsyncStorageBase:
+        if self.__async_storage is None:
+            uri = self.__uri
+            max_concurrency = self.__kwargs.get("max_concurrency", 64)
+            if uri.scheme == "file":
+                from ..backend.file import AsyncLocalFileStorage
+                self.__async_storage = AsyncLocalFileStorage(max_concurrency=max_concurrency)
+            elif uri.scheme == "oss":
+                from ..backend.oss import AsyncOSSStorage
+                self.__async_storage = AsyncOSSStorage(
+                    uri.path.split("/")[1], 
+                    ("https://" if self.__kwargs.get("use_ssl", False) else "http://") + uri.netloc,
+                    self.__kwargs["app_key"], self.__kwargs["app_secret"],
+                    max_concurrency=max_concurrency
+                )
+            else:
+                from ..backend.http import AsyncHTTPStorage
+                self.__async_storage = AsyncHTTPStorage(
+                    uri.scheme + "://" + uri.netloc, 
+                    headers=self.__kwargs.get("headers", {}), 
+                    max_connections=max_concurrency
+                )
+        return self.__async_storage
+    
     def __get_meta(self, storage_type : str, namespace : str, key : str):
         version_path = self.__prefix + "%s/%s/%s/meta.json" % (storage_type, namespace, key)
         if self.__storage.filesize(version_path) is None:
@@ -96,6 +138,9 @@ class KaraStorage(KaraStorageBase):
                 raise ValueError("No available version found in dataset `%s`. Please specify a version if you want to create a new dataset" % key)
             version = config["latest"]
 
+        if "w" in mode and version in config.get("virtual", {}):
+            raise ValueError("Version `%s` of dataset `%s` is virtual and read-only" % (version, key))
+
         if "w" in mode:
             config["latest"] = version
             if version not in config["versions"]:
@@ -106,8 +151,147 @@ class KaraStorage(KaraStorageBase):
             if version not in config["versions"]:
                 raise ValueError("Dataset version `%s` not found in dataset `%s`" % (version, key))
         
+        if version in config.get("virtual", {}):
+            prefixes = [self.__prefix + prefix for prefix in config["virtual"][version]]
+            return RowDataset(self.__storage, prefixes, mode, serialization=serialization, **kwargs)
         return RowDataset(self.__storage, self.__prefix + "row/%s/%s/%s/" % (namespace, key, version), mode, serialization=serialization, **kwargs)
 
+    def __row_prefixes(self, namespace : str, key : str, version : str) -> List[str]:
+        config = self.get_row_meta(namespace, key)
+        version = str(version)
+        if version == "latest":
+            if config["latest"] is None:
+                raise ValueError("No available version found in dataset `%s`." % key)
+            version = config["latest"]
+        if version not in config["versions"]:
+            raise ValueError("Dataset version `%s` not found in dataset `%s`" % (version, key))
+        if version in config.get("virtual", {}):
+            return config["virtual"][version]
+        return ["row/%s/%s/%s/" % (namespace, key, version)]
+
+    def create_virtual_dataset(self, namespace : str, key : str, sources : List[Tuple[str, str, str]], version = None) -> str:
+        """
+        Creates a read-only version which concatenates (namespace, key, version) of `sources` without copying them.
+        Only the metadata is written, the sources must not be removed afterwards.
+        """
+        prefixes = []
+        for source_namespace, source_key, source_version in sources:
+            prefixes.extend(self.__row_prefixes(source_namespace, source_key, source_version))
+        version = self.__new_row_version(namespace, key, version)
+        self.__put_virtual_version(namespace, key, version, prefixes)
+        return version
+
+    def __new_row_version(self, namespace : str, key : str, version = None) -> str:
+        try:
+            config = self.get_row_meta(namespace, key)
+        except FileNotFoundError:
+            config = {
+                "latest": None,
+                "versions": [],
+                "api": 2,
+            }
+        if version is None:
+            # auto generate version
+            cnt = 0
+            while ("%d" % cnt) in config["versions"]:
+                cnt += 1
+            version = "%d" % cnt
+        version = str(version)
+        if version in config["versions"]:
+            raise ValueError("Dataset version `%s` already exists in dataset `%s`" % (version, key))
+        return version
+
+    def __put_virtual_version(self, namespace : str, key : str, version : str, prefixes : List[str]):
+        try:
+            config = self.get_row_meta(namespace, key)
+        except FileNotFoundError:
+            config = {
+                "latest": None,
+                "versions": [],
+                "api": 2,
+            }
+        config.setdefault("virtual", {})[version] = prefixes
+        if version not in config["versions"]:
+            config["versions"].append(version)
+        config["latest"] = version
+        self.put_row_meta(namespace, key, config)
+
+    def transform(self, 
+            namespace : str, key : str, fn : Callable[[Any], Any], 
+            dst_namespace : str, dst_key : str,
+            version = "latest", dst_version = None,
+            num_workers : int = 4, serialization : Serializer = None, batch_size : int = 1024
+        ) -> str:
+        """
+        Maps every row of a dataset with `fn` in a process pool, rows mapped to None are dropped.
+
+        The source is split into `num_workers` contiguous slices, each worker reads its slice directly from the storage
+        and writes a shard under `<dst version>/parts/<i>/`. The shards are published as a virtual version of the destination,
+        which is returned. `fn` must be picklable, e.g. a function defined at module level.
+        """
+        prefixes = self.__row_prefixes(namespace, key, version)
+        ds = RowDataset(self.__storage, [self.__prefix + prefix for prefix in prefixes], "r", serialization=serialization)
+        try:
+            total = ds.size()
+        finally:
+            ds.close()
+        dst_version = self.__new_row_version(dst_namespace, dst_key, dst_version)
+        dst_prefix = "row/%s/%s/%s/" % (dst_namespace, dst_key, dst_version)
+
+        bounds = [total * i // num_workers for i in range(num_workers + 1)]
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            counts = list(executor.map(
+                transform_worker,
+                [self.__url] * num_workers,
+                [self.__kwargs] * num_workers,
+                [[self.__prefix + prefix for prefix in prefixes]] * num_workers,
+                bounds[:-1],
+                [ed - st for st, ed in zip(bounds[:-1], bounds[1:])],
+                [fn] * num_workers,
+                [self.__prefix + dst_prefix + "parts/%d/" % i for i in range(num_workers)],
+                [serialization] * num_workers,
+                [batch_size] * num_workers
+            ))
+        
+        # empty shards may not exist in storages without empty files
+        parts = [dst_prefix + "parts/%d/" % i for i in range(num_workers) if counts[i] > 0]
+        if len(parts) == 0:
+            parts = [dst_prefix + "parts/0/"]
+        self.__put_virtual_version(dst_namespace, dst_key, dst_version, parts)
+        return dst_version
+
+    async def open_async_dataset(self, 
+        namespace : str, key : str, version="latest", 
+        serialization : Serializer = None, **kwargs
+    ) -> AsyncRowDataset:
+        storage = self._async_storage
+        version = str(version)
+        meta_path = self.__prefix + "row/%s/%s/meta.json" % (namespace, key)
+        if await storage.filesize(meta_path) is None:
+            raise ValueError("Dataset not exists")
+        config = json.loads((await storage.readfile(meta_path)).decode("utf-8"))
+
+        if version == "latest":
+            if config["latest"] is None:
+                raise ValueError("No available version found in dataset `%s`." % key)
+            version = config["latest"]
+        if version not in config["versions"]:
+            raise ValueError("Dataset version `%s` not found in dataset `%s`" % (version, key))
+        if version in config.get("virtual", {}):
+            raise ValueError("Virtual dataset version `%s` can not be opened as an async dataset" % version)
+
+        ds = await AsyncRowDataset.open(
+            storage, self.__prefix + "row/%s/%s/%s/" % (namespace, key, version),
+            serialization=serialization, on_close=self.__release_async_storage, **kwargs
+        )
+        self.__async_refs += 1
+        return ds
+
+    async def __release_async_storage(self):
+        self.__async_refs -= 1
+        if self.__async_refs == 0:
+            await self.__async_storage.close()
+
     def load_directory(self, namespace : str, key : str, local_path : str, version = "latest", progress_bar=True):
         
         try:
@@ -0,0 +1,87 @@
+import os
+import io
+import re
+import threading
+import functools
+import http.server
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Serves files with keep-alive connections and `Range` requests, like the object storages do.
+    Multiple ranges are answered with `multipart/byteranges` if `multirange` is set,
+    `Range` headers are ignored if `ranges` is not set.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    multirange = False
+    ranges = True
+    # number of requests by method
+    counter = None
+
+    def send_head(self):
+        if self.counter is not None:
+            self.counter[self.command] = self.counter.get(self.command, 0) + 1
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404, "File not found")
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+
+        ranges = []
+        match = re.match(r"bytes=((\d*-\d*)(,\d*-\d*)*)$", self.headers.get("Range", ""))
+        if match is not None and self.ranges:
+            for spec in match.group(1).split(","):
+                begin, end = spec.split("-")
+                begin = int(begin) if begin else 0
+                end = min(int(end) + 1, len(data)) if end else len(data)
+                if begin < len(data):
+                    ranges.append((begin, end))
+            if len(ranges) == 0:
+                self.send_response(416)
+                self.send_header("Content-Range", "bytes */%d" % len(data))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+        if len(ranges) == 0 or (len(ranges) > 1 and not self.multirange):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            body = data
+        elif len(ranges) == 1:
+            begin, end = ranges[0]
+            self.send_response(206)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (begin, end - 1, len(data)))
+            body = data[begin:end]
+        else:
+            self.send_response(206)
+            self.send_header("Content-Type", "multipart/byteranges; boundary=KARA_BOUNDARY")
+            body = b""
+            for begin, end in ranges:
+                body += b"--KARA_BOUNDARY\r\nContent-Type: application/octet-stream\r\n"
+                body += b"Content-Range: bytes %d-%d/%d\r\n\r\n" % (begin, end - 1, len(data))
+                body += data[begin:end] + b"\r\n"
+            body += b"--KARA_BOUNDARY--\r\n"
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        return io.BytesIO(body)
+
+    def log_message(self, format, *args):
+        return
+
+class QuietHTTPServer(http.server.ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # clients close connections instead of reading unwanted bodies
+        import sys
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+def start_server(directory : str, multirange : bool = False, counter : dict = None, ranges : bool = True):
+    """
+    Starts serving `directory` in a background thread, returns (server, url).
+    """
+    handler = type("Handler", (RangeRequestHandler,), {"multirange": multirange, "counter": counter, "ranges": ranges})
+    server = QuietHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=directory))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:%d/" % server.server_address[1]
@@ -0,0 +1,154 @@
+import base64
+import threading
+import http.server
+import urllib.parse
+from xml.sax.saxutils import escape
+
+class OSSRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Minimal OSS-compatible server for path-style requests (`/<bucket>/<key>`) with objects kept in memory.
+    Supports HEAD, ranged GET, PUT, append (POST ?append&position=) and listing, signatures are not checked.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    objects = None
+    # number of requests by operation
+    counter = None
+    lock = None
+
+    def __parse(self):
+        uri = urllib.parse.urlparse(self.path)
+        parts = uri.path.lstrip("/").split("/", 1)
+        key = urllib.parse.unquote(parts[1]) if len(parts) > 1 else ""
+        return key, urllib.parse.parse_qs(uri.query, keep_blank_values=True)
+
+    def __count(self, op):
+        with self.lock:
+            self.counter[op] = self.counter.get(op, 0) + 1
+
+    def __read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            ret = b""
+            while True:
+                size = int(self.rfile.readline().split(b";", 1)[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return ret
+                ret += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", "0")))
+
+    def __send(self, status, body = b"", headers = {}):
+        self.send_response(status)
+        self.send_header("x-oss-request-id", "stub")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if "Content-Length" not in headers:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def __send_error(self, status, code):
+        body = ("<?xml version=\"1.0\" encoding=\"UTF-8\"?><Error><Code>%s</Code><Message>%s</Message><RequestId>stub</RequestId></Error>" % (code, code)).encode("utf-8")
+        if self.command == "HEAD":
+            self.__send(status, headers={"x-oss-err": base64.b64encode(body).decode("ascii"), "Content-Length": "0"})
+        else:
+            self.__send(status, body, {"Content-Type": "application/xml"})
+
+    def do_HEAD(self):
+        key, _ = self.__parse()
+        self.__count("HEAD")
+        with self.lock:
+            data = self.objects.get(key)
+        if data is None:
+            return self.__send_error(404, "NoSuchKey")
+        self.__send(200, headers={"Content-Length": str(len(data)), "ETag": "\"stub\"", "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+
+    def do_GET(self):
+        key, query = self.__parse()
+        if key == "":
+            return self.__list(query)
+        self.__count("GET")
+        with self.lock:
+            data = self.objects.get(key)
+        if data is None:
+            return self.__send_error(404, "NoSuchKey")
+        byte_range = self.headers.get("Range")
+        if byte_range is None:
+            return self.__send(200, data, {"ETag": "\"stub\""})
+        begin, end = byte_range.split("=", 1)[1].split("-")
+        begin = int(begin)
+        end = min(int(end) + 1, len(data)) if end else len(data)
+        if begin >= len(data):
+            return self.__send_error(416, "InvalidRange")
+        self.__send(206, data[begin:end], {"Content-Range": "bytes %d-%d/%d" % (begin, end - 1, len(data)), "ETag": "\"stub\""})
+
+    def __list(self, query):
+        self.__count("LIST")
+        prefix = query.get("prefix", [""])[0]
+        delimiter = query.get("delimiter", [""])[0]
+        contents = []
+        prefixes = set()
+        with self.lock:
+            for key in sorted(self.objects.keys()):
+                if not key.startswith(prefix):
+                    continue
+                rest = key[len(prefix):]
+                if delimiter and delimiter in rest:
+                    prefixes.add(prefix + rest.split(delimiter, 1)[0] + delimiter)
+                else:
+                    contents.append((key, len(self.objects[key])))
+        body = "<?xml version=\"1.0\" encoding=\"UTF-8\"?><ListBucketResult><Name>bucket</Name>"
+        body += "<Prefix>%s</Prefix><Marker></Marker><MaxKeys>1000</MaxKeys><Delimiter>%s</Delimiter>" % (escape(prefix), escape(delimiter))
+        body += "<IsTruncated>false</IsTruncated><NextMarker></NextMarker>"
+        for key, size in contents:
+            body += "<Contents><Key>%s</Key><LastModified>2024-01-01T00:00:00.000Z</LastModified><ETag>\"stub\"</ETag>" % escape(key)
+            body += "<Type>Appendable</Type><Size>%d</Size><StorageClass>Standard</StorageClass></Contents>" % size
+        for name in sorted(prefixes):
+            body += "<CommonPrefixes><Prefix>%s</Prefix></CommonPrefixes>" % escape(name)
+        body += "</ListBucketResult>"
+        self.__send(200, body.encode("utf-8"), {"Content-Type": "application/xml"})
+
+    def do_PUT(self):
+        key, _ = self.__parse()
+        self.__count("PUT")
+        data = self.__read_body()
+        with self.lock:
+            self.objects[key] = data
+        self.__send(200, headers={"ETag": "\"stub\""})
+
+    def do_POST(self):
+        key, query = self.__parse()
+        data = self.__read_body()
+        if "append" not in query:
+            return self.__send_error(400, "InvalidArgument")
+        self.__count("APPEND")
+        position = int(query["position"][0])
+        with self.lock:
+            current = self.objects.get(key, b"")
+            if position != len(current):
+                conflict = True
+            else:
+                conflict = False
+                self.objects[key] = current + data
+        if conflict:
+            return self.__send_error(409, "PositionNotEqualToLength")
+        self.__send(200, headers={"x-oss-next-append-position": str(position + len(data)), "ETag": "\"stub\""})
+
+    def log_message(self, format, *args):
+        return
+
+def start_server(counter : dict = None):
+    """
+    Starts an OSS stub in a background thread, returns (server, endpoint).
+    """
+    handler = type("Handler", (OSSRequestHandler,), {
+        "objects": {},
+        "counter": counter if counter is not None else {},
+        "lock": threading.Lock()
+    })
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "127.0.0.1:%d" % server.server_address[1]
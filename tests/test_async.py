@@ -0,0 +1,107 @@
+import asyncio
+import kara_storage
+import unittest, random
+import os
+import tempfile
+from http_server import start_server
+
+TEST_CASE_SIZE = 117
+
+def run(coro):
+    # asyncio.run is not available before python 3.7
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+class TestAsyncDataset(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        storage = kara_storage.KaraStorage("file://" + cls.tmpdir.name)
+        for name, kwargs in [("plain", {"max_file_size": 500}), ("compressed", {"compression": "zlib", "compression_block_size": 300})]:
+            ds = storage.open_dataset("test", name, "w", version=0, **kwargs)
+            ds.write_many({"index": i, "bbb": "aaa" * (i % 5)} for i in range(TEST_CASE_SIZE))
+            ds.close()
+        # legacy dataset without manifest
+        os.unlink(os.path.join(cls.tmpdir.name, "row", "test", "plain", "0", "manifest.json"))
+        cls.server, cls.url = start_server(cls.tmpdir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.tmpdir.cleanup()
+
+    def storages(self):
+        return [
+            kara_storage.KaraStorage("file://" + self.tmpdir.name),
+            kara_storage.KaraStorage(self.url, max_concurrency=8)
+        ]
+
+    async def check_dataset(self, storage : kara_storage.KaraStorage, name : str, **kwargs):
+        ds = await storage.open_async_dataset("test", name, **kwargs)
+        self.assertEqual(len(ds), TEST_CASE_SIZE)
+        self.assertListEqual([v["index"] async for v in ds], list(range(TEST_CASE_SIZE)))
+        with self.assertRaises(EOFError):
+            await ds.read()
+
+        ds.seek(10)
+        self.assertEqual((await ds.read())["index"], 10)
+        self.assertEqual((await ds.pread(37))["bbb"], "aaa" * 2)
+        with self.assertRaises(EOFError):
+            await ds.pread(TEST_CASE_SIZE)
+
+        offsets = [random.randint(0, TEST_CASE_SIZE - 1) for _ in range(2000)]
+        ret = await asyncio.gather(*[ds.pread(i) for i in offsets])
+        self.assertListEqual([v["index"] for v in ret], offsets)
+        self.assertListEqual([v["index"] for v in await ds.pread_many(offsets[:100])], offsets[:100])
+
+        sub = ds.slice(100, 10)
+        self.assertListEqual([v["index"] async for v in sub], list(range(100, 110)))
+        await ds.close()
+
+    def test_1_read(self):
+        for storage in self.storages():
+            for name in ["plain", "compressed"]:
+                run(self.check_dataset(storage, name))
+
+    def test_2_index_cache(self):
+        for storage in self.storages():
+            run(self.check_dataset(storage, "plain", index_cache="memory"))
+
+    def test_3_not_exists(self):
+        async def open_not_exists():
+            await kara_storage.KaraStorage(self.url).open_async_dataset("test", "not_exists")
+        with self.assertRaises(ValueError):
+            run(open_not_exists())
+
+    def test_4_context_manager(self):
+        async def read_first(storage : kara_storage.KaraStorage):
+            async with await storage.open_async_dataset("test", "compressed") as ds:
+                return (await ds.read())["index"]
+        for storage in self.storages():
+            self.assertEqual(run(read_first(storage)), 0)
+
+    def test_5_shared_storage(self):
+        async def read_after_close(storage : kara_storage.KaraStorage):
+            closes = []
+            async_storage = storage._async_storage
+            close = async_storage.close
+            async def counted_close():
+                closes.append(1)
+                await close()
+            async_storage.close = counted_close
+
+            ds_a = await storage.open_async_dataset("test", "plain")
+            ds_b = await storage.open_async_dataset("test", "compressed")
+            await ds_a.slice(0, 10).close()
+            await ds_a.close()
+            await ds_a.close()
+            # the storage is still used by the other dataset
+            self.assertListEqual(closes, [])
+            self.assertEqual((await ds_b.pread(5))["index"], 5)
+            await ds_b.close()
+            self.assertListEqual(closes, [1])
+        for storage in self.storages():
+            run(read_after_close(storage))
@@ -0,0 +1,124 @@
+import kara_storage
+import unittest, random
+import os
+import tempfile
+from http_server import start_server
+
+TEST_CASE_SIZE = 117
+
+class TestLocalHTTPStorage(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        storage = kara_storage.KaraStorage("file://" + cls.tmpdir.name)
+        for name, kwargs in [("plain", {"max_file_size": 500}), ("compressed", {"compression": "zlib", "compression_block_size": 300})]:
+            ds = storage.open_dataset("test", name, "w", version=0, **kwargs)
+            ds.write_many({"index": i, "bbb": "aaa" * (i % 5)} for i in range(TEST_CASE_SIZE))
+            ds.close()
+        with open(os.path.join(cls.tmpdir.name, "large.bin"), "wb") as f:
+            f.write(os.urandom(1024 * 1024 + 17))
+
+        cls.counters = [{}, {}]
+        cls.servers = [start_server(cls.tmpdir.name, multirange=multirange, counter=counter) for multirange, counter in zip([False, True], cls.counters)]
+
+    @classmethod
+    def tearDownClass(cls):
+        for server, _ in cls.servers:
+            server.shutdown()
+        cls.tmpdir.cleanup()
+
+    def test_1_read(self):
+        for _, url in self.servers:
+            storage = kara_storage.KaraStorage(url)
+            for name in ["plain", "compressed"]:
+                ds = storage.open_dataset("test", name, "r")
+                self.assertListEqual([v["index"] for v in ds], list(range(TEST_CASE_SIZE)))
+                offsets = [random.randint(0, TEST_CASE_SIZE - 1) for _ in range(50)]
+                self.assertListEqual([v["index"] for v in ds.pread_many(offsets)], offsets)
+                self.assertEqual(ds[37]["bbb"], "aaa" * 2)
+                with self.assertRaises(ValueError):
+                    storage.open_dataset("test", "not_exists", "r")
+
+    def test_2_filesize_head(self):
+        _, url = self.servers[0]
+        self.counters[0].clear()
+        http_storage = kara_storage.KaraStorage(url)._storage
+        self.assertEqual(http_storage.filesize("/large.bin"), 1024 * 1024 + 17)
+        self.assertIsNone(http_storage.filesize("/not_exists.bin"))
+        self.assertDictEqual(self.counters[0], {"HEAD": 2})
+
+    def test_3_ranges(self):
+        with open(os.path.join(self.tmpdir.name, "large.bin"), "rb") as f:
+            data = f.read()
+        ranges = [(0, 10), (5000, 100), (1024 * 1024, 100), (300, 0)]
+        for (_, url), counter, multirange in zip(self.servers, self.counters, [False, True]):
+            from kara_storage.backend.http import HTTPStorage
+            http_storage = HTTPStorage(url, split_size=64 * 1024)
+            fp = http_storage.open_random("large.bin")
+
+            buf = bytearray(len(data) + 100)
+            self.assertEqual(fp.preadinto(buf, 0), len(data))
+            self.assertEqual(bytes(buf[:len(data)]), data)
+            buf = bytearray(200 * 1024)
+            self.assertEqual(fp.preadinto(buf, 1000), len(buf))
+            self.assertEqual(bytes(buf), data[1000: 1000 + len(buf)])
+
+            counter.clear()
+            for _ in range(2):
+                self.assertListEqual(fp.pread_ranges(ranges), [data[offset: offset + length] for offset, length in ranges])
+            self.assertEqual(http_storage.multirange, multirange)
+            # falls back to single range requests after the first response, empty ranges are not requested
+            self.assertEqual(counter["GET"], 2 if multirange else 1 + 2 * (len(ranges) - 1))
+
+    def test_4_shared_cache_dir(self):
+        # same dataset path and file sizes on another host
+        with tempfile.TemporaryDirectory() as other_dir, tempfile.TemporaryDirectory() as cache_dir:
+            ds = kara_storage.KaraStorage("file://" + other_dir).open_dataset("test", "plain", "w", version=0, max_file_size=500)
+            ds.write_many({"index": i, "bbb": "bbb" * (i % 5)} for i in range(TEST_CASE_SIZE))
+            ds.close()
+            server, other_url = start_server(other_dir)
+            try:
+                for url, value in [(self.servers[0][1], "aaa"), (other_url, "bbb"), (self.servers[0][1], "aaa")]:
+                    ds = kara_storage.KaraStorage(url, cache_dir=cache_dir, cache_chunk_size=256).open_dataset("test", "plain", "r", version=0)
+                    self.assertListEqual([v["bbb"] for v in ds], [value * (i % 5) for i in range(TEST_CASE_SIZE)])
+                    ds.close()
+            finally:
+                server.shutdown()
+
+    def test_5_range_not_supported(self):
+        from kara_storage.backend.http import HTTPStorage
+        counter = {}
+        server, url = start_server(self.tmpdir.name, counter=counter, ranges=False)
+        try:
+            http_storage = HTTPStorage(url)
+            fp = http_storage.open_random("large.bin")
+            # empty ranges are not requested
+            self.assertListEqual(fp.pread_ranges([(0, 0), (10, 0)]), [b"", b""])
+            self.assertDictEqual(counter, {})
+            with self.assertRaisesRegex(RuntimeError, "range header"):
+                fp.preadinto(bytearray(10), 100)
+            with self.assertRaisesRegex(RuntimeError, "range header"):
+                fp.pread_ranges([(0, 10), (5000, 10)])
+            # the multi-range request is not sent again
+            self.assertFalse(http_storage.multirange)
+        finally:
+            server.shutdown()
+
+    def test_6_shared_block_cache(self):
+        # same dataset path and file sizes on another host
+        with tempfile.TemporaryDirectory() as other_dir:
+            ds = kara_storage.KaraStorage("file://" + other_dir).open_dataset("test", "plain", "w", version=0, max_file_size=500)
+            ds.write_many({"index": i, "bbb": "bbb" * (i % 5)} for i in range(TEST_CASE_SIZE))
+            ds.close()
+            server, other_url = start_server(other_dir)
+            try:
+                cache = kara_storage.row.BlockCache(block_size=256)
+                offsets = list(range(TEST_CASE_SIZE))
+                random.shuffle(offsets)
+                for url, value in [(self.servers[0][1], "aaa"), (other_url, "bbb"), (self.servers[0][1], "aaa")]:
+                    ds = kara_storage.KaraStorage(url).open_dataset("test", "plain", "r", version=0, block_cache=cache)
+                    self.assertListEqual([v["bbb"] for v in ds.pread_many(offsets)], [value * (i % 5) for i in offsets])
+                    ds.close()
+                self.assertGreater(cache.hits, 0)
+            finally:
+                server.shutdown()
@@ -4,11 +4,37 @@ import unittest, random
 import torch.utils.data as data
 import shutil, os
 import tempfile
+import json
+import multiprocessing as mp
 
 TEST_CASE_SIZE = 117
 TEST_VERSIONS = [3, 1, 2, 4, 7, 6, False]
 storage = kara_storage.KaraStorage("file://kara_data")
 
+def read_in_subprocess(ds, q):
+    q.put(list(ds))
+
+def pread_in_subprocess(ds, offsets, q):
+    q.put([ds[offset] for offset in offsets])
+
+def seek_in_subprocess(ds, q):
+    ret = [ds.read()["index"] for _ in range(3)] + [ds.tell()]
+    ds.seek(-1, io.SEEK_CUR)
+    ret += [ds.read()["index"], ds.tell()]
+    ret += [v["index"] for v in ds.read_many(5)] + [ds.tell(), ds.pread(50)["index"], ds.size()]
+    ret += [v["index"] for v in ds]
+    q.put(ret)
+
+def write_in_subprocess(ds):
+    ds.write({"index": -1})
+    ds.write_many({"index": i} for i in range(100))
+    ds.write({"index": -2})
+
+def transform_fn(row):
+    if row["index"] % 3 == 0:
+        return None
+    return {"index": row["index"], "double": row["index"] * 2}
+
 class TestLocalFileStorage(unittest.TestCase):
     def test_01_write(self):
         if os.path.exists("kara_data"):
@@ -212,9 +238,532 @@ class TestLocalFileStorage(unittest.TestCase):
             self.assertEqual(open(os.path.join(t3, "f2"), "r").read(), "v0/f2")
             self.assertEqual(open(os.path.join(t3, "d1", "f3"), "r").read(), "v0/f3")
 
+    def test_11_pread_many(self):
+        ds = storage.open_dataset("test", "a/b/c", "r")
 
+        idx = [random.randint(0, TEST_CASE_SIZE - 1) for _ in range(TEST_CASE_SIZE)] + [0, 0, TEST_CASE_SIZE - 1]
+        for id_, v in zip(idx, ds.pread_many(idx)):
+            self.assertEqual(v["index"], id_)
+            self.assertEqual(v["bbb"], "aaa")
+        
+        ds = ds.slice(5, 10)
+        self.assertListEqual([v["index"] for v in ds.pread_many([9, 0, 3])], [14, 5, 8])
+        with self.assertRaises(EOFError):
+            ds.pread_many([1, 10])
+    
+    def test_12_pread_many_small_trunks(self):
+        ds = storage.open_dataset("test", "small_trunks", "w", version=0, max_file_size=100)
+        for i in range(TEST_CASE_SIZE):
+            ds.write({"index": i})
+        ds.close()
 
+        ds = storage.open_dataset("test", "small_trunks", "r")
+        idx = list(range(TEST_CASE_SIZE))
+        random.shuffle(idx)
+        self.assertListEqual([v["index"] for v in ds.pread_many(idx)], idx)
+        self.assertListEqual([v["index"] for v in ds], list(range(TEST_CASE_SIZE)))
+
+    
+    def test_13_index_cache(self):
+        for key in ["a/b/c", "small_trunks"]:
+            ds = storage.open_dataset("test", key, "r")
+            ds_cached = storage.open_dataset("test", key, "r", index_cache="memory")
+            self.assertEqual(len(ds_cached), len(ds))
+            self.assertListEqual(list(ds_cached), list(ds))
+
+            idx = [random.randint(0, len(ds) - 1) for _ in range(TEST_CASE_SIZE)]
+            self.assertListEqual([ds_cached[i] for i in idx], [ds[i] for i in idx])
+            self.assertListEqual(ds_cached.pread_many(idx), ds.pread_many(idx))
+            
+            ds_cached.seek(7)
+            self.assertEqual(ds_cached.read()["index"], 7)
+            ds_cached.close()
+
+        # trunks not aligned to entries, the entries across trunks are copied
+        from kara_storage.row.index import MemoryIndex
+        import array
+        offsets = array.array("Q", range(0, 1000, 7))
+        raw = offsets.tobytes()
+        cuts = [0, 3, 4, 21, 29, 500, len(raw)]
+        index = MemoryIndex([memoryview(raw[a:b]) for a, b in zip(cuts[:-1], cuts[1:])])
+        self.assertListEqual([index[i] for i in range(len(index))], list(offsets))
+        index.close()
+    
+    def test_14_mmap(self):
+        for key in ["a/b/c", "small_trunks"]:
+            ds = storage.open_dataset("test", key, "r")
+            ds_mapped = storage.open_dataset("test", key, "r", use_mmap=True)
+            self.assertListEqual(list(ds_mapped), list(ds))
+
+            idx = [random.randint(0, len(ds) - 1) for _ in range(TEST_CASE_SIZE)]
+            self.assertListEqual([ds_mapped[i] for i in idx], [ds[i] for i in idx])
+            self.assertListEqual(ds_mapped.pread_many(idx), ds.pread_many(idx))
+
+            ds_mapped.seek(3)
+            self.assertEqual(ds_mapped.read()["index"], 3)
+            ds_mapped.close()
 
+        ds = storage.open_dataset("test", "a/b/c", "r", use_mmap=True, serialization=kara_storage.serialization.NoSerializer())
+        self.assertIsInstance(ds.read(), memoryview)
+
+        ds = storage.open_dataset("test", "a/b/c", "r", use_mmap=True)
+        idx = []
+        for it in data.DataLoader(kara_storage.make_torch_dataset(ds.slice(0, TEST_CASE_SIZE)), num_workers=2):
+            idx.append(it["index"].item())
+        self.assertListEqual(sorted(idx), list(range(TEST_CASE_SIZE)))
+
+        q = mp.Queue()
+        p = mp.Process(target=read_in_subprocess, args=(ds.slice(0, 5), q))
+        p.start()
+        self.assertListEqual([v["index"] for v in q.get()], [0, 1, 2, 3, 4])
+        p.join()
+    
+    def test_15_file_pool(self):
+        from concurrent.futures import ThreadPoolExecutor
+        ds = storage.open_dataset("test", "small_trunks", "r", max_open_files=2)
+        idx = [random.randint(0, TEST_CASE_SIZE - 1) for _ in range(TEST_CASE_SIZE * 4)]
+        with ThreadPoolExecutor(8) as executor:
+            ret = list(executor.map(ds.pread, idx))
+        self.assertListEqual([v["index"] for v in ret], idx)
+        ds.close()
+    
+    def test_16_readahead(self):
+        for key in ["a/b/c", "small_trunks"]:
+            ds = storage.open_dataset("test", key, "r")
+            ds_readahead = storage.open_dataset("test", key, "r", readahead=3, readahead_size=256)
+            self.assertListEqual(list(ds_readahead), list(ds))
+
+            ds_readahead.seek(11)
+            self.assertEqual(ds_readahead.read()["index"], 11)
+            ds_readahead.seek(2, io.SEEK_CUR)
+            self.assertEqual(ds_readahead.read()["index"], 14)
+            ds_readahead.close()
+    
+    def test_17_manifest(self):
+        manifest_path = os.path.join(storage.prefix, "row", "test", "small_trunks", "0", "manifest.json")
+        self.assertTrue(os.path.exists(manifest_path))
+
+        # legacy dataset without manifest
+        os.unlink(manifest_path)
+        ds = storage.open_dataset("test", "small_trunks", "r")
+        self.assertListEqual([v["index"] for v in ds], list(range(TEST_CASE_SIZE)))
+
+        ds = storage.open_dataset("test", "small_trunks", "w", max_file_size=100)
+        ds.write({"index": TEST_CASE_SIZE})
+        ds.flush()
+        self.assertTrue(os.path.exists(manifest_path))
+        ds.write({"index": TEST_CASE_SIZE + 1})
+        ds.close()
+
+        ds = storage.open_dataset("test", "small_trunks", "r")
+        self.assertListEqual([v["index"] for v in ds], list(range(TEST_CASE_SIZE + 2)))
+    
+    def test_18_list(self):
+        prefix = storage.prefix + "row/test/small_trunks/0/"
+        files = storage._storage.list(prefix + "index/")
+        self.assertEqual(len(files), 10)
+        self.assertEqual(files["0.blk"], 100)
+        self.assertDictEqual(storage._storage.list(prefix + "mani"), {"fest.json": os.stat(prefix + "manifest.json").st_size})
+        self.assertDictEqual(storage._storage.list(prefix + "not_exists/"), {})
+
+    def test_19_compression(self):
+        ds = storage.open_dataset("test", "compressed", "w", version=0, compression="zlib", compression_block_size=256, max_file_size=1000)
+        for i in range(TEST_CASE_SIZE):
+            ds.write({"index": i, "text": "kara" * (i % 10)})
+        ds.flush()
+        self.assertListEqual([v["index"] for v in storage.open_dataset("test", "compressed", "r")], list(range(TEST_CASE_SIZE)))
+        ds.write({"index": TEST_CASE_SIZE, "text": ""})
+        ds.close()
+
+        prefix = os.path.join(storage.prefix, "row", "test", "compressed", "0")
+        self.assertTrue(os.path.exists(os.path.join(prefix, "blocks", "0.blk")))
+        self.assertTrue(os.path.exists(os.path.join(prefix, "data", "1.blk")))
+
+        # append without passing the codec
+        ds = storage.open_dataset("test", "compressed", "w", max_file_size=1000)
+        ds.write({"index": TEST_CASE_SIZE + 1, "text": "kara"})
+        ds.close()
+
+        for kwargs in [{}, {"index_cache": "memory"}, {"readahead": 2}, {"decompress_cache": 1}]:
+            ds = storage.open_dataset("test", "compressed", "r", **kwargs)
+            self.assertEqual(len(ds), TEST_CASE_SIZE + 2)
+            self.assertListEqual([v["index"] for v in ds], list(range(TEST_CASE_SIZE + 2)))
+            ds.seek(50)
+            self.assertEqual(ds.read()["text"], "kara" * 0)
+            self.assertEqual(ds.pread(37)["text"], "kara" * 7)
+            offsets = list(range(TEST_CASE_SIZE + 2))
+            random.shuffle(offsets)
+            self.assertListEqual([v["index"] for v in ds.pread_many(offsets)], offsets)
+            ds.close()
         
+        with self.assertRaises(ValueError):
+            storage.open_dataset("test", "compressed", "w", compression="lz4")
+        with self.assertRaises(ValueError):
+            storage.open_dataset("test", "a/b/c", "w", compression="zlib")
+
+    def test_20_write_many(self):
+        ds = storage.open_dataset("test", "write_many", "w", version=0, max_file_size=100)
+        ds.write({"index": 0})
+        ds.write_many({"index": i} for i in range(1, TEST_CASE_SIZE))
+        ds.write_many([])
+        ds.write_many([{"index": TEST_CASE_SIZE}], batch_size=1)
+        ds.close()
+
+        ds = storage.open_dataset("test", "write_many", "r")
+        self.assertEqual(len(ds), TEST_CASE_SIZE + 1)
+        self.assertListEqual([v["index"] for v in ds], list(range(TEST_CASE_SIZE + 1)))
+        self.assertEqual(ds.pread(50)["index"], 50)
+
+    def test_21_parallel_writer(self):
+        for executor in ["thread", "process"]:
+            ds = storage.open_dataset("test", "parallel_" + executor, "w", version=0, serialization=kara_storage.serialization.PickleSerializer())
+            writer = kara_storage.row.ParallelWriter(ds, workers=2, executor=executor, batch_size=7, max_pending=2)
+            for i in range(50):
+                writer.write({"index": i})
+            writer.flush()
+            self.assertEqual(len(storage.open_dataset("test", "parallel_" + executor, "r")), 50)
+            writer.write_many({"index": i} for i in range(50, TEST_CASE_SIZE))
+            writer.close()
+            self.assertTrue(ds.closed)
+
+            ds = storage.open_dataset("test", "parallel_" + executor, "r", serialization=kara_storage.serialization.PickleSerializer())
+            self.assertListEqual([v["index"] for v in ds], list(range(TEST_CASE_SIZE)))
 
-        
\ No newline at end of file
+    def test_22_concurrent_pread(self):
+        from concurrent.futures import ThreadPoolExecutor
+        offsets = list(range(TEST_CASE_SIZE)) * 4
+        random.shuffle(offsets)
+        for name, kwargs in [("a/b/c", {}), ("a/b/c", {"use_mmap": True}), ("small_trunks", {"max_open_files": 2}), ("compressed", {})]:
+            ds = storage.open_dataset("test", name, "r", **kwargs)
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                ret = list(executor.map(lambda i: ds.pread(i)["index"], offsets))
+            self.assertListEqual(ret, offsets)
+            ds.close()
+
+    def test_23_block_cache(self):
+        cache = kara_storage.row.BlockCache(capacity=4096, block_size=256)
+        ds = storage.open_dataset("test", "small_trunks", "r", block_cache=cache)
+        for i in [50, 53, 51, 52, 50]:
+            self.assertEqual(ds.pread(i)["index"], i)
+        self.assertGreater(cache.hits, 0)
+        self.assertLessEqual(cache.size, 4096)
+
+        misses = cache.misses
+        sub = ds.slice(50, 10)
+        self.assertListEqual([v["index"] for v in sub.pread_many([0, 3, 1])], [50, 53, 51])
+        self.assertEqual(cache.misses, misses)
+
+        offsets = list(range(TEST_CASE_SIZE))
+        random.shuffle(offsets)
+        self.assertListEqual([ds.pread(i)["index"] for i in offsets], offsets)
+        self.assertLessEqual(cache.size, 4096)
+
+        ds = storage.open_dataset("test", "compressed", "r", block_cache=1024 * 1024)
+        self.assertListEqual([v["index"] for v in ds.pread_many(offsets)], offsets)
+
+    def test_24_shared_slice(self):
+        for name, kwargs in [("small_trunks", {}), ("small_trunks", {"index_cache": "memory"}), ("compressed", {})]:
+            ds = storage.open_dataset("test", name, "r", **kwargs)
+            num_fds = len(os.listdir("/proc/self/fd"))
+            slices = [ds.slice(i * 10, 10) for i in range(100)]
+            self.assertEqual(len(os.listdir("/proc/self/fd")), num_fds)
+
+            # independent cursors
+            self.assertEqual(slices[1].read()["index"], 10)
+            self.assertEqual(slices[2].read()["index"], 20)
+            self.assertEqual(slices[1].read()["index"], 11)
+            self.assertEqual(ds.read()["index"], 0)
+            slices[1].seek(5)
+            self.assertEqual(slices[1].read()["index"], 15)
+            self.assertEqual(len(slices[11]), TEST_CASE_SIZE + 2 - 110)
+
+            # shared trunks stay open until the last slice is closed
+            ds.close()
+            sub = slices[3].slice(2, 5)
+            slices[3].close()
+            self.assertListEqual([v["index"] for v in sub], list(range(32, 37)))
+            self.assertEqual(slices[4].pread(9)["index"], 49)
+            # negative offsets are out of the slice too
+            with self.assertRaises(EOFError):
+                slices[4].pread_many([-1])
+            with self.assertRaises(EOFError):
+                slices[4].pread(-1)
+            with self.assertRaises(IndexError):
+                slices[4][-1]
+            for v in slices:
+                v.close()
+            sub.close()
+
+    def test_25_batches(self):
+        import numpy as np
+        ds = storage.open_dataset("test", "compressed", "r")
+        self.assertListEqual([v["index"] for v in ds.read_many(10)], list(range(10)))
+        ds.seek(100)
+        self.assertListEqual([v["index"] for v in ds.read_many(100)], list(range(100, TEST_CASE_SIZE + 2)))
+        self.assertListEqual(ds.read_many(10), [])
+
+        serialization = kara_storage.serialization.JSONSerializer()
+        self.assertListEqual(serialization.deserialize_many([b"1", b" [2, 3] ", b"{}"]), [1, [2, 3], {}])
+        # a row of several values must not shift the other rows
+        with self.assertRaises(ValueError):
+            serialization.deserialize_many([b"1", b"2,3"])
+
+        for kwargs in [{}, {"index_cache": "memory"}, {"use_mmap": True}]:
+            ds = storage.open_dataset("test", "a/b/c", "r", **kwargs).slice(3, 100)
+            batches = list(ds.iter_batches(batch_size=16, columns=["index", "ccc"]))
+            self.assertEqual(len(batches), 7)
+            self.assertTrue(np.array_equal(np.concatenate([b["index"] for b in batches]), np.arange(3, 103)))
+            self.assertEqual(batches[0]["ccc"].dtype, np.float64)
+
+        try:
+            import pyarrow
+        except ImportError:
+            pyarrow = None
+        if pyarrow is not None:
+            ds = storage.open_dataset("test", "a/b/c", "r")
+            batches = list(ds.slice(3, 100).iter_batches(batch_size=16, columns=["index", "ccc", "missing"], format="arrow"))
+            self.assertListEqual([batch.num_rows for batch in batches], [16] * 6 + [4])
+            self.assertListEqual(sum((batch.column(0).to_pylist() for batch in batches), []), list(range(3, 103)))
+            self.assertListEqual(batches[0].column(1).to_pylist(), [ds[i]["ccc"] for i in range(3, 19)])
+            self.assertEqual(batches[0].column(2).null_count, 16)
+            # the last row has none of the columns of the first row
+            batches = list(ds.iter_batches(batch_size=50, format="arrow"))
+            self.assertListEqual(batches[0].schema.names, ["index", "bbb", "ccc"])
+            self.assertDictEqual(batches[-1].to_pylist()[-1], {"index": None, "bbb": None, "ccc": None})
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            from kara_storage.cmd import get_parser
+            for fmt, name in [("jsonl", "out.jsonl"), ("numpy", "out.npz")]:
+                args = get_parser().parse_args([
+                    "row", "file://kara_data", "export", "test", "compressed", 
+                    "--format", fmt, "--columns", "index", "--begin", "10", "-o", os.path.join(tmpdir, name)
+                ])
+                args.func(args)
+            with open(os.path.join(tmpdir, "out.jsonl")) as f:
+                self.assertListEqual([json.loads(line) for line in f], [{"index": i} for i in range(10, TEST_CASE_SIZE + 2)])
+            self.assertTrue(np.array_equal(np.load(os.path.join(tmpdir, "out.npz"))["index"], np.arange(10, TEST_CASE_SIZE + 2)))
+
+    def test_26_virtual_dataset(self):
+        version = storage.create_virtual_dataset("test", "merged", [
+            ("test", "small_trunks", "latest"),
+            ("test", "compressed", 0),
+        ])
+        self.assertEqual(version, "0")
+        storage.create_virtual_dataset("test", "merged", [("test", "merged", 0), ("test", "write_many", 0)], version="nested")
+        meta = storage.get_row_meta("test", "merged")
+        with self.assertRaises(ValueError):
+            storage.open_dataset("test", "merged", "w", version="0")
+        self.assertDictEqual(storage.get_row_meta("test", "merged"), meta)
+
+        expected = list(range(TEST_CASE_SIZE + 2)) * 2 + list(range(TEST_CASE_SIZE + 1))
+        for kwargs in [{}, {"index_cache": "memory"}]:
+            ds = storage.open_dataset("test", "merged", "r", **kwargs)
+            self.assertEqual(len(ds), len(expected))
+            self.assertListEqual([v["index"] for v in ds], expected)
+            ds.seek(TEST_CASE_SIZE)
+            self.assertListEqual([v["index"] for v in ds.read_many(4)], [TEST_CASE_SIZE, TEST_CASE_SIZE + 1, 0, 1])
+            self.assertEqual(ds.pread(TEST_CASE_SIZE * 2 + 5)["index"], expected[TEST_CASE_SIZE * 2 + 5])
+
+            offsets = list(range(len(expected)))
+            random.shuffle(offsets)
+            self.assertListEqual([v["index"] for v in ds.pread_many(offsets)], [expected[i] for i in offsets])
+
+            sub = ds.slice(TEST_CASE_SIZE * 2, 10)
+            self.assertListEqual([v["index"] for v in sub], expected[TEST_CASE_SIZE * 2: TEST_CASE_SIZE * 2 + 10])
+            ds.close()
+        
+        ds = storage.open_dataset("test", "merged", "r", version=0)
+        self.assertEqual(len(ds), (TEST_CASE_SIZE + 2) * 2)
+
+    def test_27_key_index(self):
+        ds = storage.open_dataset("test", "compressed", "r")
+        ds.build_key_index("index", workers=3)
+        ds.build_key_index(lambda row: "key-%d" % row["index"], name="func", bloom_bits_per_key=0, executor="thread")
+        self.assertTrue(os.path.exists(os.path.join(storage.prefix, "row", "test", "compressed", "0", "keys", "default", "entries")))
+
+        ds = storage.open_dataset("test", "compressed", "r")
+        self.assertEqual(ds.get_by_key(37)["text"], "kara" * 7)
+        self.assertEqual(ds.get_by_key("key-100", name="func")["index"], 100)
+        with self.assertRaises(KeyError):
+            ds.get_by_key(TEST_CASE_SIZE + 10)
+        with self.assertRaises(KeyError):
+            ds.get_by_key("37")
+        with self.assertRaises(KeyError):
+            ds.get_by_key(1, name="not_exists")
+
+        keys = list(range(-5, TEST_CASE_SIZE + 5))
+        random.shuffle(keys)
+        self.assertListEqual(
+            [None if v is None else v["index"] for v in ds.get_many_by_key(keys)],
+            [k if 0 <= k < TEST_CASE_SIZE + 2 else None for k in keys]
+        )
+
+        sub = ds.slice(10, 10)
+        self.assertEqual(sub.get_by_key(15)["index"], 15)
+        self.assertIsNone(sub.get_many_by_key([5])[0])
+
+        # entries are sorted in chunks and merged
+        from kara_storage.row.keys import KeyIndex, write_key_index
+        import array
+        hashes = array.array("Q", [random.randint(0, 20) for _ in range(100)])
+        write_key_index(storage._storage, storage.prefix + "keys_test/", hashes, array.array("Q", range(100)), block_entries=4, sort_chunk_size=7)
+        index = KeyIndex(storage._storage, storage.prefix + "keys_test/")
+        for h in range(22):
+            self.assertListEqual(index.lookup(h), [i for i, v in enumerate(hashes) if v == h])
+        index.close()
+
+        # an index built before rows are appended is rejected until it is rebuilt
+        ds = storage.open_dataset("test", "keyed", "w", version=0)
+        ds.write_many({"index": i} for i in range(10))
+        ds.close()
+        storage.open_dataset("test", "keyed", "r", version=0).build_key_index("index", workers=2)
+        ds = storage.open_dataset("test", "keyed", "w", version=0)
+        ds.write({"index": 10})
+        ds.close()
+        ds = storage.open_dataset("test", "keyed", "r", version=0)
+        self.assertEqual(len(ds), 11)
+        with self.assertRaises(RuntimeError):
+            ds.get_by_key(10)
+        ds.build_key_index("index", workers=2)
+        self.assertEqual(ds.get_by_key(10)["index"], 10)
+
+    def test_28_transform(self):
+        version = storage.transform("test", "compressed", transform_fn, "test", "transformed", num_workers=3)
+        expected = [i for i in range(TEST_CASE_SIZE + 2) if i % 3 != 0]
+        ds = storage.open_dataset("test", "transformed", "r")
+        self.assertListEqual([v["index"] for v in ds], expected)
+        self.assertListEqual([v["double"] for v in ds.pread_many([0, 1])], [2, 4])
+        self.assertEqual(len(storage.get_row_meta("test", "transformed")["virtual"][version]), 3)
+
+        from kara_storage.cmd import get_parser
+        args = get_parser().parse_args([
+            "row", "file://kara_data", "transform", "test", "merged", "-v", "nested", 
+            "--fn", "test_local:transform_fn", "--dst-key", "transformed", "--dst-version", "cli", "--workers", "2"
+        ])
+        args.func(args)
+        ds = storage.open_dataset("test", "transformed", "r", version="cli")
+        self.assertEqual(len(ds), len(expected) * 2 + len([i for i in range(TEST_CASE_SIZE + 1) if i % 3 != 0]))
+
+    def test_29_balanced_sharding(self):
+        from kara_storage.pytorch.shard import BlockSharding, ShardedIterator
+        from kara_storage.pytorch.iter import SequentialIterator
+        ds = storage.open_dataset("test", "skewed", "w", version=0)
+        ds.write_many({"index": i, "text": "kara" * (500 if i < 40 else 1)} for i in range(400))
+        ds.close()
+
+        ds = storage.open_dataset("test", "skewed", "r", version=0, index_cache="memory")
+        sub = ds.slice(10, 20)
+        row_bytes = [len(ds.serialization.serialize(v)) for v in sub]
+        self.assertListEqual(sub.row_ends(list(range(20))), [sum(row_bytes[:i + 1]) for i in range(20)])
+        merged = storage.open_dataset("test", "merged", "r", version=0)
+        self.assertEqual(merged.row_ends([len(merged) - 1])[0], sum(len(merged.serialization.serialize(v)) for v in merged))
+
+        shardings = [BlockSharding(ds.slice(), rank, 4, block_size=16, seed=1, cover_remainder=False) for rank in range(4)]
+        shards = [sharding.shard(0) for sharding in shardings]
+        self.assertListEqual([len(shard) for shard in shards], [96] * 4)
+        rows = [[] for _ in range(4)]
+        for rank, sharding in enumerate(shardings):
+            it = ShardedIterator(None, 0, sharding, SequentialIterator)
+            while True:
+                try:
+                    rows[rank].append(it.next()["index"])
+                except StopIteration:
+                    break
+        self.assertEqual(len(set(sum(rows, []))), 384)
+        shard_bytes = [sum(shardings[0].block_bytes[start // 16] for start, _ in shard.blocks) for shard in shards]
+        self.assertLess(max(shard_bytes) - min(shard_bytes), max(shardings[0].block_bytes))
+        self.assertNotEqual([shard.blocks for shard in shards], [sharding.shard(1).blocks for sharding in shardings])
+
+        shards = [BlockSharding(ds.slice(), rank, 3, block_size=16, cover_remainder=True).shard(5) for rank in range(3)]
+        self.assertSetEqual(set(start for shard in shards for start, _ in shard.blocks), set(range(0, 400, 16)))
+        self.assertListEqual([len(shard.blocks) for shard in shards], [9] * 3)
+
+        # small datasets are padded by default instead of leaving the ranks empty
+        shards = [BlockSharding(ds.slice(0, 20), rank, 4, block_size=16).shard(0) for rank in range(4)]
+        self.assertSetEqual(set(start for shard in shards for start, _ in shard.blocks), {0, 16})
+        self.assertListEqual([len(shard) for shard in shards], [16] * 4)
+
+        # the last incomplete block wraps around, so every rank reads the same number of rows
+        for size, world_size in [(390, 3), (20, 4), (100, 8)]:
+            rows = []
+            for rank in range(world_size):
+                sharding = BlockSharding(ds.slice(0, size), rank, world_size, block_size=16)
+                self.assertEqual(len(sharding.shard(2)), len(BlockSharding(ds.slice(0, size), 0, world_size, block_size=16).shard(2)))
+                it = ShardedIterator(None, 2, sharding, SequentialIterator)
+                rows.append([])
+                while True:
+                    try:
+                        rows[-1].append(it.next()["index"])
+                    except StopIteration:
+                        break
+                self.assertEqual(len(rows[-1]), len(sharding.shard(2)))
+            self.assertEqual(len(set(len(v) for v in rows)), 1)
+            self.assertSetEqual(set(sum(rows, [])), set(range(size)))
+        with self.assertRaises(ValueError):
+            BlockSharding(ds.slice(0, 20), 0, 4, block_size=16, cover_remainder=False)
+
+    def test_30_caching_storage(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with tempfile.TemporaryDirectory() as cache_dir:
+            def read_all(name, **kwargs):
+                cached = kara_storage.KaraStorage("file://kara_data", cache_dir=cache_dir, cache_chunk_size=256, **kwargs)
+                ds = cached.open_dataset("test", name, "r", version=0)
+                ret = [v["index"] for v in ds] + [v["index"] for v in ds.pread_many([5, 100, 37])]
+                ds.close()
+                return ret, cached._storage
+
+            with ThreadPoolExecutor(4) as executor:
+                results = list(executor.map(lambda name: read_all(name), ["small_trunks", "compressed"] * 2))
+            for (rows, _), name in zip(results, ["small_trunks", "compressed"] * 2):
+                self.assertListEqual(rows, [v["index"] for v in storage.open_dataset("test", name, "r", version=0)] + [5, 100, 37])
+
+            rows, cache = read_all("small_trunks")
+            self.assertEqual(len(rows), TEST_CASE_SIZE + 5)
+            self.assertEqual(cache.misses, 0)
+            self.assertGreater(cache.hits, 0)
+
+            rows, cache = read_all("write_many", cache_size=4096)
+            self.assertEqual(len(rows), TEST_CASE_SIZE + 4)
+            self.assertGreater(cache.misses, 0)
+            used = sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(cache_dir) for name in files)
+            self.assertLessEqual(used, 4096)
+
+    def test_31_shared_memory_ring(self):
+        expected = list(storage.open_dataset("test", "skewed", "r", version=0))
+        # the rows of the first 40 do not fit into the smallest ring
+        for ring_size in [4 * 1024 * 1024, 1024, 0]:
+            ds = storage.open_dataset("test", "skewed", "r", version=0, ipc_ring_size=ring_size)
+            q = mp.Queue()
+            p = mp.Process(target=read_in_subprocess, args=(ds.slice(30, 100), q))
+            p.start()
+            self.assertListEqual(q.get(), expected[30:130])
+            p.join()
+
+            q = mp.Queue()
+            p = mp.Process(target=pread_in_subprocess, args=(ds, [399, 0, 41, 7], q))
+            p.start()
+            self.assertListEqual(q.get(), [expected[i] for i in [399, 0, 41, 7]])
+            p.join()
+
+        ds = storage.open_dataset("test", "skewed", "r", version=0, ipc_ring_size=1024, serialization=kara_storage.serialization.NoSerializer())
+        q = mp.Queue()
+        p = mp.Process(target=read_in_subprocess, args=(ds.slice(35, 10), q))
+        p.start()
+        self.assertListEqual(q.get(), list(ds.slice(35, 10)))
+        p.join()
+
+    def test_32_batched_proxy(self):
+        ds = storage.open_dataset("test", "a/b/c", "r", ipc_batch_size=4)
+        q = mp.Queue()
+        p = mp.Process(target=seek_in_subprocess, args=(ds.slice(10, 100), q))
+        p.start()
+        self.assertListEqual(q.get(), [10, 11, 12, 3, 12, 3, 13, 14, 15, 16, 17, 8, 60, 100] + list(range(18, 110)))
+        p.join()
+
+        ds = storage.open_dataset("test", "proxy_written", "w", version=0, ipc_batch_size=16)
+        p = mp.Process(target=write_in_subprocess, args=(ds,))
+        p.start()
+        p.join()
+        ds.close()
+        ds = storage.open_dataset("test", "proxy_written", "r", version=0)
+        self.assertListEqual([v["index"] for v in ds], [-1] + list(range(100)) + [-2])
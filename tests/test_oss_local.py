@@ -0,0 +1,75 @@
+import os
+import kara_storage
+import unittest, random
+from oss_server import start_server
+
+TEST_CASE_SIZE = 117
+
+class TestLocalOSSStorage(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.counter = {}
+        cls.server, cls.endpoint = start_server(cls.counter)
+        cls.storage = kara_storage.KaraStorage("oss://%s/bucket/test" % cls.endpoint, app_key="key", app_secret="secret")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def test_1_write_read(self):
+        self.counter.clear()
+        ds = self.storage.open_dataset("test_ns", "mydb", "w", version=0)
+        for i in range(TEST_CASE_SIZE):
+            ds.write({"index": i, "bbb": "aaa" * (i % 5)})
+            if i % 10 == 0:
+                ds.flush()
+        ds.close()
+        # rows written between flushes are sent with a single append for the data and the index
+        self.assertEqual(self.counter["APPEND"], 2 * (TEST_CASE_SIZE // 10 + 2))
+
+        ds = self.storage.open_dataset("test_ns", "mydb", "r")
+        self.assertListEqual([v["index"] for v in ds], list(range(TEST_CASE_SIZE)))
+        with self.assertRaises(EOFError):
+            ds.read()
+        offsets = [random.randint(0, TEST_CASE_SIZE - 1) for _ in range(50)]
+        self.assertListEqual([v["index"] for v in ds.pread_many(offsets)], offsets)
+        self.assertEqual(ds[37]["bbb"], "aaa" * 2)
+
+    def test_2_append_coalesce(self):
+        self.counter.clear()
+        ds = self.storage.open_dataset("test_ns", "bulk", "w", version=0, max_file_size=4 * 1024 * 1024)
+        ds.write_many({"index": i, "text": "kara" * 100} for i in range(30000))
+        ds.close()
+        data_size = sum(self.storage._storage.list("test/row/test_ns/bulk/0/data/").values())
+        self.assertGreater(data_size, 8 * 1024 * 1024)
+        # one append per trunk for the data and the index
+        self.assertLessEqual(self.counter["APPEND"], data_size // (4 * 1024 * 1024) + 3)
+
+        ds = self.storage.open_dataset("test_ns", "bulk", "r")
+        self.assertEqual(len(ds), 30000)
+        self.assertEqual(ds[29999]["index"], 29999)
+        self.assertEqual(sum(1 for _ in ds), 30000)
+
+    def test_3_parallel_ranges(self):
+        from kara_storage.backend.oss import OSSStorage
+        data = os.urandom(1024 * 1024 + 17)
+        oss = OSSStorage("bucket", "http://" + self.endpoint, "key", "secret", split_size=64 * 1024)
+        oss.put("test/large.bin", data)
+
+        self.counter.clear()
+        fp = oss.open_random("test/large.bin")
+        buf = bytearray(len(data) + 100)
+        self.assertEqual(fp.preadinto(buf, 0), len(data))
+        self.assertEqual(bytes(buf[:len(data)]), data)
+        self.assertEqual(self.counter["GET"], 17)
+
+        buf = bytearray(100)
+        self.assertEqual(fp.preadinto(buf, len(data) - 50), 50)
+        self.assertEqual(bytes(buf[:50]), data[-50:])
+        self.assertEqual(fp.preadinto(buf, len(data)), 0)
+
+        fp = oss.open("test/large.bin", "r", 1000, 3000)
+        buf = bytearray(4096)
+        self.assertEqual(fp.readinto(buf), 2000)
+        self.assertEqual(bytes(buf[:2000]), data[1000:3000])
+        fp.close()